@@ -0,0 +1,205 @@
+# agent.py
+"""Long-running agent serving the cached inventory over HTTP or a Unix socket.
+
+Monitoring collectors that scrape disk state every few seconds share one
+agent, and so one backend session and one inventory cache, instead of each
+opening its own WMI connection.  Endpoints:
+
+- ``GET /inventory``: disks, partitions and volumes as JSON (what
+  ``list_volumes`` shows), with an ``ETag``; a request whose
+  ``If-None-Match`` matches gets ``304 Not Modified`` and no body.
+- ``GET /metrics``: backend call metrics in the Prometheus text format.
+- ``GET /healthz``: ``ok``.
+
+Every refresh runs on one long-lived agent thread.  WMI connections belong
+to the thread that opened them, so that thread keeps a single connection
+for the agent's lifetime instead of each request thread opening its own.
+Concurrent requests are coalesced: they wake the agent thread and wait for
+its next pass, which refreshes the inventory (if its TTL ran out or a disk
+went stale) and renders the JSON once, so N clients cost one backend refresh.
+"""
+import hashlib
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import get_metrics
+from inventory_cache import get_inventory
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+
+
+class InventoryAgent:
+    """Renders the inventory as JSON once per inventory generation, on its own thread.
+
+    Args:
+        inventory (InventoryCache, optional): Inventory to serve. Defaults to the process-wide one.
+    """
+
+    def __init__(self, inventory=None):
+        self.inventory = inventory
+        self.renders = 0
+        self._generation = None
+        self._body = b""
+        self._etag = ""
+        self._error = None
+        self._wanted = 0    # Highest pass number a request is waiting for
+        self._started = 0   # Passes the agent thread has begun
+        self._finished = 0  # Passes the agent thread has completed
+        self._closed = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def document(self):
+        """Returns ``(body, etag)`` as of a refresh that began after this call.
+
+        Raises:
+            Exception: Whatever the refresh raised, e.g. a lost WMI connection.
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The agent has been closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inventory-agent", daemon=True)
+                self._thread.start()
+            # A pass already under way may have read the inventory before this request arrived
+            target = self._started + 1
+            self._wanted = max(self._wanted, target)
+            self._condition.notify_all()
+            while self._finished < target and not self._closed:
+                self._condition.wait()
+            if self._finished < target:
+                raise RuntimeError("The agent has been closed")
+            if self._error is not None:
+                raise self._error
+            return self._body, self._etag
+
+    def _run(self):
+        get_metrics().set_action("agent")
+        while True:
+            with self._condition:
+                while self._wanted <= self._started and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._started += 1
+            try:
+                self._refresh()
+                error = None
+            except Exception as e:
+                error = e
+            with self._condition:
+                self._error = error
+                self._finished = self._started
+                self._condition.notify_all()
+
+    def _refresh(self):
+        inventory = self.inventory or get_inventory()
+        snapshot = inventory.snapshot()
+        if inventory.generation != self._generation:
+            body = json.dumps(snapshot.to_dict(), sort_keys=True).encode()
+            with self._condition:
+                self._body = body
+                # Derived from the content, so a resync that changes nothing keeps the same ETag
+                self._etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                self._generation = inventory.generation
+                self.renders += 1
+
+    def close(self):
+        """Stops the agent thread; requests still waiting for a refresh fail."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """Serves an InventoryAgent; the server must have an ``agent`` attribute."""
+
+    server_version = "DiskManAgent/1.0"
+
+    def do_GET(self):
+        started = time.perf_counter()
+        path = self.path.split("?", 1)[0]
+        try:
+            if path == "/inventory":
+                body, etag = self.server.agent.document()
+                if etag in {tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")}:
+                    self._send(304, b"", etag=etag)
+                else:
+                    self._send(200, body, "application/json", etag)
+            elif path == "/metrics":
+                self._send(200, get_metrics().prometheus_text().encode(), "text/plain; version=0.0.4")
+            elif path == "/healthz":
+                self._send(200, b"ok\n", "text/plain")
+            else:
+                self._send(404, b"not found\n", "text/plain")
+        except Exception as e:
+            self._send(500, f"{e}\n".encode(), "text/plain")
+        get_metrics().record("agent", path, time.perf_counter() - started, action="agent")
+
+    def _send(self, status, body, content_type=None, etag=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # Unix socket peers have no address for the request log
+
+
+def make_server(agent, address=DEFAULT_ADDRESS, unix_socket=None, verbose=False):
+    """Returns an HTTP server for ``agent`` on a localhost TCP address or a Unix socket path."""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)  # Left over from an agent that did not shut down cleanly
+        server = _UnixHTTPServer(unix_socket, AgentRequestHandler)
+    else:
+        server = ThreadingHTTPServer(address, AgentRequestHandler)
+        server.daemon_threads = True
+    server.agent = agent
+    server.verbose = verbose
+    return server
+
+
+def serve(address=DEFAULT_ADDRESS, unix_socket=None, inventory=None, verbose=False):
+    """Runs the agent until interrupted.
+
+    Args:
+        address (tuple, optional): ``(host, port)`` to listen on. Defaults to 127.0.0.1:8765.
+        unix_socket (str, optional): Listen on this Unix socket path instead.
+        inventory (InventoryCache, optional): Inventory to serve. Defaults to the process-wide one.
+        verbose (bool, optional): Log each request to stderr. Defaults to False.
+    """
+    agent = InventoryAgent(inventory)
+    server = make_server(agent, address, unix_socket, verbose)
+    where = unix_socket or "http://%s:%d" % server.server_address[:2]
+    print(f"Serving inventory on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping agent.")
+    finally:
+        server.server_close()
+        agent.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
@@ -0,0 +1,71 @@
+# backends.py
+"""Registry of disk backends, imported only when first used.
+
+A backend is a module exposing the TUI actions (``list_disks``,
+``list_and_select_disk``, ``create_partition``, ``list_volumes``, ...) and a
+``close()`` function.  Importing a backend pulls in its provider (WMI and
+COM on Windows), so ``diskman.py`` resolves it through
+``load_backend`` on the first menu action rather than at start-up; the
+version banner, help screen and argument parsing never touch it.
+"""
+import importlib
+import sys
+
+# Backend name -> module implementing it
+BACKENDS = {
+    "wmi": "wmi_backend",
+    "linux": "linux_backend",
+    "image": "image_backend",
+}
+
+_loaded = {}
+
+
+def register_backend(name, module_name):
+    """Makes the backend in ``module_name`` available as ``name``."""
+    BACKENDS[name] = module_name
+    _loaded.pop(name, None)
+
+
+def default_backend():
+    """Returns the backend used when none is requested for this platform."""
+    return "linux" if sys.platform.startswith("linux") else "wmi"
+
+
+def load_backend(name=None):
+    """Imports and returns the backend module, once per process.
+
+    Args:
+        name (str, optional): Registered backend name. Defaults to default_backend().
+
+    Returns:
+        module: The backend module.
+
+    Raises:
+        ValueError: If no backend is registered under ``name``.
+    """
+    name = name or default_backend()
+    backend = _loaded.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(sorted(BACKENDS))}")
+        backend = _loaded[name] = importlib.import_module(BACKENDS[name])
+    return backend
+
+
+def loaded_backend(name=None):
+    """Returns the backend if it has already been imported, else None."""
+    return _loaded.get(name or default_backend())
+
+
+def unsupported(name, action):
+    """Returns a stand-in for an action backend ``name`` does not implement.
+
+    The stand-in prints why nothing happened and returns False, which the
+    TUI reports as a failed operation.
+    """
+    def action_not_supported(*args, **kwargs):
+        print(f"{action} is not supported by the {name} backend yet.")
+        return False
+    action_not_supported.__doc__ = f"Reports that {action.lower()} is not available with the {name} backend."
+    return action_not_supported
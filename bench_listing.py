@@ -0,0 +1,141 @@
+# bench_listing.py
+"""Benchmarks the listing paths against synthetic topologies.
+
+Each listing path (list_disks, list_and_select_disk, list_volumes for all
+disks and for one disk) runs cold against a fake WMI provider with 1 to
+10,000 disks.  Wall time, backend calls and peak memory are compared with
+bench_baselines.json, and the run fails when a path regresses:
+
+    python bench_listing.py                      # compare with the baselines
+    python bench_listing.py --update-baselines   # record new baselines
+    python bench_listing.py --latency 0.005      # inject 5 ms per WMI call
+
+Backend call counts are exact; time and memory may exceed the baseline by
+``--tolerance`` (a fraction) before counting as a regression.
+"""
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import fake_wmi
+import inventory_cache
+import wmi_session
+from disk_management import list_and_select_disk, list_disks
+from instrumentation import get_metrics
+from records import DiskRecord
+from volume_management import list_volumes
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+DISK_COUNTS = (1, 10, 100, 1000, 10000)
+
+
+def _select_first_disk(fake):
+    original_input = builtins.input
+    builtins.input = lambda prompt="": "1"
+    try:
+        return list_and_select_disk()
+    finally:
+        builtins.input = original_input
+
+
+def _list_selected_disk_volumes(fake):
+    list_volumes(DiskRecord.from_wmi(fake.Win32_DiskDrive()[0]))
+
+
+LISTING_PATHS = {
+    "list_disks": lambda fake: list_disks(),
+    "list_and_select_disk": _select_first_disk,
+    "list_volumes_all": lambda fake: list_volumes(),
+    "list_volumes_selected": _list_selected_disk_volumes,
+}
+
+
+def measure(path, fake):
+    """Runs one listing path cold against ``fake`` and returns its measurements."""
+    wmi_session.set_provider(fake.provider)
+    inventory_cache.set_inventory(inventory_cache.InventoryCache(ttl=0))
+    metrics = get_metrics()
+    metrics.reset()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        LISTING_PATHS[path](fake)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "calls": metrics.calls("query"), "peak_kb": peak // 1024}
+
+
+def run_suite(disk_counts, partitions, volumes, latency):
+    """Yields ``(key, result)`` for every listing path on every topology size."""
+    for disks in disk_counts:
+        fake = fake_wmi.generate_topology(disks, partitions, volumes, latency)
+        for path in LISTING_PATHS:
+            key = f"{path}/disks={disks}/partitions={partitions}/volumes={volumes}/latency={latency}"
+            yield key, measure(path, fake)
+
+
+def find_regressions(result, baseline, tolerance):
+    """Returns a description of every way ``result`` is worse than ``baseline``."""
+    problems = []
+    if result["calls"] > baseline["calls"]:
+        problems.append(f"backend calls {baseline['calls']} -> {result['calls']}")
+    if result["seconds"] > baseline["seconds"] * (1 + tolerance) and result["seconds"] - baseline["seconds"] > 0.01:
+        problems.append(f"wall time {baseline['seconds']:.4f}s -> {result['seconds']:.4f}s")
+    if result["peak_kb"] > baseline["peak_kb"] * (1 + tolerance) and result["peak_kb"] - baseline["peak_kb"] > 64:
+        problems.append(f"peak memory {baseline['peak_kb']} KB -> {result['peak_kb']} KB")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DiskMan listing paths on synthetic topologies")
+    parser.add_argument("--max-disks", type=int, default=DISK_COUNTS[-1], help="largest topology to run (default: 10000)")
+    parser.add_argument("--partitions", type=int, default=2, help="partitions per disk (default: 2)")
+    parser.add_argument("--volumes", type=int, default=1, help="volumes per partition, 0 or 1 (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds injected into every WMI call (default: 0)")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="allowed fractional increase in time and memory (default: 1.0)")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="baseline file (default: bench_baselines.json)")
+    parser.add_argument("--update-baselines", action="store_true", help="store this run as the new baselines")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as baselines_file:
+            baselines = json.load(baselines_file)
+
+    disk_counts = [count for count in DISK_COUNTS if count <= args.max_disks]
+    regressions = 0
+    print(f"{'Path':<24}  {'Disks':>6}  {'Seconds':>9}  {'Calls':>6}  {'Peak KB':>9}  Result")
+    for key, result in run_suite(disk_counts, args.partitions, args.volumes, args.latency):
+        path, disks = key.split("/")[0], key.split("/")[1].split("=")[1]
+        baseline = baselines.get(key)
+        if args.update_baselines:
+            baselines[key] = result
+            status = "recorded"
+        elif baseline is None:
+            status = "no baseline"
+        else:
+            problems = find_regressions(result, baseline, args.tolerance)
+            regressions += bool(problems)
+            status = "REGRESSED: " + "; ".join(problems) if problems else "ok"
+        print(f"{path:<24}  {disks:>6}  {result['seconds']:>9.4f}  {result['calls']:>6}  {result['peak_kb']:>9}  {status}")
+
+    if args.update_baselines:
+        with open(args.baselines, "w") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write("\n")
+        print(f"Baselines written to {args.baselines}")
+    if regressions:
+        print(f"{regressions} listing path(s) regressed.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
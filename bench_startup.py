@@ -0,0 +1,127 @@
+# bench_startup.py
+"""Benchmarks DiskMan's start-up and import cost.
+
+Each command runs in a fresh interpreter under ``python -X importtime``; the
+median wall time and the total import time are compared with the
+``startup/*`` entries in bench_baselines.json:
+
+    python bench_startup.py                      # compare with the baselines
+    python bench_startup.py --update-baselines   # record new baselines
+    python bench_startup.py --runs 20            # more runs per command
+
+The version banner, help screen and a bare ``import diskman`` must not import
+any backend module; one that does is reported as a regression regardless of
+timing.  ``load_backend`` shows what the first menu action pays instead.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES_PATH = os.path.join(HERE, "bench_baselines.json")
+
+# Command name -> (interpreter arguments, whether it must stay off the backends)
+STARTUP_COMMANDS = {
+    "version": (["diskman.py", "--version"], True),
+    "help": (["diskman.py", "--help"], True),
+    "import_diskman": (["-c", "import diskman"], True),
+    "load_backend": (["-c", "import backends; backends.load_backend()"], False),
+}
+
+# Modules only a backend may import
+BACKEND_MODULES = {
+    "wmi", "wmi_backend", "wmi_session", "disk_management", "volume_management", "bulk_format", "fleet",
+    "jobs", "instrumentation", "inventory_cache", "topology", "diskpart_script", "subprocess",
+}
+
+
+def parse_importtime(stderr):
+    """Returns ``{module: self microseconds}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def measure(command, runs):
+    """Runs ``command`` ``runs`` times and returns its measurements."""
+    arguments, _ = STARTUP_COMMANDS[command]
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime"] + arguments, cwd=HERE,
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        times.append(time.perf_counter() - started)
+    modules = parse_importtime(completed.stderr)
+    return {
+        "seconds": round(statistics.median(times), 4),
+        "import_ms": round(sum(modules.values()) / 1000, 1),
+        "modules": len(modules),
+        "backend_modules": sorted(BACKEND_MODULES & modules.keys()),
+    }
+
+
+def find_regressions(command, result, baseline, tolerance):
+    """Returns a description of every way ``result`` is worse than ``baseline``."""
+    problems = []
+    if STARTUP_COMMANDS[command][1] and result["backend_modules"]:
+        problems.append("imports " + ", ".join(result["backend_modules"]))
+    if baseline is None:
+        return problems
+    if result["seconds"] > baseline["seconds"] * (1 + tolerance) and result["seconds"] - baseline["seconds"] > 0.02:
+        problems.append(f"wall time {baseline['seconds']:.4f}s -> {result['seconds']:.4f}s")
+    if result["import_ms"] > baseline["import_ms"] * (1 + tolerance) and result["import_ms"] - baseline["import_ms"] > 5:
+        problems.append(f"import time {baseline['import_ms']} ms -> {result['import_ms']} ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DiskMan start-up and import cost")
+    parser.add_argument("--runs", type=int, default=5, help="runs per command; the median is reported (default: 5)")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="allowed fractional increase in wall and import time (default: 1.0)")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="baseline file (default: bench_baselines.json)")
+    parser.add_argument("--update-baselines", action="store_true", help="store this run as the new baselines")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as baselines_file:
+            baselines = json.load(baselines_file)
+
+    regressions = 0
+    print(f"{'Command':<16}  {'Seconds':>8}  {'Import ms':>9}  {'Modules':>7}  Result")
+    for command in STARTUP_COMMANDS:
+        key = f"startup/{command}"
+        result = measure(command, args.runs)
+        problems = find_regressions(command, result, None if args.update_baselines else baselines.get(key), args.tolerance)
+        if problems:
+            regressions += 1
+            status = "REGRESSED: " + "; ".join(problems)
+        elif args.update_baselines:
+            baselines[key] = {name: value for name, value in result.items() if name != "backend_modules"}
+            status = "recorded"
+        else:
+            status = "ok" if key in baselines else "no baseline"
+        print(f"{command:<16}  {result['seconds']:>8.4f}  {result['import_ms']:>9.1f}  {result['modules']:>7}  {status}")
+
+    if args.update_baselines:
+        with open(args.baselines, "w") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write("\n")
+        print(f"Baselines written to {args.baselines}")
+    if regressions:
+        print(f"{regressions} start-up command(s) regressed.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
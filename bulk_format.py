@@ -0,0 +1,143 @@
+# bulk_format.py
+"""Format many volumes in one command.
+
+Volumes are picked from the cached inventory with filters (disk, label
+pattern, size range, current file system), confirmed once as a set, and
+formatted concurrently on a JobEngine limited to ``max_workers`` jobs.
+Volumes on the same physical disk are still formatted one at a time.
+"""
+import fnmatch
+
+from extent_map import MB
+from inventory_cache import get_inventory
+from jobs import DONE, JobEngine
+from volume_management import submit_volume_job
+
+
+def select_volumes(snapshot, disk_indexes=None, label_pattern=None, min_size_mb=None, max_size_mb=None,
+                   file_systems=None, drive_type=3):
+    """Returns ``(disk, volume)`` pairs from ``snapshot`` matching every given filter.
+
+    Args:
+        snapshot (TopologySnapshot): Inventory to select from.
+        disk_indexes (iterable, optional): Only volumes on these disk numbers.
+        label_pattern (str, optional): Shell-style pattern for the volume label, e.g. ``"DATA*"``.
+        min_size_mb (int, optional): Smallest volume size to include, in MB.
+        max_size_mb (int, optional): Largest volume size to include, in MB.
+        file_systems (iterable, optional): Current file systems to include, e.g. ``["RAW", "NTFS"]``.
+        drive_type (int, optional): Win32_LogicalDisk.DriveType to include. Defaults to 3 (fixed).
+    """
+    disk_indexes = set(disk_indexes) if disk_indexes is not None else None
+    file_systems = {fs.upper() for fs in file_systems} if file_systems else None
+    selected = []
+    for disk in snapshot.disks:
+        if disk_indexes is not None and disk.index not in disk_indexes:
+            continue
+        for volume in snapshot.volumes(disk.device_id):
+            size_mb = (volume.size or 0) // MB
+            if drive_type is not None and volume.drive_type != drive_type:
+                continue
+            if label_pattern and not fnmatch.fnmatchcase(volume.volume_name.upper(), label_pattern.upper()):
+                continue
+            if min_size_mb is not None and size_mb < min_size_mb:
+                continue
+            if max_size_mb is not None and size_mb > max_size_mb:
+                continue
+            if file_systems and (volume.file_system or "RAW").upper() not in file_systems:
+                continue
+            selected.append((disk, volume))
+    return selected
+
+
+def bulk_format(selected, file_system, label=None, allocation_unit=None, quick=True, max_workers=4, confirm=True):
+    """Formats every selected volume concurrently and prints a summary table.
+
+    Args:
+        selected (list): ``(disk, volume)`` pairs, as returned by select_volumes.
+        file_system (str): Target file system, e.g. ``"NTFS"``.
+        label (str, optional): New label; ``{index}`` and ``{letter}`` are filled in per volume.
+        allocation_unit (int, optional): Allocation unit size in bytes.
+        quick (bool, optional): Quick format. Defaults to True.
+        max_workers (int, optional): Volumes formatted at once. Defaults to 4.
+        confirm (bool, optional): Ask once before formatting. Defaults to True.
+
+    Returns:
+        list: The finished jobs, or an empty list if the user cancelled.
+    """
+    if not selected:
+        print("No volumes match the given filters.")
+        return []
+    # Render every label up front, so a bad template fails before anything is confirmed or submitted
+    labels = [None] * len(selected)
+    if label:
+        try:
+            labels = [label.format(index=i, letter=volume.device_id.rstrip(":"))
+                      for i, (_, volume) in enumerate(selected, start=1)]
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"Invalid label {label!r} ({e!r}); only {{index}} and {{letter}} can be filled in.")
+            return []
+
+    print(f"\nVolumes to format as {file_system}:")
+    print("Disk  Ltr  Label        Fs     Size")
+    print("----  ---  -----------  -----  ----------")
+    for disk, volume in selected:
+        print(f"{disk.index:<4}  {volume.device_id:<3}  {volume.volume_name[:11]:<11}  {volume.file_system[:5]:<5}  {(volume.size or 0) / (1024**3):.2f} GB")
+    if confirm:
+        answer = input(f"ALL DATA on these {len(selected)} volumes will be erased. Type 'yes' to continue: ").lower()
+        if answer != 'yes':
+            print("Bulk format cancelled.")
+            return []
+
+    engine = JobEngine(max_workers=max_workers)
+    jobs = []
+    for (disk, volume), new_label in zip(selected, labels):
+        params = {"file_system": file_system, "quick_format": quick}
+        if new_label:
+            params["label"] = new_label
+        if allocation_unit:
+            params["size"] = allocation_unit
+        jobs.append(submit_volume_job(f"Format {volume.device_id} as {file_system}", volume.device_id, "Format",
+                                      engine=engine, **params))
+    engine.wait_all()
+    engine.shutdown()
+    print_summary(jobs)
+    return jobs
+
+
+def print_summary(jobs):
+    """Prints per-volume timings and failures for a finished bulk format."""
+    print("\nJob  Status     Seconds  Description")
+    print("---  ---------  -------  -----------")
+    for job in jobs:
+        error = f"  {job.error}" if job.error else ""
+        print(f"{job.id:<3}  {job.status:<9}  {job.elapsed:>7.1f}  {job.description}{error}")
+    succeeded = sum(1 for job in jobs if job.status == DONE)
+    total = max((job.finished or 0) for job in jobs) - min(job.submitted for job in jobs) if jobs else 0.0
+    print(f"\n{succeeded} of {len(jobs)} volumes formatted, {len(jobs) - succeeded} failed, {total:.1f}s in total.")
+
+
+def _optional_int(text):
+    text = text.strip()
+    return int(text) if text else None
+
+
+def prompt_bulk_format():
+    """Asks for filters and format options, then runs bulk_format."""
+    try:
+        disks = input("Disk numbers to include (comma-separated, leave empty for all): ").strip()
+        disk_indexes = [int(number) for number in disks.split(",")] if disks else None
+        label_pattern = input("Current label pattern (e.g. DATA*, leave empty for any): ").strip() or None
+        min_size_mb = _optional_int(input("Minimum volume size in MB (leave empty for none): "))
+        max_size_mb = _optional_int(input("Maximum volume size in MB (leave empty for none): "))
+        current = input("Current file systems to include (comma-separated, leave empty for any): ").strip()
+        file_systems = [fs.strip() for fs in current.split(",") if fs.strip()] or None
+        file_system = input("Format as file system (e.g., NTFS, FAT32, exFAT): ").strip() or "NTFS"
+        allocation_unit = _optional_int(input("Allocation unit size (leave empty for default): "))
+        label = input("New volume label, may use {index} and {letter} (leave empty to keep none): ").strip() or None
+        max_workers = _optional_int(input("Volumes to format at once (default 4): ")) or 4
+    except ValueError:
+        print("Invalid input. Please enter whole numbers for disk numbers and sizes.")
+        return []
+
+    selected = select_volumes(get_inventory().snapshot(), disk_indexes, label_pattern, min_size_mb, max_size_mb, file_systems)
+    return bulk_format(selected, file_system, label, allocation_unit, max_workers=max_workers)
@@ -0,0 +1,251 @@
+# commands.py
+"""Non-interactive subcommands and batch files with table, JSON or CSV output.
+
+::
+
+    diskman.py list-disks --output json
+    diskman.py list-volumes --disk 1 --output csv
+    diskman.py list-volumes --output jsonl
+    diskman.py create-partition --disk 1 --size 10240
+    diskman.py format --volume E: --fs NTFS --cluster-size 4096 --label Data
+    diskman.py resize --volume E: --extend 1024
+    diskman.py batch provision.txt --output json
+
+A batch file holds one subcommand per line, written as on the command line
+(``#`` starts a comment).  All of its steps run in one process, so they
+share one backend session and one inventory: the disks are enumerated once
+and each step re-queries only the disks the previous steps changed.
+
+The listings stream: each disk or volume row is written as it is produced
+(the table has fixed column widths for that reason), so output starts at
+once and memory stays flat however many volumes there are.
+
+Structured output goes to stdout; the messages the actions print go to
+stderr so they do not corrupt JSON or CSV.  Format and resize run as jobs
+and each step waits for its jobs, so a step's result is its final outcome.
+The exit status is 1 if any step failed.
+
+diskman.py imports this module at start-up to build its parser, so
+everything beyond argparse is imported where it is used.
+"""
+import argparse
+import sys
+
+OUTPUT_FORMATS = ("table", "json", "jsonl", "csv")
+
+RESULT_FIELDS = ("command", "ok", "detail")
+SIZE_FIELDS = ("size", "free_space", "partition_size")
+TABLE_WIDTHS = {
+    "number": 6, "disk": 4, "partition": 9, "device_id": 24, "caption": 24, "disk_caption": 24, "model": 24,
+    "size": 10, "free_space": 10, "partition_size": 14, "status": 8, "label": 12, "file_system": 11,
+    "block_size": 10, "drive_type": 10, "partitions": 10, "command": 16, "ok": 5, "detail": 40,
+}
+
+
+def add_parsers(subparsers):
+    """Adds the subcommands to diskman's argument parser."""
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output", choices=OUTPUT_FORMATS, default="table", help="output format (default: table)")
+
+    subparsers.add_parser("list-disks", parents=[output], help="list disks")
+    parser = subparsers.add_parser("list-volumes", parents=[output], help="list partitions and the volumes on them")
+    parser.add_argument("--disk", type=int, metavar="NUMBER",
+                        help="only partitions on this disk (number from list-disks)")
+    parser = subparsers.add_parser("create-partition", parents=[output], help="create a primary partition")
+    parser.add_argument("--disk", type=int, required=True, metavar="NUMBER", help="disk number from list-disks")
+    parser.add_argument("--size", type=int, required=True, metavar="MB", help="partition size in MB")
+    parser = subparsers.add_parser("format", parents=[output], help="format a volume")
+    parser.add_argument("--volume", required=True, metavar="ID", help="volume, e.g. E:")
+    parser.add_argument("--fs", required=True, help="file system, e.g. NTFS, FAT32, exFAT")
+    parser.add_argument("--cluster-size", type=int, default=0, metavar="BYTES",
+                        help="allocation unit size (default: file system default)")
+    parser.add_argument("--label", default="", help="volume label")
+    parser = subparsers.add_parser("resize", parents=[output], help="extend or shrink a volume")
+    parser.add_argument("--volume", required=True, metavar="ID", help="volume, e.g. E:")
+    change = parser.add_mutually_exclusive_group(required=True)
+    change.add_argument("--extend", type=int, metavar="MB", help="grow the volume by MB")
+    change.add_argument("--shrink", type=int, metavar="MB", help="shrink the volume to MB")
+    parser.add_argument("--min", type=int, metavar="MB", help="smallest size acceptable when shrinking")
+    parser = subparsers.add_parser("batch", parents=[output], help="run the subcommands listed in a file")
+    parser.add_argument("file", help="batch file, one subcommand per line ('-' for stdin)")
+    parser.add_argument("--keep-going", action="store_true", help="run the remaining steps after a failure")
+    return subparsers
+
+
+def _size_gb(size):
+    return f"{size / (1024**3):.2f} GB" if size is not None else "Unknown"
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+def render(rows, fields, output="table", stream=None):
+    """Writes ``rows`` (dicts) as they arrive, so a generator is never held in memory.
+
+    Args:
+        rows (iterable): Row dicts, e.g. from ``listing.iter_volume_rows``.
+        fields (tuple): Columns to write, in order.
+        output (str, optional): ``table`` (fixed-width columns), ``json`` (an array),
+            ``jsonl`` (one object per line) or ``csv`` (with a header). Defaults to table.
+        stream (file, optional): Where to write. Defaults to stdout.
+    """
+    import csv
+    import json
+
+    stream = stream or sys.stdout
+    if output == "jsonl":
+        for row in rows:
+            stream.write(json.dumps({field: row.get(field) for field in fields}) + "\n")
+    elif output == "json":
+        separator = "["
+        for row in rows:
+            stream.write(separator + json.dumps({field: row.get(field) for field in fields}))
+            separator = ",\n "
+        stream.write("[]\n" if separator == "[" else "]\n")
+    elif output == "csv":
+        writer = csv.DictWriter(stream, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    else:
+        # Widths are fixed per field rather than measured, so each row can be written as soon as it arrives
+        widths = [max(len(field), TABLE_WIDTHS.get(field, 10)) for field in fields]
+        stream.write("  ".join(field.ljust(width) for field, width in zip(fields, widths)).rstrip() + "\n")
+        stream.write("  ".join("-" * width for width in widths) + "\n")
+        for row in rows:
+            cells = [_size_gb(row.get(field)) if field in SIZE_FIELDS else _cell(row.get(field)) for field in fields]
+            stream.write("  ".join(cell.ljust(width) for cell, width in zip(cells, widths)).rstrip() + "\n")
+
+
+def _find_volume(snapshot, volume_id):
+    volume = snapshot.logical_disks_by_id.get(volume_id) or snapshot.logical_disks_by_id.get(volume_id + ":")
+    if volume is None:
+        raise ValueError(f"No volume {volume_id}")
+    return volume
+
+
+def _run_action(action):
+    """Calls ``action()`` and waits for any jobs it started; returns ``(ok, detail)``."""
+    from jobs import DONE, get_job_engine
+
+    engine = get_job_engine()
+    before = {job.id for job in engine.jobs()}
+    result = action()
+    jobs = [job for job in engine.jobs() if job.id not in before]
+    for job in jobs:
+        job.wait()
+    failed = [job for job in jobs if job.status != DONE]
+    if failed:
+        return False, f"job {failed[0].id} {failed[0].status}: {failed[0].error or failed[0].message}"
+    if result is False or result is None and not jobs:
+        return False, "not done; see the messages on stderr"
+    return True, "; ".join(f"job {job.id} done in {job.elapsed:.1f}s" for job in jobs) or "done"
+
+
+def run_command(args, backend):
+    """Runs one parsed subcommand.
+
+    Args:
+        args (argparse.Namespace): Parsed subcommand arguments.
+        backend (callable): Returns the loaded backend module, e.g. ``diskman.backend``.
+
+    Returns:
+        tuple: ``(ok, rows, fields)``: whether it succeeded and what to render; the
+        listings return ``rows`` as a generator.
+    """
+    import contextlib
+    from instrumentation import get_metrics
+    from inventory_cache import get_inventory
+    from listing import DISK_FIELDS, VOLUME_FIELDS, iter_disk_rows, iter_volume_rows
+
+    get_metrics().set_action(args.command.replace("-", "_"))
+    # Whatever the actions print is commentary; stdout is kept for the structured result
+    with contextlib.redirect_stdout(sys.stderr):
+        module = backend()
+        if args.command == "list-disks":
+            return True, iter_disk_rows(get_inventory().snapshot()), DISK_FIELDS
+        if args.command == "list-volumes":
+            return True, iter_volume_rows(get_inventory().snapshot(), args.disk), VOLUME_FIELDS
+        try:
+            if args.command == "create-partition":
+                ok, detail = _run_action(lambda: module.create_partition(args.disk, args.size))
+            elif args.command == "format":
+                volume = _find_volume(get_inventory().snapshot(), args.volume)
+                ok, detail = _run_action(lambda: module.format_volume(volume, args.fs, args.cluster_size, args.label))
+            else:
+                volume = _find_volume(get_inventory().snapshot(), args.volume)
+                ok, detail = _run_action(lambda: module.resize_volume([volume], args.extend, args.shrink, args.min,
+                                                                      confirm=False))
+        except (ValueError, OSError) as e:
+            ok, detail = False, str(e)
+    return ok, [{"command": args.command, "ok": ok, "detail": detail}], RESULT_FIELDS
+
+
+def _batch_lines(path):
+    import shlex
+
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path) as batch_file:
+            lines = batch_file.read().splitlines()
+    for number, line in enumerate(lines, 1):
+        words = shlex.split(line, comments=True)
+        if words:
+            yield number, line.strip(), words
+
+
+def run_batch(args, parser, backend):
+    """Runs every step of a batch file in this process; returns True if all succeeded.
+
+    With ``--output json`` or ``jsonl`` each step is one JSON line ``{"line", "step", "ok", "rows"}``;
+    the batch's ``--output`` applies to every step.  Top-level options (``--backend``, ``--image``...)
+    belong on the batch's own command line, so a step that starts with one is rejected.
+    """
+    import contextlib
+    import json
+
+    all_ok = True
+    for number, line, words in _batch_lines(args.file):
+        step, detail = None, "not a subcommand"
+        if words[0].startswith("-"):
+            detail = "top-level options cannot be set in a batch file; give them before 'batch'"
+        else:
+            try:
+                # Usage errors and --help go to stderr, keeping stdout for the results
+                with contextlib.redirect_stdout(sys.stderr):
+                    step = parser.parse_args(words)
+            except SystemExit:
+                pass  # argparse has already printed why
+        if step is None or step.command in (None, "batch"):
+            ok, rows, fields = False, [{"command": line, "ok": False, "detail": detail}], RESULT_FIELDS
+        else:
+            step.output = args.output
+            ok, rows, fields = run_command(step, backend)
+        if args.output in ("json", "jsonl"):
+            rows = [{field: row.get(field) for field in fields} for row in rows]
+            sys.stdout.write(json.dumps({"line": number, "step": line, "ok": ok, "rows": rows}) + "\n")
+        else:
+            sys.stdout.write(f"# {number}: {line}\n")
+            render(rows, fields, args.output)
+        sys.stdout.flush()
+        all_ok = all_ok and ok
+        if not ok and not args.keep_going:
+            print(f"Stopping at line {number}; use --keep-going to run the remaining steps.", file=sys.stderr)
+            break
+    return all_ok
+
+
+def main(args, parser, backend):
+    """Runs the subcommand in ``args`` and returns the process exit status."""
+    try:
+        if args.command == "batch":
+            ok = run_batch(args, parser, backend)
+        else:
+            ok, rows, fields = run_command(args, backend)
+            render(rows, fields, args.output)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        ok = False
+    return 0 if ok else 1
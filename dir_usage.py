@@ -0,0 +1,240 @@
+# dir_usage.py
+"""Finds what is filling a volume: directory sizes from a parallel scan.
+
+Directories are listed with ``os.scandir`` on a thread pool; each worker
+lists one directory, totals the files directly in it and queues its
+subdirectories.  Results stream back to the calling thread, which adds each
+directory's bytes to it and all its ancestors, so the largest subtrees can
+be shown while the scan is still running.
+
+Per-directory results are cached keyed by the directory's mtime.  A
+directory whose mtime is unchanged is not listed again; the rescan costs one
+``stat`` for it instead of a ``scandir`` plus a ``stat`` per file.  Adding,
+removing or renaming an entry changes the mtime, but a file growing in
+place does not, so a rescan can miss in-place growth in an unchanged
+directory; ``DirectoryUsageCache.clear()`` forces a full walk.
+"""
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import get_metrics
+
+DEFAULT_WORKERS = int(os.environ.get("DISKMAN_SCAN_WORKERS", "16"))
+DEFAULT_CACHE_PATH = os.environ.get("DISKMAN_SCAN_CACHE")  # Unset: the cache lives only for this process
+
+
+class DirectoryUsageCache:
+    """Per-directory ``(mtime_ns, bytes, files, subdirectories)`` entries, optionally kept in a JSON file.
+
+    Args:
+        path (str, optional): File to load the cache from and save it to. Defaults to ``$DISKMAN_SCAN_CACHE``.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as cache_file:
+                    self._entries = {directory: tuple(entry) for directory, entry in json.load(cache_file).items()}
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable scan cache {path}: {e}")
+
+    def get(self, directory, mtime_ns):
+        entry = self._entries.get(directory)
+        return entry if entry and entry[0] == mtime_ns else None
+
+    def put(self, directory, mtime_ns, size, files, subdirectories):
+        with self._lock:
+            self._entries[directory] = (mtime_ns, size, files, subdirectories)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self):
+        """Writes the cache to its file, if it has one."""
+        if not self.path:
+            return
+        with self._lock:
+            entries = dict(self._entries)
+        with open(self.path, "w") as cache_file:
+            json.dump(entries, cache_file)
+
+
+_cache = None
+
+
+def get_cache():
+    """Returns the process-wide directory cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = DirectoryUsageCache()
+    return _cache
+
+
+class ScanResult:
+    """Directory totals from a scan; ``totals`` includes everything below each directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self.totals = {}
+        self.files = 0
+        self.directories = 0
+        self.cached_directories = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def top(self, count=10):
+        """Returns the ``count`` largest directories below the root as ``(bytes, path)``."""
+        return heapq.nlargest(count, ((size, path) for path, size in self.totals.items() if path != self.root))
+
+
+def _list_directory(path, root_device, cache):
+    """Returns ``(path, bytes, files, subdirectories, from_cache, error)`` for one directory."""
+    try:
+        info = os.stat(path, follow_symlinks=False)
+        if info.st_dev != root_device:
+            return path, 0, 0, [], False, None  # Another file system is mounted here
+        mtime_ns = info.st_mtime_ns
+        entry = cache.get(path, mtime_ns)
+        if entry:
+            return path, entry[1], entry[2], [os.path.join(path, name) for name in entry[3]], True, None
+        size = files = 0
+        subdirectories = []
+        with os.scandir(path) as entries:
+            for dir_entry in entries:
+                try:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        if not getattr(dir_entry, "is_junction", lambda: False)():
+                            subdirectories.append(dir_entry.name)
+                    elif not dir_entry.is_symlink():
+                        info = dir_entry.stat(follow_symlinks=False)
+                        # Allocated bytes where the platform reports them, so sparse files count as what they use
+                        size += info.st_blocks * 512 if hasattr(info, "st_blocks") else info.st_size
+                        files += 1
+                except OSError:
+                    pass  # Vanished or unreadable entry; counted as nothing
+        cache.put(path, mtime_ns, size, files, subdirectories)
+        return path, size, files, [os.path.join(path, name) for name in subdirectories], False, None
+    except OSError as e:
+        return path, 0, 0, [], False, e
+
+
+def scan(root, workers=DEFAULT_WORKERS, cache=None, on_progress=None, progress_interval=2.0):
+    """Totals directory sizes under ``root`` without leaving its file system.
+
+    Args:
+        root (str): Directory to scan, usually a volume's mount point or drive root.
+        workers (int, optional): Directories listed at once. Defaults to ``$DISKMAN_SCAN_WORKERS`` or 16.
+        cache (DirectoryUsageCache, optional): Cache to reuse and update. Defaults to the process-wide one.
+        on_progress (callable, optional): Called with the ScanResult so far every ``progress_interval`` seconds.
+        progress_interval (float, optional): Seconds between progress calls. Defaults to 2.
+
+    Returns:
+        ScanResult: Totals per directory, counts and the directories that could not be read.
+    """
+    root = os.path.abspath(root)
+    cache = cache or get_cache()
+    result = ScanResult(root)
+    started = time.perf_counter()
+    results = queue.Queue()
+    root_device = os.stat(root).st_dev
+
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diskman-scan")
+
+    def visit(path):
+        if stop.is_set():
+            return
+        try:
+            listing = _list_directory(path, root_device, cache)
+        except Exception as e:
+            # Anything _list_directory does not handle still has to be posted, or the pending count never ends
+            listing = (path, 0, 0, [], False, e)
+        results.put(listing)  # Before the children are queued, so their results always arrive after it
+        for subdirectory in listing[3]:
+            pool.submit(visit, subdirectory)
+
+    try:
+        pending = 1
+        pool.submit(visit, root)
+        last_progress = time.monotonic()
+        while pending:
+            try:
+                path, size, files, subdirectories, from_cache, error = results.get(timeout=progress_interval)
+            except queue.Empty:
+                path = None
+            if path is not None:
+                pending += len(subdirectories) - 1
+                result.directories += 1
+                result.cached_directories += from_cache
+                result.files += files
+                if error:
+                    result.errors.append((path, error))
+                result.totals.setdefault(path, 0)
+                # Credit the bytes to the directory and every ancestor up to the root
+                directory = path
+                while size:
+                    result.totals[directory] = result.totals.get(directory, 0) + size
+                    parent = os.path.dirname(directory)
+                    if directory == root or parent == directory:
+                        break
+                    directory = parent
+            if on_progress and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                on_progress(result)
+    finally:
+        stop.set()  # Ends an interrupted scan without listing the queued directories
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    result.seconds = time.perf_counter() - started
+    cache.save()
+    get_metrics().record("scan", root, result.seconds, rows=result.directories, size=result.totals.get(root, 0))
+    return result
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def print_top(result, count=10):
+    """Prints the largest directories found so far, with their share of the scanned total."""
+    total = result.totals.get(result.root, 0)
+    print(f"\n{result.directories} directories, {result.files} files, {_format_size(total)} under {result.root}")
+    print("Size        Share  Directory")
+    print("----------  -----  ---------")
+    for size, path in result.top(count):
+        share = size * 100 / total if total else 0
+        print(f"{_format_size(size):>10}  {share:4.0f}%  {path}")
+
+
+def prompt_directory_usage(count=10):
+    """Asks for a volume and shows its largest directories, updating while the scan runs."""
+    from volume_management import prompt_mounted_volume, volume_root
+
+    volume = prompt_mounted_volume("scan")
+    if volume is None:
+        return
+    print(f"Scanning {volume_root(volume)} (Ctrl+C to stop)...")
+    try:
+        result = scan(volume_root(volume), on_progress=lambda partial: print_top(partial, count))
+    except KeyboardInterrupt:
+        print("Scan interrupted.")
+        return
+    except OSError as e:
+        print(f"Error: {e}")
+        return
+    print_top(result, count)
+    print(f"Scanned in {result.seconds:.1f}s ({result.cached_directories} directories unchanged since the last scan).")
+    if result.errors:
+        print(f"{len(result.errors)} directories could not be read, e.g. {result.errors[0][0]}: {result.errors[0][1]}")
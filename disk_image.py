@@ -0,0 +1,361 @@
+# disk_image.py
+"""MBR and GPT partition tables of raw disk images, read and edited in place.
+
+Images are opened through ``mmap`` and every table field is read with
+``struct.unpack_from`` on a ``memoryview`` of the mapping, so only the pages
+holding the tables are ever read, even for multi-hundred-GB sparse files.
+Edits are written back the same way; GPT edits update the primary and backup
+entry arrays and headers together, with their CRC32s recomputed.
+
+Only primary MBR partitions are handled; extended and logical partitions are
+left untouched.
+"""
+import mmap
+import os
+import struct
+import uuid
+import zlib
+
+from extent_map import ExtentMap, MB
+
+SECTOR_SIZE = 512
+
+GPT_SIGNATURE = b"EFI PART"
+GPT_REVISION = 0x00010000
+GPT_HEADER = struct.Struct("<8sIIIIQQQQ16sQIII")  # 92 bytes
+GPT_ENTRY = struct.Struct("<16s16sQQQ72s")        # 128 bytes
+GPT_ENTRY_COUNT = 128
+MBR_ENTRY = struct.Struct("<B3sB3sII")            # 16 bytes
+MBR_TABLE_OFFSET = 446
+MBR_PROTECTIVE = 0xEE
+
+BASIC_DATA = uuid.UUID("EBD0A0A2-B9E5-4433-87C0-68B6B72699C7")
+LINUX_FILESYSTEM = uuid.UUID("0FC63DAF-8483-4772-8E79-3D69D8477DE4")
+MBR_NTFS = 0x07
+
+_UNUSED_GUID = bytes(16)
+
+
+class ImagePartition:
+    """One partition table entry, with offsets in bytes."""
+
+    __slots__ = ("number", "start", "size", "type", "name", "guid")
+
+    def __init__(self, number, start, size, type, name="", guid=None):
+        self.number = number
+        self.start = start
+        self.size = size
+        self.type = type
+        self.name = name
+        self.guid = guid
+
+    def __repr__(self):
+        return f"ImagePartition({self.number}, start={self.start}, size={self.size})"
+
+
+class DiskImage:
+    """A raw disk image mapped into memory.
+
+    Args:
+        path (str): Image file.
+        writable (bool, optional): Map the file for writing. Defaults to False.
+        sector_size (int, optional): Logical sector size. Defaults to 512.
+
+    Raises:
+        ValueError: If the GPT headers are both corrupt.
+    """
+
+    def __init__(self, path, writable=False, sector_size=SECTOR_SIZE):
+        self.path = path
+        self.sector_size = sector_size
+        self.writable = writable
+        self._file = open(path, "r+b" if writable else "rb")
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._map)
+        self.scheme = None
+        self._header_lba = None
+        try:
+            if self.size >= 2 * sector_size and self._view[510:512] == b"\x55\xaa":
+                entries = self._mbr_entries()
+                if entries and entries[0][2] == MBR_PROTECTIVE:
+                    self.scheme = "gpt"
+                    self._header_lba = self._find_gpt_header()
+                else:
+                    self.scheme = "mbr"
+        except Exception:
+            self.close()  # Nothing else holds the mapping once the constructor fails
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Flushes pending writes and unmaps the image."""
+        if self._map.closed:
+            return
+        self._view.release()
+        if self.writable:
+            self._map.flush()
+        self._map.close()
+        self._file.close()
+
+    @property
+    def sectors(self):
+        return self.size // self.sector_size
+
+    def _mbr_entries(self):
+        entries = []
+        for slot in range(4):
+            status, _, part_type, _, first_lba, count = MBR_ENTRY.unpack_from(self._view, MBR_TABLE_OFFSET + slot * 16)
+            if part_type:
+                entries.append((slot + 1, status, part_type, first_lba, count))
+        return entries
+
+    def _read_header(self, lba):
+        offset = lba * self.sector_size
+        if lba <= 0 or offset + GPT_HEADER.size > self.size:
+            return None
+        fields = GPT_HEADER.unpack_from(self._view, offset)
+        if fields[0] != GPT_SIGNATURE or fields[2] < GPT_HEADER.size:
+            return None
+        header_crc = zlib.crc32(self._view[offset:offset + 16])
+        header_crc = zlib.crc32(b"\0\0\0\0", header_crc)
+        header_crc = zlib.crc32(self._view[offset + 20:offset + fields[2]], header_crc)
+        if header_crc != fields[3]:
+            return None
+        return fields
+
+    def _find_gpt_header(self):
+        for lba in (1, self.sectors - 1):
+            if self._read_header(lba):
+                return lba
+        raise ValueError(f"{self.path}: both GPT headers are missing or fail their CRC check")
+
+    def _gpt_header(self):
+        (_, _, _, _, _, current_lba, backup_lba, first_usable, last_usable,
+         disk_guid, entries_lba, entry_count, entry_size, entries_crc) = self._read_header(self._header_lba)
+        return {
+            "backup_lba": backup_lba if self._header_lba == 1 else current_lba,
+            "first_usable": first_usable, "last_usable": last_usable, "disk_guid": disk_guid,
+            "entries_lba": entries_lba, "entry_count": entry_count, "entry_size": entry_size,
+        }
+
+    def partitions(self):
+        """Returns the partitions in table order.
+
+        Returns:
+            list: ImagePartition objects; ``type`` is a UUID for GPT and an int for MBR.
+        """
+        if self.scheme == "mbr":
+            return [
+                ImagePartition(number, first_lba * self.sector_size, count * self.sector_size, part_type)
+                for number, _, part_type, first_lba, count in self._mbr_entries()
+            ]
+        if self.scheme != "gpt":
+            return []
+        header = self._gpt_header()
+        base = header["entries_lba"] * self.sector_size
+        partitions = []
+        for slot in range(header["entry_count"]):
+            type_guid, unique_guid, first_lba, last_lba, _, name = GPT_ENTRY.unpack_from(
+                self._view, base + slot * header["entry_size"])
+            if type_guid == _UNUSED_GUID:
+                continue
+            partitions.append(ImagePartition(
+                slot + 1, first_lba * self.sector_size, (last_lba - first_lba + 1) * self.sector_size,
+                uuid.UUID(bytes_le=type_guid), name.decode("utf-16-le").rstrip("\0"), uuid.UUID(bytes_le=unique_guid),
+            ))
+        return partitions
+
+    def extent_map(self):
+        """Returns an ExtentMap of the image's partitions and the gaps new ones may use."""
+        if self.scheme == "gpt":
+            header = self._gpt_header()
+            reserved_start = header["first_usable"] * self.sector_size
+            reserved_end = self.size - (header["last_usable"] + 1) * self.sector_size
+        else:
+            reserved_start, reserved_end = MB, 0
+        return ExtentMap(self.size, [(p.number, p.start, p.size) for p in self.partitions()],
+                         reserved_start=reserved_start, reserved_end=reserved_end)
+
+    def read(self, offset, length):
+        """Returns a zero-copy view of ``length`` bytes at ``offset``; release it before closing."""
+        return self._view[offset:offset + length]
+
+    def create_partition(self, size, type=None, name=""):
+        """Adds a partition of ``size`` bytes in the smallest 1 MiB-aligned gap that holds it.
+
+        Args:
+            size (int): Partition size in bytes; rounded up to whole sectors.
+            type (uuid.UUID or int, optional): GPT type GUID or MBR type byte.
+                Defaults to Microsoft basic data (GPT) or 0x07 (MBR).
+            name (str, optional): GPT partition name, up to 36 characters.
+
+        Returns:
+            ImagePartition: The new partition.
+
+        Raises:
+            ValueError: If the image has no partition table, no free slot or no gap large enough.
+        """
+        if self.scheme is None:
+            raise ValueError(f"{self.path} has no partition table; create one with create_image()")
+        size = -(-size // self.sector_size) * self.sector_size
+        start = self.extent_map().find_placement(size)
+        if start is None:
+            raise ValueError(f"No unallocated extent of {size // MB} MB on {self.path}")
+        first_lba, count = start // self.sector_size, size // self.sector_size
+        if self.scheme == "mbr":
+            return self._create_mbr_partition(first_lba, count, MBR_NTFS if type is None else type)
+        return self._create_gpt_partition(first_lba, count, BASIC_DATA if type is None else type, name)
+
+    def _create_mbr_partition(self, first_lba, count, part_type):
+        if first_lba + count > 0xFFFFFFFF:
+            raise ValueError("MBR partitions must end within the first 2 TiB")
+        used = {number for number, *_ in self._mbr_entries()}
+        free = [number for number in range(1, 5) if number not in used]
+        if not free:
+            raise ValueError(f"All four primary partition slots of {self.path} are in use")
+        # CHS fields are obsolete; 0xFEFFFF tells readers to use the LBA fields
+        MBR_ENTRY.pack_into(self._view, MBR_TABLE_OFFSET + (free[0] - 1) * 16,
+                            0, b"\xfe\xff\xff", part_type, b"\xfe\xff\xff", first_lba, count)
+        return ImagePartition(free[0], first_lba * self.sector_size, count * self.sector_size, part_type)
+
+    def _create_gpt_partition(self, first_lba, count, type_guid, name):
+        header = self._gpt_header()
+        base = header["entries_lba"] * self.sector_size
+        for slot in range(header["entry_count"]):
+            if self._view[base + slot * header["entry_size"]:base + slot * header["entry_size"] + 16] == _UNUSED_GUID:
+                break
+        else:
+            raise ValueError(f"All {header['entry_count']} GPT entries of {self.path} are in use")
+        unique_guid = uuid.uuid4()
+        GPT_ENTRY.pack_into(self._view, base + slot * header["entry_size"], type_guid.bytes_le, unique_guid.bytes_le,
+                            first_lba, first_lba + count - 1, 0, name[:36].encode("utf-16-le"))
+        self._write_gpt(header)
+        return ImagePartition(slot + 1, first_lba * self.sector_size, count * self.sector_size, type_guid, name[:36],
+                              unique_guid)
+
+    def delete_partition(self, number):
+        """Removes partition ``number`` from the table; its data is left in place.
+
+        Raises:
+            ValueError: If there is no such partition.
+        """
+        if number not in {partition.number for partition in self.partitions()}:
+            raise ValueError(f"{self.path} has no partition {number}")
+        if self.scheme == "mbr":
+            self._view[MBR_TABLE_OFFSET + (number - 1) * 16:MBR_TABLE_OFFSET + number * 16] = bytes(16)
+            return
+        header = self._gpt_header()
+        offset = header["entries_lba"] * self.sector_size + (number - 1) * header["entry_size"]
+        self._view[offset:offset + header["entry_size"]] = bytes(header["entry_size"])
+        self._write_gpt(header)
+
+    def _write_gpt(self, header):
+        """Copies the live entry array to both copies and rewrites both headers with fresh CRCs."""
+        array_bytes = header["entry_count"] * header["entry_size"]
+        array_sectors = -(-array_bytes // self.sector_size)
+        source = header["entries_lba"] * self.sector_size
+        primary_entries = 2
+        backup_lba = header["backup_lba"]
+        backup_entries = backup_lba - array_sectors
+        for entries_lba in (primary_entries, backup_entries):
+            target = entries_lba * self.sector_size
+            if target != source:
+                self._view[target:target + array_bytes] = self._view[source:source + array_bytes]
+        entries_crc = zlib.crc32(self._view[primary_entries * self.sector_size:
+                                            primary_entries * self.sector_size + array_bytes])
+        for current_lba, other_lba, entries_lba in ((1, backup_lba, primary_entries),
+                                                     (backup_lba, 1, backup_entries)):
+            self._pack_header(current_lba, other_lba, header["first_usable"], header["last_usable"],
+                              header["disk_guid"], entries_lba, header["entry_count"], header["entry_size"],
+                              entries_crc)
+        self._header_lba = 1
+
+    def _pack_header(self, current_lba, backup_lba, first_usable, last_usable, disk_guid, entries_lba,
+                     entry_count, entry_size, entries_crc):
+        fields = (GPT_SIGNATURE, GPT_REVISION, GPT_HEADER.size, 0, 0, current_lba, backup_lba, first_usable,
+                  last_usable, disk_guid, entries_lba, entry_count, entry_size, entries_crc)
+        offset = current_lba * self.sector_size
+        self._view[offset:offset + self.sector_size] = bytes(self.sector_size)
+        GPT_HEADER.pack_into(self._view, offset, *fields)
+        struct.pack_into("<I", self._view, offset + 16, zlib.crc32(self._view[offset:offset + GPT_HEADER.size]))
+
+    def initialize_gpt(self):
+        """Writes a protective MBR and an empty GPT over the whole image."""
+        array_sectors = GPT_ENTRY_COUNT * GPT_ENTRY.size // self.sector_size
+        last_lba = self.sectors - 1
+        self._view[:self.sector_size * (2 + array_sectors)] = bytes(self.sector_size * (2 + array_sectors))
+        MBR_ENTRY.pack_into(self._view, MBR_TABLE_OFFSET, 0, b"\x00\x02\x00", MBR_PROTECTIVE, b"\xff\xff\xff",
+                            1, min(last_lba, 0xFFFFFFFF))
+        self._view[510:512] = b"\x55\xaa"
+        backup_start = (last_lba - array_sectors) * self.sector_size
+        self._view[backup_start:(last_lba + 1) * self.sector_size] = bytes((array_sectors + 1) * self.sector_size)
+        header = {
+            "backup_lba": last_lba, "first_usable": 2 + array_sectors, "last_usable": last_lba - array_sectors - 1,
+            "disk_guid": uuid.uuid4().bytes_le, "entries_lba": 2, "entry_count": GPT_ENTRY_COUNT,
+            "entry_size": GPT_ENTRY.size,
+        }
+        self._write_gpt(header)
+        self.scheme = "gpt"
+
+    def initialize_mbr(self):
+        """Writes an empty MBR partition table with a random disk signature."""
+        self._view[:self.sector_size] = bytes(self.sector_size)
+        self._view[440:444] = os.urandom(4)
+        self._view[510:512] = b"\x55\xaa"
+        self.scheme = "mbr"
+
+
+def create_image(path, size, scheme="gpt", sector_size=SECTOR_SIZE):
+    """Creates a sparse image of ``size`` bytes with an empty partition table.
+
+    Args:
+        path (str): Image file to create; an existing file is overwritten.
+        size (int): Image size in bytes; rounded down to whole MiB.
+        scheme (str, optional): ``"gpt"`` or ``"mbr"``. Defaults to ``"gpt"``.
+        sector_size (int, optional): Logical sector size. Defaults to 512.
+    """
+    if scheme not in ("gpt", "mbr"):
+        raise ValueError(f"Unknown partition scheme: {scheme}")
+    with open(path, "wb") as image_file:
+        image_file.truncate(size // MB * MB)  # Sparse: no data blocks are allocated
+    with DiskImage(path, writable=True, sector_size=sector_size) as image:
+        if scheme == "gpt":
+            image.initialize_gpt()
+        else:
+            image.initialize_mbr()
+
+
+def detect_file_system(image, partition):
+    """Returns the file system in a partition from its superblock, or "" if unrecognised."""
+    boot = image.read(partition.start, 512)
+    try:
+        if boot[3:11] == b"NTFS    ":
+            return "NTFS"
+        if boot[3:11] == b"EXFAT   ":
+            return "exFAT"
+        if boot[82:90] == b"FAT32   ":
+            return "FAT32"
+        if boot[54:59] in (b"FAT12", b"FAT16"):
+            return "FAT"
+        if boot[0:4] == b"XFSB":
+            return "xfs"
+    finally:
+        boot.release()
+    superblock = image.read(partition.start + 1024, 104)
+    try:
+        if len(superblock) == 104 and superblock[56:58] == b"\x53\xef":
+            compat, incompat = struct.unpack_from("<II", superblock, 92)
+            return "ext4" if incompat & 0x40 else ("ext3" if compat & 0x4 else "ext2")
+    finally:
+        superblock.release()
+    return ""
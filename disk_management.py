@@ -1,126 +1,133 @@
-import wmi
-import subprocess
-import sys
-
-def list_disks():
-    """Lists all connected disks with basic information."""
-    try:
-        c = wmi.WMI()
-        disk_counter = 1  # Counter for disk numbering
-
-        print("Disk ### Status  Size")
-        print("------- -------- --------")
-        for disk in c.Win32_DiskDrive():
-            # Extract relevant disk details (assuming size in GB)
-            size = int(disk.Size) / (1024**3)  # Convert bytes to GB
-            status = disk.Status
-
-            # Format output similar to the sample
-            print(f"Disk {disk_counter}  {status[:6]}  {size:.2f} GB")
-            disk_counter += 1  # Increment disk counter
-    except Exception as wmi_error:
-        print(f"WMI error occurred: {wmi_error}")
-        print("Falling back to subprocess to execute diskpart commands...")
-        try:
-            # Execute diskpart commands using subprocess
-            diskpart_output = subprocess.run(["diskpart", "/c", "list disk"], capture_output=True, text=True)
-            if diskpart_output.returncode == 0:
-                print(diskpart_output.stdout)
-            else:
-                print("Error executing diskpart commands.")
-        except Exception as subprocess_error:
-            print(f"Error occurred while listing disks: {subprocess_error}")
-            sys.exit(1)
-
-def list_and_select_disk():
-    """Lists disks and prompts the user to select one."""
-    try:
-        c = wmi.WMI()
-        disks = c.Win32_DiskDrive()
-
-        if not disks:
-            print("No disks found on the system.")
-            return None
-
-        print("Available disks:")
-        print("Disk ###  Status       Size")
-        print("-------  --------  --------")
-        for i, disk in enumerate(disks):
-            status = disk.Status if hasattr(disk, 'Status') else "Unknown"
-            size = f"{int(disk.Size) / (1024**3):.2f} GB" if hasattr(disk, 'Size') else "Unknown"
-            print(f"{i + 1}.       {status:<10}  {size}")
-
-        while True:
-            try:
-                disk_number = int(input("Enter the number of the disk to select (0 to cancel): "))
-                if disk_number == 0:
-                    print("Operation canceled.")
-                    return None
-                elif 1 <= disk_number <= len(disks):
-                    selected_disk = disks[disk_number - 1]
-                    print(f"Selected disk: {selected_disk.Caption}")
-                    return selected_disk
-                else:
-                    print("Invalid disk number. Please enter a number within the range.")
-            except ValueError:
-                print("Invalid input. Please enter a number.")
-
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        sys.exit(1)
-
-def create_partition(disk_number: int, partition_size_mb: int) -> bool:
-    """
-    Creates a new primary partition on the specified disk using WMI or subprocess.
-
-    Args:
-        disk_number (int): The disk number (0 for the first disk, 1 for the second, etc.).
-        partition_size_mb (int): The desired size of the partition in Megabytes (MB).
-
-    Returns:
-        bool: True if the partition was successfully created, False otherwise.
-        
-    Raises:
-        ValueError: If the disk number or partition size is invalid.
-        OSError: If an error occurs during partition creation.
-    """
-    try:
-        # Connect to WMI
-        c = wmi.WMI()
-
-        # Get logical disks
-        logical_disks = c.Win32_LogicalDisk(DriveType=0)  # Restrict to fixed disks
-
-        # Check if disk number is valid
-        if not 0 <= disk_number < len(logical_disks):
-            raise ValueError(f"Invalid disk number: {disk_number}")
-
-        # Check if partition size is valid
-        if partition_size_mb <= 0:
-            raise ValueError("Partition size must be greater than zero.")
-
-        # Get selected disk object
-        selected_disk = logical_disks[disk_number]
-
-        # Check if there's enough free space
-        free_space_mb = int(selected_disk.FreeSpace // (1024**2))
-        if free_space_mb < partition_size_mb:
-            raise OSError(f"Insufficient free space on disk. Required: {partition_size_mb} MB, Available: {free_space_mb} MB.")
-
-        # Create the new partition using WMI
-        selected_disk.CreatePartition(Type='Basic', UseMaximumSize=False, MaximumSize=partition_size_mb * 1024 * 1024)
-        return True
-    except Exception as wmi_error:
-        print(f"WMI error occurred: {wmi_error}")
-        print("Attempting to create partition using subprocess...")
-        try:
-            # Attempt to create the partition using subprocess (requires administrative privileges)
-            subprocess.run(["diskpart", "/s", "create_partition_script.txt"], check=True)
-            return True
-        except subprocess.CalledProcessError as subprocess_error:
-            print(f"Subprocess error occurred: {subprocess_error}")
-            raise OSError("Failed to create partition using both WMI and subprocess.")
-        except Exception as subprocess_error:
-            print(f"Unknown subprocess error occurred: {subprocess_error}")
-            raise OSError("Failed to create partition using both WMI and subprocess.")
-
+import sys
+
+from backends import loaded_backend
+from diskpart_script import DiskpartScript
+from extent_map import MB
+from inventory_cache import get_inventory
+from listing import iter_disk_rows
+from wmi_session import get_session
+
+def list_disks(snapshot=None):
+    """Lists all connected disks with basic information.
+
+    Args:
+        snapshot (TopologySnapshot, optional): Inventory to list, e.g. from a
+            remote host. Defaults to the local cached inventory.
+    """
+    try:
+        print("Disk ### Status  Size")
+        print("------- -------- --------")
+        # Rows are printed as the generator yields them
+        for disk_counter, row in enumerate(iter_disk_rows(snapshot), start=1):
+            size = (row["size"] or 0) / (1024**3)  # Convert bytes to GB
+            print(f"Disk {disk_counter}  {row['status'][:6]}  {size:.2f} GB")
+    except Exception as wmi_error:
+        if loaded_backend("wmi") is None:
+            # diskpart only exists where the WMI backend runs; sysfs and image errors are reported as they are
+            print(f"Error occurred while listing disks: {wmi_error}")
+            return
+        print(f"WMI error occurred: {wmi_error}")
+        print("Falling back to subprocess to execute diskpart commands...")
+        try:
+            # Execute diskpart commands using subprocess
+            result = DiskpartScript().list_disk().run()[0]
+            if result.ok:
+                print(result.output)
+            else:
+                print("Error executing diskpart commands.")
+        except Exception as subprocess_error:
+            print(f"Error occurred while listing disks: {subprocess_error}")
+            sys.exit(1)
+
+def list_and_select_disk():
+    """Lists disks and prompts the user to select one."""
+    try:
+        disks = get_inventory().snapshot().disks
+
+        if not disks:
+            print("No disks found on the system.")
+            return None
+
+        print("Available disks:")
+        print("Disk ###  Status       Size")
+        print("-------  --------  --------")
+        for i, disk in enumerate(disks):
+            status = disk.status
+            size = f"{disk.size / (1024**3):.2f} GB" if disk.size is not None else "Unknown"
+            print(f"{i + 1}.       {status:<10}  {size}")
+
+        while True:
+            try:
+                disk_number = int(input("Enter the number of the disk to select (0 to cancel): "))
+                if disk_number == 0:
+                    print("Operation canceled.")
+                    return None
+                elif 1 <= disk_number <= len(disks):
+                    selected_disk = disks[disk_number - 1]
+                    print(f"Selected disk: {selected_disk.caption}")
+                    return selected_disk
+                else:
+                    print("Invalid disk number. Please enter a number within the range.")
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+
+def create_partition(disk_number: int, partition_size_mb: int) -> bool:
+    """
+    Creates a new primary partition on the specified disk using WMI or subprocess.
+
+    Args:
+        disk_number (int): The disk number (0 for the first disk, 1 for the second, etc.).
+        partition_size_mb (int): The desired size of the partition in Megabytes (MB).
+
+    Returns:
+        bool: True if the partition was successfully created, False otherwise.
+        
+    Raises:
+        ValueError: If the disk number or partition size is invalid.
+        OSError: If an error occurs during partition creation.
+    """
+    snapshot = get_inventory().snapshot()
+
+    # Check if disk number is valid
+    disks = [disk for disk in snapshot.disks if disk.index == disk_number]
+    if not disks:
+        raise ValueError(f"Invalid disk number: {disk_number}")
+
+    # Check if partition size is valid
+    if partition_size_mb <= 0:
+        raise ValueError("Partition size must be greater than zero.")
+
+    # Check there is an unallocated extent large enough, using the disk's extent map
+    extents = snapshot.extent_map(disks[0].device_id)
+    if extents.find_placement(partition_size_mb * MB) is None:
+        largest = extents.largest_free_extent()
+        free_space_mb = largest[1] // MB if largest else 0
+        raise OSError(f"Insufficient unallocated space on disk. Required: {partition_size_mb} MB, Available: {free_space_mb} MB.")
+
+    try:
+        # Create the new partition using WMI
+        selected_disk = get_session().query(lambda c: c.Win32_DiskDrive(Index=disk_number))[0]
+        selected_disk.CreatePartition(Type='Basic', UseMaximumSize=False, MaximumSize=partition_size_mb * MB)
+        return True
+    except Exception as wmi_error:
+        print(f"WMI error occurred: {wmi_error}")
+        print("Attempting to create partition using subprocess...")
+        try:
+            # Attempt to create the partition in one diskpart run (requires administrative privileges)
+            results = DiskpartScript().select_disk(disk_number).create_partition(partition_size_mb).run()
+        except Exception as subprocess_error:
+            print(f"Unknown subprocess error occurred: {subprocess_error}")
+            raise OSError("Failed to create partition using both WMI and subprocess.")
+        failed = [result for result in results if not result.ok]
+        if failed:
+            print(f"Subprocess error occurred: {failed[0].command}: {failed[0].output or 'not run'}")
+            raise OSError("Failed to create partition using both WMI and subprocess.")
+        return True
+    finally:
+        # The disk layout may have changed whichever path ran
+        get_inventory().invalidate([disk_number])
+
@@ -1,109 +1,372 @@
-import os
-from disk_management import list_disks, list_and_select_disk, create_partition
-from volume_management import format_volume_quick, list_volumes, resize_volume, format_volume
-import diskmanhelp
-
-def print_version_info():
-  """Prints the version information, copyright notice, and computer name."""
-  computer_name = os.environ.get('COMPUTERNAME', 'Unknown')
-  print(" DiskMan Version 1.0.0")
-  print("Copyright (C) ZMSTECH.")
-  print(f"On computer: {computer_name}")
-
-def main():
-  """Main program loop with basic text-based UI (TUI)"""
-  selected_disk = None
-
-  while True:
-    print("\n**  DiskMan **")  # Enhanced banner
-    print("1. List Disks")
-    print("2. Select Disk")
-    print("3. Create and Delete Partition (on Selected Disk)")
-    print("4. Format Volume (Quick) - Selected Disk")
-    print("5. Format Volume (Custom) - Selected Disk")
-    print("6. Resize Volume - Selected Disk")
-    print("7. List Volumes (All Disks or Selected Disk)")
-    print("8. Exit DiskPart")
-    print("9. Help")
-    print("10. Exit")
-    choice = input("Enter your choice (1-10): ")
-
-    if choice == "1":
-      list_disks()
-    elif choice == "2":
-      selected_disk = list_and_select_disk()
-    elif choice == "3":
-        if selected_disk:
-            try:
-                size = int(input("Enter size for the primary partition (in MB): "))
-                if size <= 0:
-                    print("Partition size must be greater than zero.")
-                else:
-                    if create_partition(selected_disk, size):
-                        print("Partition created successfully.")
-                    else:
-                        print("Partition creation failed.")
-            except ValueError:
-                print("Invalid input. Please enter a valid integer value for partition size.")
-        else:
-            print("No disk selected. Please select a disk first.")
-
-
-
-    elif choice == "4":
-      if selected_disk:
-        format_volume_quick(selected_disk)
-      else:
-        print("No disk selected. Please select a disk first.")
-    elif choice == "5":
-        if selected_disk:
-            supported_file_systems = ['NTFS', 'FAT32', 'exFAT']  # Update with actual supported file systems
-            print("Supported file systems:", supported_file_systems)
-            fs = input("Enter file system (e.g., NTFS, FAT32, exFAT): ").upper()
-            if fs not in supported_file_systems:
-                print("Invalid file system.")
-                continue
-            size = input("Enter allocation unit size: ")
-            label = input("Enter volume label: ")
-            format_volume(selected_disk, fs, size, label)
-        else:
-            print("No disk selected. Please select a disk first.")
-
-    elif choice == "6":
-        if selected_disk:
-            print("\n** Resize Volume **")
-            extend_size = input("Enter size to extend volume (in MB, leave empty for no extension): ").strip()
-            shrink_desired_size = input("Enter desired size to shrink (in MB, leave empty for no shrink): ").strip()
-            shrink_min_size = input("Enter minimum size to shrink (in MB, leave empty for no shrink): ").strip()
-            
-            if extend_size or shrink_desired_size or shrink_min_size:
-                volumes = selected_disk.associators("Win32_DiskDriveToDiskPartition")[0].associators("Win32_LogicalDisk")
-                resize_volume(volumes, extend_size, shrink_desired_size, shrink_min_size)
-            else:
-                print("No resizing options provided. Operation canceled.")
-        else:
-            print("No disk selected. Please select a disk first.")
-
-    elif choice == "7":
-      if selected_disk:
-        print("\nVolume Information for Selected Disk:")
-        list_volumes(selected_disk)
-      else:
-        print("\nVolume Information for All Disks:")
-        list_volumes()
-    elif choice == "8":
-      print("Exiting DiskPart")
-      break
-    elif choice == "9":
-        diskmanhelp.display_help()  
-    elif choice == "10":
-      print("Exiting...")
-      break
-    else:
-      print("Invalid choice. Please enter a number between 1 and 10.")
-
-
-
-if __name__ == "__main__":
-  print_version_info()
-  main()
+import argparse
+import os
+import backends
+import commands
+import diskmanhelp
+
+def print_version_info():
+  """Prints the version information, copyright notice, and computer name."""
+  computer_name = os.environ.get('COMPUTERNAME', 'Unknown')
+  print(" DiskMan Version 1.0.0")
+  print("Copyright (C) ZMSTECH.")
+  print(f"On computer: {computer_name}")
+
+def build_parser():
+  """Returns the command-line parser, including the non-interactive subcommands."""
+  parser = argparse.ArgumentParser(description="DiskMan disk management tool")
+  parser.add_argument("--version", action="store_true", help="print the version information and exit")
+  parser.add_argument("--backend", choices=sorted(backends.BACKENDS), help="disk backend to use (default: %s)" % backends.default_backend())
+  parser.add_argument("--image", action="append", metavar="PATH", help="raw disk image to manage instead of real disks (repeatable; implies --backend image)")
+  parser.add_argument("--watch", action="store_true", help="update the inventory from device change events instead of re-querying on a short TTL")
+  parser.add_argument("--serve", action="store_true", help="run as an agent serving the inventory as JSON over localhost HTTP")
+  parser.add_argument("--listen", default="127.0.0.1:8765", metavar="HOST:PORT", help="agent address (default: 127.0.0.1:8765)")
+  parser.add_argument("--socket", metavar="PATH", help="serve the agent on this Unix socket instead of TCP (implies --serve)")
+  parser.add_argument("--store", metavar="PATH", help="snapshot database (default: $DISKMAN_STORE or diskman_snapshots.db)")
+  parser.add_argument("--snapshot", action="store_true", help="save the current inventory to the snapshot store and exit")
+  parser.add_argument("--snapshot-every", type=float, metavar="SECONDS", help="keep saving the inventory every SECONDS until interrupted (alongside --serve if given)")
+  parser.add_argument("--snapshots", action="store_true", help="list the stored snapshots and exit")
+  parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="show what changed between two snapshots (ids, 'latest', 'previous' or -N)")
+  parser.add_argument("--history", metavar="VOLUME", help="show the free-space history of a volume (e.g. E: or /home)")
+  parser.add_argument("--hosts", help="comma-separated hostnames to inventory in parallel instead of starting the TUI")
+  parser.add_argument("--hosts-file", help="file with one hostname per line to inventory in parallel")
+  parser.add_argument("--workers", type=int, default=8, help="hosts queried at once (default: 8)")
+  parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each host (default: 60)")
+  parser.add_argument("--retries", type=int, default=1, help="extra attempts per failed host (default: 1)")
+  parser.add_argument("--profile", action="store_true", help="print a per-action breakdown of backend calls on exit")
+  parser.add_argument("--profile-json", metavar="PATH", help="write backend call metrics to a JSON file on exit")
+  parser.add_argument("--profile-prom", metavar="PATH", help="write backend call metrics to a Prometheus text file on exit")
+  commands.add_parsers(parser.add_subparsers(dest="command", metavar="COMMAND",
+                                             help="run one action without the TUI (see COMMAND --help)"))
+  return parser
+
+def parse_args(argv=None):
+  """Parses the command line; without options or a subcommand the interactive TUI starts."""
+  return build_parser().parse_args(argv)
+
+def read_hosts(args):
+  """Collects hostnames from --hosts and --hosts-file."""
+  hosts = [host.strip() for host in (args.hosts or "").split(",") if host.strip()]
+  if args.hosts_file:
+    with open(args.hosts_file) as hosts_file:
+      hosts += [line.strip() for line in hosts_file if line.strip() and not line.startswith("#")]
+  return hosts
+
+_backend_name = None
+_watch = False  # Keep the inventory current from change events (--watch)
+_watcher = None
+
+def backend():
+  """Returns the disk backend, importing it and starting the job engine on first use."""
+  global _watcher
+  loaded = backends.loaded_backend(_backend_name)
+  if loaded is None:
+    from jobs import JobEngine, set_job_engine
+    loaded = backends.load_backend(_backend_name)
+    set_job_engine(JobEngine(on_update=report_job))  # Format/resize run in the background
+    if _watch and hasattr(loaded, "event_source"):
+      from inventory_events import InventoryWatcher
+      _watcher = InventoryWatcher(loaded.event_source()).start()
+  return loaded
+
+def shutdown():
+  """Stops whatever backend() started: the event watcher, the backend and its job engine.
+
+  Called once on the way out of every mode, so a new mode cannot leave a
+  watcher or job workers running.
+  """
+  global _watcher
+  if _watcher is not None:
+    _watcher.stop()
+    _watcher = None
+  loaded = backends.loaded_backend(_backend_name)
+  if loaded is not None:
+    loaded.close()
+    from jobs import get_job_engine
+    get_job_engine().shutdown(wait=True)  # Already done by backends whose close() waits for jobs
+
+def report_job(job):
+  """Prints a line when a background job finishes, without waiting for the menu."""
+  from jobs import CANCELLED, DONE, FAILED
+  if job.status == DONE:
+    print(f"\n[Job {job.id}] {job.description} completed in {job.elapsed:.1f}s.")
+  elif job.status == FAILED:
+    print(f"\n[Job {job.id}] {job.description} failed: {job.error}")
+  elif job.status == CANCELLED:
+    print(f"\n[Job {job.id}] {job.description} cancelled.")
+
+def show_jobs(engine):
+  """Shows live job status and lets the user cancel a job."""
+  from jobs import print_jobs
+  print_jobs(engine)
+  job_number = input("Enter a job number to cancel (leave empty to return): ").strip()
+  if not job_number:
+    return
+  for job in engine.jobs():
+    if str(job.id) == job_number:
+      if job.cancel():
+        print(f"Cancellation requested for job {job.id}.")
+      else:
+        print(f"Job {job.id} cannot be cancelled while it is {job.status}.")
+      return
+  print("No such job.")
+
+# Names under which backend calls are recorded for each menu choice
+MENU_ACTIONS = {
+  "1": "list_disks", "2": "select_disk", "3": "create_partition", "4": "format_quick",
+  "5": "format_custom", "6": "resize_volume", "7": "list_volumes", "11": "jobs", "12": "bulk_format",
+  "13": "directory_usage", "14": "volume_benchmark", "15": "surface_scan",
+}
+
+def open_store(args):
+  """Returns the SnapshotStore selected by --store."""
+  from snapshot_store import DEFAULT_PATH, SnapshotStore
+  return SnapshotStore(args.store or DEFAULT_PATH)
+
+def save_snapshot(store):
+  """Saves the backend's current inventory and prints the new snapshot id."""
+  from inventory_cache import get_inventory
+  backend()
+  snapshot_id = store.save(get_inventory().snapshot())
+  print(f"Saved snapshot {snapshot_id}.")
+  return snapshot_id
+
+def save_snapshots(args, interval, stop=None):
+  """Saves a snapshot every ``interval`` seconds until interrupted or ``stop`` is set."""
+  import threading
+  stop = stop or threading.Event()
+  with open_store(args) as store:  # Opened here: SQLite connections stay on the thread that made them
+    try:
+      while True:
+        save_snapshot(store)
+        if stop.wait(interval):
+          break
+    except KeyboardInterrupt:
+      print("Stopping snapshots.")
+
+def run_store_command(args):
+  """Handles --snapshots, --diff and --history; returns False if none was given."""
+  import time
+  import snapshot_store
+  with open_store(args) as store:
+    try:
+      if args.snapshots:
+        for snapshot_id, host, taken in store.snapshots():
+          print(f"{snapshot_id:>8}  {host:<20}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(taken))}")
+      elif args.diff:
+        old, new = (store.resolve(reference) for reference in args.diff)
+        changes = store.diff(old, new)
+        print(f"Changes from snapshot {old} to {new}:")
+        snapshot_store.print_diff(changes)
+      elif args.history:
+        snapshot_store.print_history(store.history(args.history))
+      else:
+        return False
+    except ValueError as e:
+      print(f"Error: {e}")
+  return True
+
+def report_profile(args):
+  """Prints and exports the backend call metrics requested on the command line."""
+  if not (args.profile or args.profile_json or args.profile_prom):
+    return
+  from instrumentation import get_metrics
+  metrics = get_metrics()
+  if args.profile:
+    metrics.print_report()
+  if args.profile_json:
+    metrics.export_json(args.profile_json)
+  if args.profile_prom:
+    metrics.export_prometheus(args.profile_prom)
+
+def main():
+  """Main program loop with basic text-based UI (TUI)"""
+  selected_disk = None
+
+  while True:
+    print("\n**  DiskMan **")  # Enhanced banner
+    print("1. List Disks")
+    print("2. Select Disk")
+    print("3. Create and Delete Partition (on Selected Disk)")
+    print("4. Format Volume (Quick) - Selected Disk")
+    print("5. Format Volume (Custom) - Selected Disk")
+    print("6. Resize Volume - Selected Disk")
+    print("7. List Volumes (All Disks or Selected Disk)")
+    print("8. Exit DiskPart")
+    print("9. Help")
+    print("10. Exit")
+    print("11. Jobs (status and cancel)")
+    print("12. Bulk Format Volumes")
+    print("13. Directory Usage (what is filling a volume)")
+    print("14. Benchmark Volume")
+    print("15. Surface Scan (read-only) - Selected Disk")
+    choice = input("Enter your choice (1-15): ")
+    if choice in MENU_ACTIONS:
+      from instrumentation import get_metrics
+      get_metrics().set_action(MENU_ACTIONS[choice])
+
+    if choice == "1":
+      backend().list_disks()
+    elif choice == "2":
+      selected_disk = backend().list_and_select_disk()
+    elif choice == "3":
+        if selected_disk and hasattr(backend(), "delete_partition") and \
+            input("Create or delete a partition? (c/d): ").strip().lower() == "d":
+            try:
+                number = int(input("Enter the number of the partition to delete (as in List Volumes): "))
+                if backend().delete_partition(selected_disk.index, number):
+                    print("Partition deleted successfully.")
+            except ValueError as e:
+                print(f"Invalid input: {e}")
+            except OSError as e:
+                print(f"Partition deletion failed: {e}")
+        elif selected_disk:
+            try:
+                size = int(input("Enter size for the primary partition (in MB): "))
+                if size <= 0:
+                    print("Partition size must be greater than zero.")
+                else:
+                    if backend().create_partition(selected_disk.index, size):
+                        print("Partition created successfully.")
+                    else:
+                        print("Partition creation failed.")
+            except ValueError:
+                print("Invalid input. Please enter a valid integer value for partition size.")
+            except OSError as e:
+                print(f"Partition creation failed: {e}")
+        else:
+            print("No disk selected. Please select a disk first.")
+
+
+
+    elif choice == "4":
+      if selected_disk:
+        backend().format_volume_quick(selected_disk)
+      else:
+        print("No disk selected. Please select a disk first.")
+    elif choice == "5":
+        if selected_disk:
+            supported_file_systems = ['NTFS', 'FAT32', 'exFAT']  # Update with actual supported file systems
+            print("Supported file systems:", supported_file_systems)
+            fs = input("Enter file system (e.g., NTFS, FAT32, exFAT): ").upper()
+            if fs not in supported_file_systems:
+                print("Invalid file system.")
+                continue
+            size = input("Enter allocation unit size: ")
+            label = input("Enter volume label: ")
+            volume = backend().find_fixed_volume(selected_disk)
+            if volume:
+                backend().format_volume(volume, fs, size, label)
+            else:
+                print("No suitable volume found for formatting on the selected disk.")
+        else:
+            print("No disk selected. Please select a disk first.")
+
+    elif choice == "6":
+        if selected_disk:
+            print("\n** Resize Volume **")
+            extend_size = input("Enter size to extend volume (in MB, leave empty for no extension): ").strip()
+            shrink_desired_size = input("Enter desired size to shrink (in MB, leave empty for no shrink): ").strip()
+            shrink_min_size = input("Enter minimum size to shrink (in MB, leave empty for no shrink): ").strip()
+            
+            if extend_size or shrink_desired_size or shrink_min_size:
+                volumes = backend().volumes_on_disk(selected_disk)
+                backend().resize_volume(volumes, extend_size, shrink_desired_size, shrink_min_size)
+            else:
+                print("No resizing options provided. Operation canceled.")
+        else:
+            print("No disk selected. Please select a disk first.")
+
+    elif choice == "7":
+      if selected_disk:
+        print("\nVolume Information for Selected Disk:")
+        backend().list_volumes(selected_disk)
+      else:
+        print("\nVolume Information for All Disks:")
+        backend().list_volumes()
+    elif choice == "8":
+      print("Exiting DiskPart")
+      break
+    elif choice == "9":
+        diskmanhelp.display_help()  
+    elif choice == "10":
+      print("Exiting...")
+      break
+    elif choice == "11":
+      from jobs import get_job_engine
+      backend()
+      show_jobs(get_job_engine())
+    elif choice == "12":
+      backend().prompt_bulk_format()
+    elif choice == "13":
+      import dir_usage
+      backend()  # The volume list comes from the backend's inventory
+      dir_usage.prompt_directory_usage()
+    elif choice == "14":
+      import volume_bench
+      backend()
+      volume_bench.prompt_volume_benchmark()
+    elif choice == "15":
+      if selected_disk:
+        import surface_scan
+        surface_scan.prompt_surface_scan(selected_disk)
+      else:
+        print("No disk selected. Please select a disk first.")
+    else:
+      print("Invalid choice. Please enter a number between 1 and 15.")
+
+
+
+if __name__ == "__main__":
+  args = parse_args()
+  if not args.command:  # Subcommand output is for scripts; no banner
+    print_version_info()
+  if args.version:
+    raise SystemExit(0)
+  _backend_name = args.backend
+  _watch = args.watch
+  if args.image:
+    os.environ["DISKMAN_IMAGES"] = os.pathsep.join(args.image)  # Read by image_backend when it loads
+    _backend_name = args.backend or "image"
+  if args.profile or args.profile_json or args.profile_prom:
+    from instrumentation import get_metrics
+    get_metrics().trace_associators = True
+  hosts = read_hosts(args)
+  status = 0
+  stop_snapshots = None
+  try:
+    if args.command:
+      status = commands.main(args, build_parser(), backend)
+    elif (args.snapshots or args.diff or args.history) and run_store_command(args):
+      pass
+    elif hosts:
+      import fleet
+      from instrumentation import get_metrics
+      get_metrics().set_action("fleet_inventory")
+      fleet.print_fleet_inventory(hosts, max_workers=args.workers, timeout=args.timeout, retries=args.retries)
+    elif args.serve or args.socket:
+      import agent
+      from instrumentation import get_metrics
+      get_metrics().set_action("agent")
+      backend()  # Loads the backend's inventory (and the event watcher with --watch)
+      host, _, port = args.listen.rpartition(":")
+      if args.snapshot_every:
+        import threading
+        stop_snapshots = threading.Event()
+        threading.Thread(target=save_snapshots, args=(args, args.snapshot_every, stop_snapshots), daemon=True).start()
+      agent.serve((host or "127.0.0.1", int(port)), args.socket)
+    elif args.snapshot or args.snapshot_every:
+      from instrumentation import get_metrics
+      get_metrics().set_action("snapshot")
+      if args.snapshot_every:
+        save_snapshots(args, args.snapshot_every)
+      else:
+        with open_store(args) as store:
+          save_snapshot(store)
+    else:
+      main()
+  finally:
+    if stop_snapshots is not None:
+      stop_snapshots.set()
+    shutdown()
+  report_profile(args)
+  raise SystemExit(status)
@@ -1,47 +1,77 @@
-def display_help():
-  """Provides detailed help information on zms DiskMan features."""
-  print("\n** zms DiskMan Help **")
-  print("This section provides detailed instructions on using zms DiskMan features:")
-
-  print("\n1. List Disks:")
-  print("Displays information about all connected disks, including size and status.")
-
-  print("\n2. Select Disk:")
-  print("Allows you to choose a specific disk for further operations. Subsequent actions like")
-  print("formatting, partitioning, and resizing will be performed on the selected disk unless")
-  print("otherwise specified.")
-
-  print("\n3. Create and Delete Partition (on Selected Disk):")
-  print("Creates a new primary partition on the selected disk. You will be prompted to enter the")
-  print("desired size of the partition in megabytes (MB).")
-  print("**Note:** This feature is currently under development and may not be fully functional.")
-
-  print("\n4. Format Volume (Quick) - Selected Disk:")
-  print("Performs a quick format on a suitable volume of the selected disk. Quick format removes")
-  print("the existing file system and prepares the volume for use. You will be prompted to confirm")
-  print("the formatting operation.")
-
-  print("\n5. Format Volume (Custom) - Selected Disk:")
-  print("Offers more control over formatting compared to the quick format option. You will need to")
-  print("specify the desired file system (e.g., NTFS, exFAT), allocation unit size, and volume label.")
-  print("**Note:** Formatting a volume erases all data on it. Ensure you have a backup of important data")
-  print("before proceeding.")
-
-  print("\n6. Resize Volume - Selected Disk:")
-  print("Allows you to extend or shrink the selected volume. You can provide the size to extend in MB,")
-  print("the desired size to shrink to in MB, and the minimum allowed size for shrinking in MB.")
-  print("**Note:** Resizing operations may not be possible on all volumes or may have limitations depending")
-  print("on the disk configuration. Ensure you have sufficient free space on the disk for extending.")
-
-  print("\n7. List Volumes (All Disks or Selected Disk):")
-  print("Displays detailed information about volumes, including label, file system, size, status,")
-  print("creation date, cluster size, and drive type. If a disk is selected, the list will be specific")
-  print("to volumes on that disk. Otherwise, it will show volumes on all connected disks.")
-
-  print("\n8. Exit DiskPart:")
-  print("Terminates the zms DiskMan program.")
-
-  print("\n10. Exit:")
-  print("Also exits the zms DiskMan program.")
-
-  input("Press Enter to continue...")
+def display_help():
+  """Provides detailed help information on zms DiskMan features."""
+  print("\n** zms DiskMan Help **")
+  print("This section provides detailed instructions on using zms DiskMan features:")
+
+  print("\n1. List Disks:")
+  print("Displays information about all connected disks, including size and status.")
+
+  print("\n2. Select Disk:")
+  print("Allows you to choose a specific disk for further operations. Subsequent actions like")
+  print("formatting, partitioning, and resizing will be performed on the selected disk unless")
+  print("otherwise specified.")
+
+  print("\n3. Create and Delete Partition (on Selected Disk):")
+  print("Creates a new primary partition on the selected disk. You will be prompted to enter the")
+  print("desired size of the partition in megabytes (MB). With disk images (--image), you can")
+  print("also delete a partition by its number in List Volumes; its data is left in the image.")
+  print("**Note:** This feature is currently under development and may not be fully functional.")
+
+  print("\n4. Format Volume (Quick) - Selected Disk:")
+  print("Performs a quick format on a suitable volume of the selected disk. Quick format removes")
+  print("the existing file system and prepares the volume for use. You will be prompted to confirm")
+  print("the formatting operation.")
+
+  print("\n5. Format Volume (Custom) - Selected Disk:")
+  print("Offers more control over formatting compared to the quick format option. You will need to")
+  print("specify the desired file system (e.g., NTFS, exFAT), allocation unit size, and volume label.")
+  print("**Note:** Formatting a volume erases all data on it. Ensure you have a backup of important data")
+  print("before proceeding.")
+
+  print("\n6. Resize Volume - Selected Disk:")
+  print("Allows you to extend or shrink the selected volume. You can provide the size to extend in MB,")
+  print("the desired size to shrink to in MB, and the minimum allowed size for shrinking in MB.")
+  print("**Note:** Resizing operations may not be possible on all volumes or may have limitations depending")
+  print("on the disk configuration. Ensure you have sufficient free space on the disk for extending.")
+
+  print("\n7. List Volumes (All Disks or Selected Disk):")
+  print("Displays detailed information about volumes, including label, file system, size, status,")
+  print("cluster size, and drive type. If a disk is selected, the list will be specific")
+  print("to volumes on that disk. Otherwise, it will show volumes on all connected disks.")
+
+  print("\n8. Exit DiskPart:")
+  print("Terminates the zms DiskMan program.")
+
+  print("\n10. Exit:")
+  print("Also exits the zms DiskMan program.")
+
+  print("\n11. Jobs (status and cancel):")
+  print("Formatting and resizing run in the background so the menu stays responsive. This shows")
+  print("each job's status, progress and elapsed time, and lets you cancel a job that has not started.")
+  print("Jobs on the same physical disk run one after another; jobs on different disks run in parallel.")
+
+  print("\n12. Bulk Format Volumes:")
+  print("Formats many volumes in one pass. Volumes are chosen by disk number, label pattern, size range")
+  print("and current file system, listed, and confirmed once for the whole set. They are then formatted")
+  print("concurrently, a limited number at a time, and a summary of timings and failures is printed.")
+  print("**Note:** This erases all data on every listed volume.")
+
+  print("\n13. Directory Usage (what is filling a volume):")
+  print("Scans a mounted volume in parallel and lists its largest directories, refreshing the list")
+  print("while the scan runs. Directories that have not changed since the last scan (same modification")
+  print("time) are not listed again, so a second scan is much faster. Set DISKMAN_SCAN_CACHE to a file")
+  print("to keep these results between runs.")
+
+  print("\n14. Benchmark Volume:")
+  print("Measures sequential and random read and write throughput and latency on a mounted volume, at")
+  print("several block sizes and queue depths, using a temporary file that is removed afterwards. Use it")
+  print("after formatting to check the allocation unit size: results are appended to")
+  print("volume_bench_results.jsonl together with the volume's file system and cluster size.")
+
+  print("\n15. Surface Scan (read-only) - Selected Disk:")
+  print("Reads the whole selected disk (or disk image) in large chunks with several readers and reports")
+  print("throughput, unreadable regions and slow regions by offset. Nothing is ever written to the disk.")
+  print("Press Ctrl+C to stop: progress is saved to a checkpoint file, and scanning the same disk again")
+  print("offers to resume where it stopped. Reading a physical disk needs administrator rights.")
+
+  input("Press Enter to continue...")
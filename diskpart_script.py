@@ -0,0 +1,194 @@
+# diskpart_script.py
+"""Batches diskpart operations into a single generated script.
+
+Starting diskpart (and the rescan it does on startup) is slow, so the
+subprocess fallback collects every operation into one script, runs diskpart
+once and splits its output back into one section per operation::
+
+    script = DiskpartScript().select_disk(1).create_partition(1024).format("NTFS", label="Data").assign("E")
+    for result in script.run():
+        print(result.command, result.ok, result.output)
+
+The executable can be overridden with the DISKMAN_DISKPART environment
+variable, e.g. to point at a stand-in script.
+"""
+import os
+import re
+import tempfile
+
+from instrumentation import run_subprocess
+
+
+_PROGRESS_PATTERN = re.compile(r"^\s*\d+ percent completed\s*$", re.IGNORECASE)
+# How diskpart starts the message for a failed command; ordinary messages and
+# tables contain words like "not" and "no" ("No Media", "There is no volume selected")
+_ERROR_PATTERN = re.compile(
+    r"^\s*(DiskPart has encountered an error|Virtual Disk Service error|DiskPart failed)", re.IGNORECASE | re.MULTILINE)
+
+
+class DiskpartResult:
+    """Output of one operation in a diskpart script run."""
+
+    __slots__ = ("command", "output", "ok", "ran")
+
+    def __init__(self, command, output="", ok=False, ran=False):
+        self.command = command
+        self.output = output
+        self.ok = ok
+        self.ran = ran
+
+    def __repr__(self):
+        return f"DiskpartResult({self.command!r}, ok={self.ok}, ran={self.ran})"
+
+
+class DiskpartScript:
+    """Builder for a diskpart script; each method appends one operation."""
+
+    def __init__(self):
+        self.commands = []
+
+    def _add(self, command):
+        self.commands.append(command)
+        return self
+
+    def list_disk(self):
+        return self._add("list disk")
+
+    def list_volume(self):
+        return self._add("list volume")
+
+    def select_disk(self, disk_number):
+        return self._add(f"select disk {int(disk_number)}")
+
+    def select_volume(self, volume):
+        return self._add(f"select volume {volume}")
+
+    def select_partition(self, partition_number):
+        return self._add(f"select partition {int(partition_number)}")
+
+    def create_partition(self, size_mb=None, partition_type="primary"):
+        command = f"create partition {partition_type}"
+        if size_mb is not None:
+            command += f" size={int(size_mb)}"
+        return self._add(command)
+
+    def format(self, file_system="NTFS", label=None, quick=True, unit=None):
+        command = f"format fs={file_system}"
+        if label:
+            command += f' label="{label}"'
+        if unit:
+            command += f" unit={unit}"
+        if quick:
+            command += " quick"
+        return self._add(command)
+
+    def assign(self, letter=None):
+        return self._add(f"assign letter={letter.rstrip(':')}" if letter else "assign")
+
+    def extend(self, size_mb=None):
+        return self._add(f"extend size={int(size_mb)}" if size_mb is not None else "extend")
+
+    def shrink(self, desired_mb=None, minimum_mb=None):
+        command = "shrink"
+        if desired_mb is not None:
+            command += f" desired={int(desired_mb)}"
+        if minimum_mb is not None:
+            command += f" minimum={int(minimum_mb)}"
+        return self._add(command)
+
+    def render(self):
+        """Returns the script text, one command per line."""
+        return "\n".join(self.commands) + "\n"
+
+    def run(self, executable=None, timeout=None):
+        """Runs every operation in a single diskpart process.
+
+        diskpart stops at the first failing command, so operations after a
+        failure come back with ``ran=False``.  A non-zero exit status
+        without a recognised error message fails the first operation
+        diskpart did not answer (or the last one, if it answered them all).
+
+        Returns:
+            list: One DiskpartResult per operation, in script order.
+        """
+        executable = executable or os.environ.get("DISKMAN_DISKPART", "diskpart")
+        script_file = tempfile.NamedTemporaryFile("w", suffix=".txt", prefix="diskman_", delete=False)
+        try:
+            with script_file:
+                script_file.write(self.render())
+            completed = run_subprocess([executable, "/s", script_file.name],
+                                       capture_output=True, text=True, timeout=timeout)
+        finally:
+            os.unlink(script_file.name)
+        return split_output(self.commands, completed.stdout, completed.returncode, completed.stderr)
+
+
+def _output_blocks(output):
+    lines = output.splitlines()
+    # Skip the version/copyright banner, which ends with "On computer: NAME"
+    for i, line in enumerate(lines):
+        if line.startswith("On computer:"):
+            lines = lines[i + 1:]
+            break
+    blocks, current = [], []
+    for line in lines + [""]:
+        if line.strip():
+            current.append(line)
+        elif current:
+            blocks.append("\n".join(current))
+            current = []
+    if blocks and blocks[-1].strip() == "Leaving DiskPart...":
+        blocks.pop()
+    return blocks
+
+
+def split_output(commands, output, returncode=0, errors=""):
+    """Maps diskpart's output back onto the commands that produced it.
+
+    Every command ends with one message block; ``list`` commands print one
+    table block instead, and long-running commands print "N percent
+    completed" blocks before their message.
+
+    Args:
+        commands (list): The script's commands, in order.
+        output (str): diskpart's standard output.
+        returncode (int, optional): diskpart's exit status. Defaults to 0.
+        errors (str, optional): diskpart's standard error, added to the failed operation's output.
+
+    Returns:
+        list: One DiskpartResult per command.
+    """
+    blocks = _output_blocks(output)
+    results = []
+    position = 0
+    failed = False
+    for command in commands:
+        if failed or position >= len(blocks):
+            results.append(DiskpartResult(command))
+            continue
+        section = []
+        while position < len(blocks):
+            block = blocks[position]
+            position += 1
+            section.append(block)
+            if not _PROGRESS_PATTERN.match(block):
+                break
+        message = section[-1]
+        ok = not _ERROR_PATTERN.search(message)
+        if not ok:
+            # Anything after the error belongs to it, diskpart stops here
+            section.extend(blocks[position:])
+            position = len(blocks)
+            failed = True
+        results.append(DiskpartResult(command, "\n\n".join(section), ok, ran=True))
+
+    if returncode and not failed:
+        # diskpart gave up without a message we recognise: the operations it never
+        # answered have failed, or the last one if it answered them all
+        unanswered = [result for result in results if not result.ran]
+        failed_result = unanswered[0] if unanswered else results[-1] if results else None
+        if failed_result is not None:
+            failed_result.ok = False
+            details = [failed_result.output, (errors or "").strip(), f"diskpart exited with status {returncode}"]
+            failed_result.output = "\n\n".join(detail for detail in details if detail)
+    return results
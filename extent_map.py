@@ -0,0 +1,149 @@
+# extent_map.py
+"""Per-disk map of allocated partitions and unallocated gaps.
+
+``Win32_LogicalDisk.FreeSpace`` is free space inside a file system, not
+unallocated space on the disk, so it cannot tell whether a partition fits.
+An ExtentMap is built from the partition offsets in the cached inventory and
+keeps its gaps in sorted lists, so "largest free extent", "can this
+partition grow" and "where does a new partition fit" are answered with a
+bisect instead of another WMI query.
+"""
+from bisect import bisect_left, insort
+
+MB = 1024**2
+
+# Partitions start and end on 1 MiB boundaries, as Windows creates them
+DEFAULT_ALIGNMENT = MB
+
+
+def _align_up(value, alignment):
+    return -(-value // alignment) * alignment
+
+
+def _align_down(value, alignment):
+    return value // alignment * alignment
+
+
+class ExtentMap:
+    """Sorted intervals of partitions and free gaps on one disk, in bytes.
+
+    Args:
+        disk_size (int): Size of the disk in bytes.
+        partitions (iterable): ``(partition_id, starting_offset, size)`` tuples.
+        alignment (int, optional): Boundary new or grown partitions must respect.
+            Defaults to 1 MiB.
+        reserved_start (int, optional): Bytes at the start of the disk that are
+            never allocated (partition table). Defaults to one alignment unit.
+        reserved_end (int, optional): Bytes at the end of the disk that are never
+            allocated (e.g. the GPT backup header). Defaults to one alignment unit.
+    """
+
+    def __init__(self, disk_size, partitions=(), alignment=DEFAULT_ALIGNMENT,
+                 reserved_start=None, reserved_end=None):
+        self.disk_size = disk_size
+        self.alignment = alignment
+        self.first_usable = alignment if reserved_start is None else reserved_start
+        self.last_usable = disk_size - (alignment if reserved_end is None else reserved_end)
+        self._partitions = {}          # partition_id -> (start, end)
+        self._starts = []              # sorted partition start offsets
+        self._by_start = {}            # start -> partition_id
+        self._gaps_by_start = {}       # gap start -> gap end (raw, unaligned)
+        self._gap_starts = []          # sorted gap starts
+        self._gaps_by_size = []        # sorted (usable size, aligned start, gap start)
+        for partition_id, start, size in partitions:
+            self._partitions[partition_id] = (start, start + size)
+            self._by_start[start] = partition_id
+        self._starts = sorted(self._by_start)
+        self._rebuild_gaps()
+
+    @classmethod
+    def from_snapshot(cls, snapshot, disk, **options):
+        """Builds the map for ``disk`` from a TopologySnapshot."""
+        partitions = [
+            (partition.device_id, partition.starting_offset, partition.size)
+            for partition in snapshot.partitions(disk.device_id)
+            if partition.starting_offset is not None and partition.size is not None
+        ]
+        return cls(disk.size or 0, partitions, **options)
+
+    def _usable(self, start, end):
+        aligned_start = _align_up(start, self.alignment)
+        return max(0, _align_down(end, self.alignment) - aligned_start), aligned_start
+
+    def _add_gap(self, start, end):
+        if end <= start:
+            return
+        self._gaps_by_start[start] = end
+        insort(self._gap_starts, start)
+        size, aligned_start = self._usable(start, end)
+        if size:
+            insort(self._gaps_by_size, (size, aligned_start, start))
+
+    def _remove_gap(self, start):
+        end = self._gaps_by_start.pop(start)
+        del self._gap_starts[bisect_left(self._gap_starts, start)]
+        size, aligned_start = self._usable(start, end)
+        if size:
+            del self._gaps_by_size[bisect_left(self._gaps_by_size, (size, aligned_start, start))]
+        return end
+
+    def _rebuild_gaps(self):
+        self._gaps_by_start, self._gap_starts, self._gaps_by_size = {}, [], []
+        cursor = self.first_usable
+        for start in self._starts:
+            self._add_gap(cursor, min(start, self.last_usable))
+            cursor = max(cursor, self._partitions[self._by_start[start]][1])
+        self._add_gap(cursor, self.last_usable)
+
+    def largest_free_extent(self):
+        """Returns ``(start, size)`` of the largest usable gap, or None if the disk is full."""
+        if not self._gaps_by_size:
+            return None
+        size, aligned_start, _ = self._gaps_by_size[-1]
+        return aligned_start, size
+
+    def find_placement(self, size):
+        """Returns the aligned start offset of the smallest gap that fits ``size`` bytes, or None."""
+        i = bisect_left(self._gaps_by_size, (size,))
+        if i == len(self._gaps_by_size):
+            return None
+        return self._gaps_by_size[i][1]
+
+    def growth_room(self, partition_id):
+        """Returns how many bytes ``partition_id`` can grow into the gap right after it."""
+        _, end = self._partitions[partition_id]
+        gap_end = self._gaps_by_start.get(end)
+        if gap_end is None:
+            return 0
+        return max(0, _align_down(gap_end, self.alignment) - end)
+
+    def can_grow(self, partition_id, size):
+        """Returns True if ``partition_id`` can be extended by ``size`` bytes in place."""
+        return self.growth_room(partition_id) >= size
+
+    def add_partition(self, partition_id, start, size):
+        """Records a new partition carved out of an existing gap."""
+        end = start + size
+        i = bisect_left(self._gap_starts, start + 1) - 1
+        if i < 0 or self._gaps_by_start[self._gap_starts[i]] < end:
+            raise ValueError(f"No free extent holds {size} bytes at offset {start}")
+        gap_start = self._gap_starts[i]
+        gap_end = self._remove_gap(gap_start)
+        self._add_gap(gap_start, start)
+        self._add_gap(end, gap_end)
+        self._partitions[partition_id] = (start, end)
+        self._by_start[start] = partition_id
+        insort(self._starts, start)
+
+    def remove_partition(self, partition_id):
+        """Returns a partition's extent to the free space, merging neighbouring gaps."""
+        start, end = self._partitions.pop(partition_id)
+        del self._by_start[start]
+        del self._starts[bisect_left(self._starts, start)]
+        i = bisect_left(self._gap_starts, start) - 1
+        if i >= 0 and self._gaps_by_start[self._gap_starts[i]] == start:
+            start = self._gap_starts[i]
+            self._remove_gap(start)
+        if end in self._gaps_by_start:
+            end = self._remove_gap(end)
+        self._add_gap(max(start, self.first_usable), min(end, self.last_usable))
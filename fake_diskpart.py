@@ -0,0 +1,92 @@
+# fake_diskpart.py
+"""Stand-in for ``diskpart.exe`` that answers a script with canned output.
+
+Runs the ``/s SCRIPT`` form the subprocess fallback uses and prints the
+banner and one message block per command, the way diskpart does, so
+DiskpartScript can be exercised on any machine::
+
+    DISKMAN_DISKPART=/path/to/wrapper  # e.g. a shell script: exec python fake_diskpart.py "$@"
+
+Its behaviour is controlled through environment variables:
+
+- FAKE_DISKPART_FAIL: the first command starting with this text prints a
+  "Virtual Disk Service error" block and diskpart stops there.
+- FAKE_DISKPART_STOP_AFTER: stop silently after this many commands.
+- FAKE_DISKPART_EXIT: exit status when stopping early (default: 1 after an
+  error, 0 otherwise).
+- FAKE_DISKPART_LOG: append each script received to this file.
+"""
+import os
+import sys
+
+BANNER = """
+Microsoft DiskPart version 10.0.19041.3636
+
+Copyright (C) Microsoft Corporation.
+On computer: FAKEHOST
+"""
+
+LIST_DISK = """  Disk ###  Status         Size     Free     Dyn  Gpt
+  --------  -------------  -------  -------  ---  ---
+  Disk 0    Online          476 GB      0 B        *
+  Disk 1    Online          931 GB   931 GB        *"""
+
+LIST_VOLUME = """  Volume ###  Ltr  Label        Fs     Type        Size     Status     Info
+  ----------  ---  -----------  -----  ----------  -------  ---------  --------
+  Volume 0     C                NTFS   Partition    475 GB  Healthy    Boot
+  Volume 1     D                       DVD-ROM         0 B  No Media
+  Volume 2                      FAT32  Partition    100 MB  Healthy    System"""
+
+MESSAGES = (
+    ("list disk", LIST_DISK),
+    ("list volume", LIST_VOLUME),
+    ("select disk", "Disk {0} is now the selected disk."),
+    ("select volume", "Volume {0} is the selected volume."),
+    ("select partition", "Partition {0} is now the selected partition."),
+    ("create partition", "DiskPart succeeded in creating the specified partition."),
+    ("format", "  100 percent completed\n\nDiskPart successfully formatted the volume."),
+    ("assign", "DiskPart successfully assigned the drive letter or mount point."),
+    ("extend", "DiskPart successfully extended the volume."),
+    ("shrink", "DiskPart successfully shrunk the volume by:  100 MB"),
+)
+
+ERROR = """Virtual Disk Service error:
+There is not enough usable space for this operation."""
+
+
+def respond(command):
+    """Returns the output diskpart prints for one script line."""
+    for prefix, message in MESSAGES:
+        if command.startswith(prefix):
+            argument = command[len(prefix):].split()
+            return message.format(argument[0] if argument else "")
+    return "The arguments specified for this command are not valid."
+
+
+def main(argv):
+    if len(argv) != 3 or argv[1].lower() != "/s":
+        print("usage: fake_diskpart.py /s SCRIPT", file=sys.stderr)
+        return 1
+    with open(argv[2]) as script_file:
+        commands = [line.strip() for line in script_file if line.strip()]
+    if os.environ.get("FAKE_DISKPART_LOG"):
+        with open(os.environ["FAKE_DISKPART_LOG"], "a") as log:
+            log.write("\n".join(commands) + "\n--\n")
+
+    fail = os.environ.get("FAKE_DISKPART_FAIL")
+    stop_after = int(os.environ.get("FAKE_DISKPART_STOP_AFTER", len(commands)))
+    exit_status = os.environ.get("FAKE_DISKPART_EXIT")
+    print(BANNER)
+    for number, command in enumerate(commands):
+        if number == stop_after:
+            return int(exit_status or 0)
+        if fail and command.startswith(fail):
+            print(ERROR + "\n")
+            return int(exit_status or 1)
+        print(respond(command) + "\n")
+    print("Leaving DiskPart...")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
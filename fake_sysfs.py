@@ -0,0 +1,137 @@
+# fake_sysfs.py
+"""Fake sysfs and procfs trees for running the Linux backend anywhere.
+
+Writes the files sysfs_topology reads into a scratch directory, so the
+Linux listings can be exercised on any machine (including Windows)::
+
+    import fake_sysfs, sysfs_topology
+    tree = fake_sysfs.FakeSysfs("/tmp/tree")
+    disk = tree.add_disk("sda", 500 * 1024**3, model="Fake SSD")
+    tree.add_partition(disk, 1, 100 * 1024**3, mount_point="/data")
+    snapshot = sysfs_topology.build_sysfs_snapshot(**tree.roots())
+"""
+import os
+import shutil
+
+from sysfs_topology import SECTOR
+
+
+class FakeStatvfs:
+    """Answers ``statvfs`` for the fake mount points from a table."""
+
+    def __init__(self):
+        self.usage = {}  # mount point -> os.statvfs_result
+
+    def __call__(self, path):
+        try:
+            return self.usage[path]
+        except KeyError:
+            raise FileNotFoundError(2, "No such file or directory", path) from None
+
+
+class FakeSysfs:
+    """A ``sys`` and ``proc`` tree under ``root`` that grows as devices are added.
+
+    Args:
+        root (str): Directory to build the tree in; any previous tree there is removed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.sys_root = os.path.join(root, "sys")
+        self.proc_root = os.path.join(root, "proc")
+        self.statvfs = FakeStatvfs()
+        self._major = 8
+        self._minor = 0
+        self._partitions_lines = ["major minor  #blocks  name", ""]
+        self._mountinfo_lines = []
+        self.deferred = False  # Set while adding many devices; call flush() afterwards
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(os.path.join(self.sys_root, "block"))
+        os.makedirs(os.path.join(self.sys_root, "class", "block"))
+        os.makedirs(os.path.join(self.proc_root, "self"))
+        self.flush()
+
+    def roots(self):
+        """Returns the keyword arguments build_sysfs_snapshot needs for this tree."""
+        return {"sys_root": self.sys_root, "proc_root": self.proc_root, "statvfs": self.statvfs}
+
+    def _write(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as sysfs_file:
+            sysfs_file.write(f"{text}\n")
+
+    def flush(self):
+        """Rewrites /proc/partitions and /proc/self/mountinfo from the devices added so far."""
+        self._write(os.path.join(self.proc_root, "partitions"), "\n".join(self._partitions_lines))
+        self._write(os.path.join(self.proc_root, "self", "mountinfo"), "\n".join(self._mountinfo_lines))
+
+    def _register(self, name, size, mount_point, file_system, free_space):
+        # /sys/class/block/<name> is a directory here rather than a symlink into /sys/devices
+        class_dir = os.path.join(self.sys_root, "class", "block", name)
+        os.makedirs(class_dir, exist_ok=True)
+        self._write(os.path.join(class_dir, "size"), size // SECTOR)
+        device_number = f"{self._major}:{self._minor}"
+        self._minor += 1
+        self._partitions_lines.append(f"{self._major:>4} {self._minor - 1:>7} {size // 1024:>10} {name}")
+        if mount_point:
+            mount_id = len(self._mountinfo_lines) + 20
+            escaped = mount_point.replace(" ", "\\040")
+            self._mountinfo_lines.append(
+                f"{mount_id} 1 {device_number} / {escaped} rw,relatime shared:{mount_id} - {file_system} /dev/{name} rw")
+            self.statvfs.usage[mount_point] = os.statvfs_result(
+                (4096, 4096, size // 4096, free_space // 4096, free_space // 4096, 0, 0, 0, 0, 255))
+        if not self.deferred:
+            self.flush()
+        return class_dir
+
+    def add_disk(self, name, size, model="", removable=False, block_size=SECTOR,
+                 mount_point=None, file_system="ext4", free_space=0):
+        """Adds a whole disk; ``mount_point`` mounts a file system on the unpartitioned disk.
+
+        Returns:
+            str: The disk's directory under ``sys/block``.
+        """
+        disk_dir = os.path.join(self.sys_root, "block", name)
+        os.makedirs(disk_dir)
+        self._write(os.path.join(disk_dir, "removable"), int(removable))
+        self._write(os.path.join(disk_dir, "queue", "logical_block_size"), block_size)
+        if model:
+            self._write(os.path.join(disk_dir, "device", "model"), model)
+        self._register(name, size, mount_point, file_system, free_space)
+        return disk_dir
+
+    def add_partition(self, disk_dir, number, size, start=1024**2, mount_point=None, file_system="ext4",
+                      free_space=0):
+        """Adds partition ``number`` of ``size`` bytes at byte offset ``start`` to a disk."""
+        disk = os.path.basename(disk_dir)
+        name = f"{disk}p{number}" if disk[-1].isdigit() else f"{disk}{number}"
+        partition_dir = os.path.join(disk_dir, name)
+        os.makedirs(partition_dir)
+        self._write(os.path.join(partition_dir, "partition"), number)
+        class_dir = self._register(name, size, mount_point, file_system, free_space)
+        self._write(os.path.join(class_dir, "start"), start // SECTOR)
+        return partition_dir
+
+
+def generate_tree(root, disks, partitions_per_disk=2, disk_size=2 * 1024**4):
+    """Builds a FakeSysfs with ``disks`` disks, each split into equal mounted partitions.
+
+    Args:
+        root (str): Directory to build the tree in.
+        disks (int): Number of disks (``sda``, ``sdb`` ... then ``sd<n>``).
+        partitions_per_disk (int, optional): Partitions on each disk. Defaults to 2.
+        disk_size (int, optional): Size of every disk in bytes. Defaults to 2 TiB.
+    """
+    tree = FakeSysfs(root)
+    partition_size = (disk_size - 2 * 1024**2) // max(partitions_per_disk, 1) // 1024**2 * 1024**2
+    tree.deferred = True
+    for disk_number in range(disks):
+        name = "sd" + (chr(ord("a") + disk_number) if disk_number < 26 else str(disk_number))
+        disk_dir = tree.add_disk(name, disk_size, model=f"Fake Disk {disk_number}")
+        for index in range(partitions_per_disk):
+            tree.add_partition(disk_dir, index + 1, partition_size, start=1024**2 + index * partition_size,
+                               mount_point=f"/mnt/{name}{index + 1}", free_space=partition_size // 2)
+    tree.deferred = False
+    tree.flush()
+    return tree
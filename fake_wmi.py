@@ -0,0 +1,231 @@
+# fake_wmi.py
+"""In-process stand-in for a ``wmi.WMI()`` connection.
+
+Serves canned Win32_* instances from memory so the disk and volume code can
+run on machines without WMI (for example on Linux).  Plug it in with::
+
+    import wmi_session
+    fake = FakeWMI()
+    disk = fake.add_disk(size=500 * 1024**3)
+    wmi_session.set_provider(fake.provider)
+"""
+import re
+import time
+
+
+_QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<wmi_class>\w+)(?:\s+WHERE\s+(?P<where>.+?))?\s*$",
+    re.IGNORECASE,
+)
+_CONDITION_PATTERN = re.compile(r"^\s*(\w+)\s*=\s*(?:'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"|(\S+))\s*$")
+
+
+def object_path(wmi_class, device_id):
+    """Builds a WMI object path the way WMI reports it in association references."""
+    escaped = str(device_id).replace("\\", "\\\\").replace('"', '\\"')
+    return f'{wmi_class}.DeviceID="{escaped}"'
+
+
+class FakeWMIObject:
+    """A single WMI instance with its properties and associations."""
+
+    def __init__(self, wmi_class, **properties):
+        self._wmi_class = wmi_class
+        self._properties = properties
+        self._associations = []
+        self.calls = []
+
+    def __getattr__(self, name):
+        properties = self.__dict__.get("_properties", {})
+        if name in properties:
+            return properties[name]
+        raise AttributeError(f"<{self.__dict__.get('_wmi_class')}> has no property {name!r}")
+
+    def __repr__(self):
+        return f"<fake {self._wmi_class}: {self._properties.get('DeviceID', '')}>"
+
+    def update(self, **properties):
+        """Changes properties in place, as a change on the real device would."""
+        self._properties.update(properties)
+
+    def path(self):
+        """Returns the object path used to reference this instance."""
+        return object_path(self._wmi_class, self._properties.get("DeviceID", ""))
+
+    def associators(self, wmi_association_class="", wmi_result_class=""):
+        """Returns the instances linked to this one, optionally filtered by class."""
+        return [
+            other for association_class, other in self._associations
+            if (not wmi_association_class or wmi_association_class in (association_class, other._wmi_class))
+            and (not wmi_result_class or other._wmi_class == wmi_result_class)
+        ]
+
+    def _record(self, method, **params):
+        self.calls.append((method, params))
+        return (0,)
+
+    def CreatePartition(self, **params):
+        return self._record("CreatePartition", **params)
+
+    def QuickFormat(self, **params):
+        return self._record("QuickFormat", **params)
+
+    def Format(self, **params):
+        return self._record("Format", **params)
+
+    def Extend(self, **params):
+        return self._record("Extend", **params)
+
+    def Shrink(self, **params):
+        return self._record("Shrink", **params)
+
+    def Mount(self, **params):
+        return self._record("Mount", **params)
+
+    def Dismount(self, **params):
+        return self._record("Dismount", **params)
+
+
+class FakeWMI:
+    """Fake WMI connection holding a configurable disk topology.
+
+    Args:
+        latency (float, optional): Seconds each query sleeps, to simulate a
+            slow or remote host. Defaults to 0.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._instances = {}
+
+    def __getattr__(self, name):
+        if name.startswith("Win32_"):
+            return lambda fields=None, **where: self.instances(name, fields, **where)
+        raise AttributeError(name)
+
+    def provider(self, **connect_args):
+        """Connection factory for ``wmi_session``; always returns this fake."""
+        return self
+
+    def add(self, wmi_class, **properties):
+        """Adds an instance of ``wmi_class`` and returns it."""
+        instance = FakeWMIObject(wmi_class, **properties)
+        self._instances.setdefault(wmi_class, []).append(instance)
+        return instance
+
+    def remove(self, instance):
+        """Removes an instance, as if the device had been unplugged."""
+        self._instances[instance._wmi_class].remove(instance)
+
+    def associate(self, association_class, antecedent, dependent):
+        """Links two instances through ``association_class`` in both directions."""
+        antecedent._associations.append((association_class, dependent))
+        dependent._associations.append((association_class, antecedent))
+        return self.add(association_class, Antecedent=antecedent.path(), Dependent=dependent.path())
+
+    def add_disk(self, size, status="OK", caption=None, model="Fake Disk"):
+        """Adds a Win32_DiskDrive numbered after the disks already present."""
+        index = len(self._instances.get("Win32_DiskDrive", []))
+        return self.add(
+            "Win32_DiskDrive",
+            DeviceID=f"\\\\.\\PHYSICALDRIVE{index}",
+            Index=index,
+            Caption=caption or f"{model} {index}",
+            Model=model,
+            Size=str(size),
+            Status=status,
+        )
+
+    def add_partition(self, disk, size, starting_offset=1024**2, bootable=False):
+        """Adds a Win32_DiskPartition to ``disk``."""
+        index = len(disk.associators("Win32_DiskDriveToDiskPartition"))
+        partition = self.add(
+            "Win32_DiskPartition",
+            DeviceID=f"Disk #{disk.Index}, Partition #{index}",
+            DiskIndex=disk.Index,
+            Index=index,
+            Size=str(size),
+            StartingOffset=str(starting_offset),
+            BlockSize=512,
+            Bootable=bootable,
+            Type="GPT: Basic Data",
+        )
+        self.associate("Win32_DiskDriveToDiskPartition", disk, partition)
+        return partition
+
+    def add_logical_disk(self, partition, device_id, size=None, free_space=None,
+                         file_system="NTFS", volume_name="", drive_type=3, status="OK"):
+        """Adds a Win32_LogicalDisk (drive letter) on top of ``partition``."""
+        size = int(partition.Size) if size is None else size
+        logical_disk = self.add(
+            "Win32_LogicalDisk",
+            DeviceID=device_id,
+            Size=str(size),
+            FreeSpace=str(size if free_space is None else free_space),
+            FileSystem=file_system,
+            VolumeName=volume_name,
+            DriveType=drive_type,
+            Status=status,
+        )
+        self.associate("Win32_LogicalDiskToPartition", partition, logical_disk)
+        return logical_disk
+
+    def instances(self, wmi_class, fields=None, **where):
+        """Returns the instances of ``wmi_class`` whose properties match ``where``."""
+        return self._matching(wmi_class, [where])
+
+    def _matching(self, wmi_class, alternatives):
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            instance for instance in self._instances.get(wmi_class, [])
+            if any(all(str(instance._properties.get(key)) == str(value) for key, value in where.items())
+                   for where in alternatives)
+        ]
+
+    def query(self, wql):
+        """Runs a minimal ``SELECT ... FROM ... [WHERE a = b AND ... OR ...]`` query."""
+        match = _QUERY_PATTERN.match(wql)
+        if not match:
+            raise ValueError(f"Unsupported WQL: {wql}")
+        alternatives = [{}]
+        if match.group("where"):
+            alternatives = []
+            for conjunction in re.split(r"\s+OR\s+", match.group("where"), flags=re.IGNORECASE):
+                where = {}
+                for condition in re.split(r"\s+AND\s+", conjunction, flags=re.IGNORECASE):
+                    parsed = _CONDITION_PATTERN.match(condition)
+                    if not parsed:
+                        raise ValueError(f"Unsupported WQL condition: {condition}")
+                    key, *values = parsed.groups()
+                    where[key] = re.sub(r"\\(.)", r"\1", next(value for value in values if value is not None))
+                alternatives.append(where)
+        return self._matching(match.group("wmi_class"), alternatives)
+
+
+def generate_topology(disks, partitions_per_disk=2, volumes_per_partition=1, latency=0.0,
+                      disk_size=2 * 1024**4):
+    """Builds a FakeWMI with ``disks`` disks, each split into equal partitions.
+
+    Volumes are numbered ``V0:``, ``V1:`` ... since a large topology runs out
+    of drive letters.
+
+    Args:
+        disks (int): Number of Win32_DiskDrive instances.
+        partitions_per_disk (int, optional): Partitions on each disk. Defaults to 2.
+        volumes_per_partition (int, optional): Logical disks on each partition (0 or 1). Defaults to 1.
+        latency (float, optional): Seconds each query sleeps. Defaults to 0.
+        disk_size (int, optional): Size of every disk in bytes. Defaults to 2 TiB.
+    """
+    fake = FakeWMI(latency=latency)
+    partition_size = (disk_size - 2 * 1024**2) // max(partitions_per_disk, 1) // 1024**2 * 1024**2
+    volume_number = 0
+    for _ in range(disks):
+        disk = fake.add_disk(disk_size)
+        for index in range(partitions_per_disk):
+            partition = fake.add_partition(disk, partition_size, starting_offset=1024**2 + index * partition_size)
+            for _ in range(volumes_per_partition):
+                fake.add_logical_disk(partition, f"V{volume_number}:", free_space=partition_size // 2,
+                                      volume_name=f"VOL{volume_number}")
+                volume_number += 1
+    return fake
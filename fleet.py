@@ -0,0 +1,145 @@
+# fleet.py
+"""Parallel disk inventory across many hosts.
+
+Each host is queried on a bounded thread pool with its own WMI session, and
+results are yielded as soon as each host finishes, so one slow host does not
+hold up the rest.  Hosts that fail or exceed the per-host timeout are retried.
+"""
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from disk_management import list_disks
+from topology import build_snapshot
+from volume_management import list_volumes
+from wmi_session import WMISession
+
+
+def connect_host(host):
+    """Default backend: a WMI session to ``host``."""
+    return WMISession(computer=host)
+
+
+class HostResult:
+    """Outcome of inventorying one host."""
+
+    __slots__ = ("host", "snapshot", "error", "elapsed", "attempts")
+
+    def __init__(self, host, snapshot=None, error=None, elapsed=0.0, attempts=1):
+        self.host = host
+        self.snapshot = snapshot
+        self.error = error
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class _Attempt:
+    __slots__ = ("host", "number", "started", "first_started")
+
+    def __init__(self, host, number, first_started=None):
+        self.host = host
+        self.number = number
+        self.started = None
+        self.first_started = first_started
+
+
+def _inventory_host(attempt, connect):
+    attempt.started = time.monotonic()
+    if attempt.first_started is None:
+        attempt.first_started = attempt.started
+    return connect(attempt.host).query(build_snapshot)
+
+
+def collect_inventory(hosts, connect=connect_host, max_workers=8, timeout=60.0, retries=1, total_timeout=None):
+    """Inventories ``hosts`` in parallel and yields a HostResult per host as each finishes.
+
+    A timed-out attempt keeps its worker thread until the backend returns,
+    since threads cannot be interrupted; its result is then discarded.  If
+    hung hosts hold every worker, queued attempts may never start, so any
+    attempt still waiting for a worker at ``total_timeout`` is reported as
+    timed out and the generator always ends.
+
+    Args:
+        hosts (iterable): Hostnames to query.
+        connect (callable, optional): Returns a session-like object for a host;
+            swap it for simulated hosts. Defaults to a WMI session per host.
+        max_workers (int, optional): Hosts queried at once. Defaults to 8.
+        timeout (float, optional): Seconds an attempt may run. Defaults to 60.
+        retries (int, optional): Extra attempts after a failure or timeout. Defaults to 1.
+        total_timeout (float, optional): Seconds before attempts that have not started give up.
+            Defaults to the time every attempt would take one worker batch after another.
+    """
+    hosts = list(dict.fromkeys(hosts))
+    if total_timeout is None:
+        total_timeout = timeout * (retries + 1) * max(1, math.ceil(len(hosts) / max_workers))
+    deadline = time.monotonic() + total_timeout
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diskman-host")
+    pending = {}
+
+    def submit(host, number, first_started=None):
+        attempt = _Attempt(host, number, first_started)
+        pending[executor.submit(_inventory_host, attempt, connect)] = attempt
+
+    def finish(attempt, snapshot=None, error=None):
+        started = attempt.first_started or time.monotonic()
+        return HostResult(attempt.host, snapshot, error, time.monotonic() - started, attempt.number)
+
+    try:
+        for host in hosts:
+            submit(host, 1)
+
+        while pending:
+            now = time.monotonic()
+            running = [attempt.started for attempt in pending.values() if attempt.started is not None]
+            wait_for = min(max(0.0, min(running) + timeout - now) if running else timeout, max(0.0, deadline - now))
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                attempt = pending.pop(future)
+                try:
+                    snapshot = future.result()
+                except Exception as e:
+                    if attempt.number <= retries:
+                        submit(attempt.host, attempt.number + 1, attempt.first_started)
+                    else:
+                        yield finish(attempt, error=e)
+                else:
+                    yield finish(attempt, snapshot=snapshot)
+
+            now = time.monotonic()
+            for future, attempt in list(pending.items()):
+                if attempt.started is not None and now - attempt.started >= timeout:
+                    del pending[future]
+                    if attempt.number <= retries:
+                        submit(attempt.host, attempt.number + 1, attempt.first_started)
+                    else:
+                        yield finish(attempt, error=TimeoutError(f"No answer within {timeout} seconds"))
+                elif attempt.started is None and now >= deadline:
+                    del pending[future]
+                    future.cancel()
+                    yield finish(attempt, error=TimeoutError(
+                        f"Not started within {total_timeout} seconds; every worker was busy with hung hosts"))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def print_fleet_inventory(hosts, **options):
+    """Prints the disk and volume listing of every host as its inventory arrives.
+
+    Returns:
+        bool: True if every host answered, False otherwise.
+    """
+    all_ok = True
+    for result in collect_inventory(hosts, **options):
+        print(f"\n== {result.host} ({result.elapsed:.2f}s, attempt {result.attempts}) ==")
+        if result.ok:
+            list_disks(result.snapshot)
+            list_volumes(snapshot=result.snapshot)
+        else:
+            all_ok = False
+            print(f"Error collecting inventory: {result.error}")
+    return all_ok
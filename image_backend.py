@@ -0,0 +1,147 @@
+# image_backend.py
+"""The disk-image backend: raw ``.img`` files treated as disks.
+
+Each image listed in ``$DISKMAN_IMAGES`` (separated by ``os.pathsep``, or
+given with ``diskman.py --image``) shows up as one disk.  Listings use the
+shared TUI code; partitions are created and deleted by editing the image's
+MBR or GPT in place through disk_image, so this runs unprivileged in CI
+image pipelines.  Formatting and resizing are not implemented.
+"""
+import os
+
+from backends import unsupported
+from disk_image import BASIC_DATA, LINUX_FILESYSTEM, DiskImage, detect_file_system
+from disk_management import list_and_select_disk, list_disks
+from extent_map import MB
+from inventory_cache import RebuildingInventory, get_inventory, set_inventory
+from records import DiskRecord, PartitionRecord, VolumeRecord
+from topology import TopologySnapshot
+from volume_management import find_fixed_volume, list_volumes, volumes_on_disk
+
+__all__ = [
+    "close", "create_partition", "delete_partition", "find_fixed_volume", "format_volume", "format_volume_quick",
+    "list_and_select_disk", "list_disks", "list_volumes", "prompt_bulk_format", "resize_volume",
+    "volumes_on_disk",
+]
+
+IMAGES = [path for path in os.environ.get("DISKMAN_IMAGES", "").split(os.pathsep) if path]
+
+_TYPE_NAMES = {BASIC_DATA: "Basic data", LINUX_FILESYSTEM: "Linux filesystem"}
+
+
+def _partition_type(partition):
+    if isinstance(partition.type, int):
+        return f"0x{partition.type:02X}"
+    return _TYPE_NAMES.get(partition.type, str(partition.type))
+
+
+def build_image_snapshot(paths=None):
+    """Builds a TopologySnapshot with one disk per image and a volume per recognised file system.
+
+    Args:
+        paths (list, optional): Image files. Defaults to IMAGES.
+    """
+    disks, partitions, volumes, disk_partition_links, partition_volume_links = [], [], [], [], []
+    for disk_index, path in enumerate(IMAGES if paths is None else paths):
+        try:
+            image = DiskImage(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping image {path}: {e}")
+            continue
+        with image:
+            scheme = (image.scheme or "no partition table").upper()
+            disk = DiskRecord(path, disk_index, os.path.basename(path), f"Disk image ({scheme})", image.size, "OK")
+            disks.append(disk)
+            for partition in image.partitions():
+                record = PartitionRecord(f"{path}p{partition.number}", disk_index, partition.number, partition.size,
+                                         partition.start, image.sector_size, type=_partition_type(partition))
+                partitions.append(record)
+                disk_partition_links.append((disk.device_id, record.device_id))
+                file_system = detect_file_system(image, partition)
+                if file_system:
+                    volume = VolumeRecord(f"{os.path.basename(path)}p{partition.number}", partition.name, file_system,
+                                          partition.size, None, 3, "OK")
+                    volumes.append(volume)
+                    partition_volume_links.append((record.device_id, volume.device_id))
+    return TopologySnapshot(disks, partitions, volumes, disk_partition_links, partition_volume_links)
+
+
+def _image_disk(disk_number):
+    for disk in get_inventory().snapshot().disks:
+        if disk.index == disk_number:
+            return disk
+    raise ValueError(f"Invalid disk number: {disk_number}")
+
+
+def create_partition(disk_number, partition_size_mb):
+    """Adds a partition to an image, writing a GPT first if the image is blank.
+
+    Args:
+        disk_number (int): Index of the image disk.
+        partition_size_mb (int): The desired size of the partition in Megabytes (MB).
+
+    Returns:
+        bool: True once the partition table has been written.
+
+    Raises:
+        ValueError: If the disk number or partition size is invalid.
+        OSError: If the image cannot be written or has no room for the partition.
+    """
+    if partition_size_mb <= 0:
+        raise ValueError("Partition size must be greater than zero.")
+    path = _image_disk(disk_number).device_id
+    try:
+        with DiskImage(path, writable=True) as image:
+            if image.scheme is None:
+                print(f"{path} has no partition table; writing an empty GPT.")
+                image.initialize_gpt()
+            partition = image.create_partition(partition_size_mb * MB)
+    except ValueError as e:
+        raise OSError(str(e)) from e
+    finally:
+        get_inventory().invalidate([disk_number])
+    print(f"Created partition {partition.number} at offset {partition.start // MB} MB.")
+    return True
+
+
+def delete_partition(disk_number, partition_number):
+    """Removes a partition from an image's table; the data inside is not erased.
+
+    Args:
+        disk_number (int): Index of the image disk.
+        partition_number (int): Position of the partition on the disk, as
+            "List Volumes" numbers it (1 for the first).
+
+    Returns:
+        bool: True once the partition table has been written.
+
+    Raises:
+        ValueError: If the disk or partition number is invalid.
+        OSError: If the image cannot be written.
+    """
+    disk = _image_disk(disk_number)
+    partitions = get_inventory().snapshot().partitions(disk.device_id)
+    if not 1 <= partition_number <= len(partitions):
+        raise ValueError(f"Invalid partition number: {partition_number}")
+    try:
+        with DiskImage(disk.device_id, writable=True) as image:
+            # PartitionRecord.index holds the MBR/GPT slot
+            image.delete_partition(partitions[partition_number - 1].index)
+    except ValueError as e:
+        raise OSError(str(e)) from e
+    finally:
+        get_inventory().invalidate([disk_number])
+    return True
+
+
+format_volume = unsupported("image", "Formatting volumes")
+format_volume_quick = unsupported("image", "Quick formatting volumes")
+resize_volume = unsupported("image", "Resizing volumes")
+prompt_bulk_format = unsupported("image", "Bulk formatting volumes")
+
+
+def close():
+    """Nothing to release; images are mapped only while a table is read or written."""
+
+
+set_inventory(RebuildingInventory(build_image_snapshot))
@@ -0,0 +1,244 @@
+# instrumentation.py
+"""Timing and counting of every backend call.
+
+WMI connects, class queries, ``associators()`` walks and subprocess runs
+are recorded per menu action with a call count, a latency histogram and the
+rows or bytes they returned.  ``print_report`` shows the breakdown (the
+``--profile`` option), and the same data can be exported as JSON or as a
+Prometheus text file to track regressions over time.
+"""
+import json
+import subprocess
+import threading
+import time
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float("inf"))
+
+
+class _Series:
+    __slots__ = ("count", "seconds", "rows", "bytes", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+
+class Metrics:
+    """Per-action call counts, latencies and result sizes for backend calls.
+
+    Series are keyed by ``(action, kind, name)``, e.g.
+    ``("list_volumes", "query", "Win32_DiskPartition")``.
+    """
+
+    def __init__(self):
+        self.trace_associators = False
+        self._series = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_action(self):
+        return getattr(self._local, "action", None) or "background"
+
+    def set_action(self, action):
+        """Attributes calls made by this thread from now on to ``action``."""
+        self._local.action = action
+
+    def record(self, kind, name, seconds, rows=0, size=0, action=None):
+        key = (action or self.current_action(), kind, name)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.count += 1
+            series.seconds += seconds
+            series.rows += rows
+            series.bytes += size
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series.buckets[i] += 1
+                    break
+
+    def calls(self, kind=None):
+        """Returns the number of recorded calls, optionally of one kind."""
+        with self._lock:
+            return sum(series.count for (_, k, _), series in self._series.items() if kind is None or k == kind)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def to_dict(self):
+        """Returns every series as a JSON-serialisable list."""
+        with self._lock:
+            return [
+                {
+                    "action": action, "kind": kind, "name": name,
+                    "count": series.count, "seconds": round(series.seconds, 6),
+                    "rows": series.rows, "bytes": series.bytes,
+                    "histogram": {("+Inf" if bound == float("inf") else str(bound)): hits
+                                  for bound, hits in zip(BUCKETS, series.buckets)},
+                }
+                for (action, kind, name), series in sorted(self._series.items())
+            ]
+
+    def export_json(self, path):
+        with open(path, "w") as json_file:
+            json.dump({"generated": time.time(), "series": self.to_dict()}, json_file, indent=2)
+
+    def prometheus_text(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP diskman_backend_calls_total Backend calls made by DiskMan.",
+            "# TYPE diskman_backend_calls_total counter",
+        ]
+        series_list = self.to_dict()
+
+        def labels(series, extra=""):
+            escaped = {key: str(series[key]).replace("\\", "\\\\").replace('"', '\\"') for key in ("action", "kind", "name")}
+            return f'{{action="{escaped["action"]}",kind="{escaped["kind"]}",name="{escaped["name"]}"{extra}}}'
+
+        for series in series_list:
+            lines.append(f"diskman_backend_calls_total{labels(series)} {series['count']}")
+        lines += ["# HELP diskman_backend_rows_total Rows returned by backend queries.",
+                  "# TYPE diskman_backend_rows_total counter"]
+        for series in series_list:
+            lines.append(f"diskman_backend_rows_total{labels(series)} {series['rows']}")
+        lines += ["# HELP diskman_backend_bytes_total Bytes of output returned by subprocesses.",
+                  "# TYPE diskman_backend_bytes_total counter"]
+        for series in series_list:
+            lines.append(f"diskman_backend_bytes_total{labels(series)} {series['bytes']}")
+        lines += ["# HELP diskman_backend_call_seconds Backend call latency.",
+                  "# TYPE diskman_backend_call_seconds histogram"]
+        for series in series_list:
+            cumulative = 0
+            for bound, hits in series["histogram"].items():
+                cumulative += hits
+                bucket_label = ',le="' + bound + '"'
+                lines.append(f"diskman_backend_call_seconds_bucket{labels(series, bucket_label)} {cumulative}")
+            lines.append(f"diskman_backend_call_seconds_sum{labels(series)} {series['seconds']}")
+            lines.append(f"diskman_backend_call_seconds_count{labels(series)} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path):
+        """Writes the metrics as a Prometheus text file (for node_exporter's textfile collector)."""
+        with open(path, "w") as prom_file:
+            prom_file.write(self.prometheus_text())
+
+    def print_report(self):
+        """Prints a per-action breakdown of backend calls."""
+        series_list = self.to_dict()
+        if not series_list:
+            print("No backend calls were recorded.")
+            return
+        print("\n** Backend profile **")
+        for action in dict.fromkeys(series["action"] for series in series_list):
+            rows = [series for series in series_list if series["action"] == action]
+            total = sum(series["seconds"] for series in rows)
+            print(f"\n{action}: {sum(series['count'] for series in rows)} calls, {total * 1000:.1f} ms")
+            print("  Kind         Name                            Calls   Total ms    Avg ms    Rows/Bytes")
+            print("  -----------  ------------------------------  -----  ---------  --------  ----------")
+            for series in sorted(rows, key=lambda series: -series["seconds"]):
+                average = series["seconds"] / series["count"] * 1000
+                returned = series["rows"] or series["bytes"]
+                print(f"  {series['kind']:<11}  {series['name'][:30]:<30}  {series['count']:>5}  "
+                      f"{series['seconds'] * 1000:>9.1f}  {average:>8.2f}  {returned:>10}")
+
+
+def _rows(result):
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+class InstrumentedObject:
+    """Wraps a WMI object so its ``associators()`` walks are timed."""
+
+    __slots__ = ("_wrapped", "_metrics")
+
+    def __init__(self, wrapped, metrics):
+        object.__setattr__(self, "_wrapped", wrapped)
+        object.__setattr__(self, "_metrics", metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._wrapped, name, value)
+
+    def associators(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._wrapped.associators(*args, **kwargs)
+        name = (args[0] if args else kwargs.get("wmi_association_class") or kwargs.get("wmi_result_class")) or "*"
+        self._metrics.record("associators", name, time.perf_counter() - started, rows=_rows(result))
+        return [InstrumentedObject(item, self._metrics) for item in result]
+
+
+class InstrumentedConnection:
+    """Wraps a WMI connection so every class query and WQL query is timed."""
+
+    def __init__(self, connection, metrics):
+        self._connection = connection
+        self._metrics = metrics
+
+    def _wrap_results(self, result):
+        if self._metrics.trace_associators:
+            return [InstrumentedObject(item, self._metrics) for item in result]
+        return result
+
+    def __getattr__(self, name):
+        attribute = getattr(self._connection, name)
+        if not name.startswith("Win32_"):
+            return attribute
+
+        def timed_class_query(*args, **kwargs):
+            started = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            self._metrics.record("query", name, time.perf_counter() - started, rows=_rows(result))
+            return self._wrap_results(result)
+        return timed_class_query
+
+    def query(self, wql, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._connection.query(wql, *args, **kwargs)
+        words = wql.split()
+        name = words[words.index("FROM") + 1] if "FROM" in words else "WQL"
+        self._metrics.record("query", name, time.perf_counter() - started, rows=_rows(result))
+        return self._wrap_results(result)
+
+
+def connect(provider, metrics=None, **connect_args):
+    """Opens a connection through ``provider``, timing it and wrapping it for instrumentation."""
+    metrics = metrics or get_metrics()
+    started = time.perf_counter()
+    connection = provider(**connect_args)
+    metrics.record("connect", connect_args.get("computer") or "local", time.perf_counter() - started)
+    return InstrumentedConnection(connection, metrics)
+
+
+def run_subprocess(args, metrics=None, **kwargs):
+    """``subprocess.run`` that records its latency and output size."""
+    metrics = metrics or get_metrics()
+    name = " ".join(str(arg) for arg in args[:2])
+    started = time.perf_counter()
+    try:
+        completed = subprocess.run(args, **kwargs)
+    except Exception:
+        metrics.record("subprocess", name, time.perf_counter() - started)
+        raise
+    output = completed.stdout or b""
+    metrics.record("subprocess", name, time.perf_counter() - started,
+                   size=len(output.encode() if isinstance(output, str) else output))
+    return completed
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Returns the process-wide metrics registry."""
+    return _metrics
@@ -0,0 +1,134 @@
+# inventory_cache.py
+"""Time-limited cache of the disk topology shared by the listing actions.
+
+Listing disks or volumes reuses the cached snapshot until its TTL runs out.
+Operations that change a disk (create partition, format, resize) mark that
+disk stale, and only the stale disks are re-queried on the next listing.
+
+A snapshot is never changed once it has been handed out: refreshing stale
+disks builds a new one and swaps it in, so readers on other threads (the
+agent, the snapshot store, listing generators) keep a consistent view.
+"""
+import os
+import threading
+import time
+
+from topology import build_snapshot
+from wmi_session import get_session
+
+
+DEFAULT_TTL = float(os.environ.get("DISKMAN_CACHE_TTL", "30"))
+
+
+class InventoryCache:
+    """Caches a TopologySnapshot for ``ttl`` seconds with per-disk invalidation."""
+
+    def __init__(self, session=None, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.session = session
+        self.ttl = ttl
+        self.clock = clock
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._stale_disks = set()
+        self._lock = threading.RLock()
+        self.generation = 0  # Bumped whenever the snapshot's contents are reloaded or patched
+
+    def _session(self):
+        return self.session or get_session()
+
+    def snapshot(self):
+        """Returns the cached snapshot, reloading whatever has expired or gone stale."""
+        with self._lock:
+            if self._snapshot is None or self.clock() - self._loaded_at >= self.ttl:
+                self._snapshot = self._session().query(build_snapshot)
+                self._loaded_at = self.clock()
+                self._stale_disks.clear()
+                self.generation += 1
+            elif self._stale_disks:
+                stale = sorted(self._stale_disks)
+                # Patched on a copy and swapped in, since other threads may be reading the current one
+                self._snapshot = self._session().query(lambda c: self._snapshot.refresh_disks(c, stale))
+                self._stale_disks.clear()
+                self.generation += 1
+            return self._snapshot
+
+    def cached(self):
+        """Returns the last snapshot without reloading anything, or None."""
+        return self._snapshot
+
+    def invalidate(self, disk_indexes=None):
+        """Marks the given disks stale, or drops the whole snapshot when none are given."""
+        with self._lock:
+            if disk_indexes is None:
+                self._snapshot = None
+                self._stale_disks.clear()
+            else:
+                self._stale_disks.update(int(disk_index) for disk_index in disk_indexes)
+
+    def invalidate_volume(self, logical_disk_id):
+        """Marks the disk holding a logical disk (e.g. ``"E:"``) stale."""
+        with self._lock:
+            disk = self._snapshot.disk_for_logical_disk(logical_disk_id) if self._snapshot else None
+            if disk is None:
+                self.invalidate()
+            else:
+                self.invalidate([disk.index])
+
+
+class RebuildingInventory:
+    """InventoryCache counterpart for backends that read their whole topology cheaply.
+
+    When rebuilding everything costs about as much as re-reading one disk
+    (sysfs, disk images), invalidating any disk simply drops the snapshot.
+
+    Args:
+        build (callable): Returns a fresh TopologySnapshot.
+        ttl (float, optional): Seconds a snapshot is reused. Defaults to DEFAULT_TTL.
+        clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+    """
+
+    def __init__(self, build, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.build = build
+        self.ttl = ttl
+        self.clock = clock
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def snapshot(self):
+        """Returns the cached snapshot, rebuilding it once it has expired or been invalidated."""
+        with self._lock:
+            if self._snapshot is None or self.clock() - self._loaded_at >= self.ttl:
+                self._snapshot = self.build()
+                self._loaded_at = self.clock()
+                self.generation += 1
+            return self._snapshot
+
+    def cached(self):
+        return self._snapshot
+
+    def invalidate(self, disk_indexes=None):
+        with self._lock:
+            self._snapshot = None
+
+    def invalidate_volume(self, logical_disk_id):
+        self.invalidate()
+
+
+_inventory = None
+
+
+def get_inventory():
+    """Returns the process-wide inventory cache, creating it on first use."""
+    global _inventory
+    if _inventory is None:
+        _inventory = InventoryCache()
+    return _inventory
+
+
+def set_inventory(inventory):
+    """Replaces the process-wide inventory cache."""
+    global _inventory
+    _inventory = inventory
+    return _inventory
@@ -0,0 +1,281 @@
+# inventory_events.py
+"""Keeps the cached inventory current from device change events.
+
+Instead of re-listing on a short TTL, an InventoryWatcher subscribes to an
+event source and marks only the affected disk (or the disk holding the
+affected volume) stale; the inventory re-queries just that disk on its next
+read.  The cache TTL is stretched to ``resync_interval`` so a slow periodic
+full resync still catches anything the events missed.
+
+Event sources are pluggable: anything with ``start(callback)`` and
+``stop()`` that calls ``callback(InventoryEvent)`` will do.
+
+- WMIEventSource: ``Win32_VolumeChangeEvent`` and creation/deletion of
+  ``Win32_DiskDrive`` instances.
+- UeventSource: kernel block-device uevents plus mount table changes on Linux.
+- ScriptedEventSource: a canned list of events, for exercising the update
+  logic without hardware.
+"""
+import os
+import socket
+import threading
+
+from instrumentation import get_metrics
+from inventory_cache import get_inventory
+
+DISK_ADDED = "disk_added"
+DISK_REMOVED = "disk_removed"
+DISK_CHANGED = "disk_changed"
+VOLUME_CHANGED = "volume_changed"
+RESYNC = "resync"
+
+DEFAULT_RESYNC_INTERVAL = float(os.environ.get("DISKMAN_RESYNC_INTERVAL", "600"))
+
+
+class InventoryEvent:
+    """A change to one disk or volume; fields that are unknown stay None.
+
+    Args:
+        kind (str): DISK_ADDED, DISK_REMOVED, DISK_CHANGED, VOLUME_CHANGED or RESYNC.
+        disk_index (int, optional): Disk number (``Win32_DiskDrive.Index``).
+        disk_id (str, optional): Disk DeviceID, when the source has no index (e.g. ``/dev/sda``).
+        volume_id (str, optional): Volume DeviceID (e.g. ``"E:"``).
+    """
+
+    __slots__ = ("kind", "disk_index", "disk_id", "volume_id")
+
+    def __init__(self, kind, disk_index=None, disk_id=None, volume_id=None):
+        self.kind = kind
+        self.disk_index = disk_index
+        self.disk_id = disk_id
+        self.volume_id = volume_id
+
+    def __repr__(self):
+        details = ", ".join(f"{name}={getattr(self, name)!r}" for name in ("disk_index", "disk_id", "volume_id")
+                            if getattr(self, name) is not None)
+        return f"InventoryEvent({self.kind}{', ' + details if details else ''})"
+
+
+class InventoryWatcher:
+    """Applies events from ``source`` to an inventory cache.
+
+    Args:
+        source: Event source with ``start(callback)`` and ``stop()``.
+        inventory (InventoryCache, optional): Cache to patch. Defaults to the process-wide one.
+        resync_interval (float, optional): Seconds between full resyncs while watching.
+            Defaults to ``$DISKMAN_RESYNC_INTERVAL`` or 600.
+    """
+
+    def __init__(self, source, inventory=None, resync_interval=DEFAULT_RESYNC_INTERVAL):
+        self.source = source
+        self.inventory = inventory
+        self.resync_interval = resync_interval
+        self.events_seen = 0
+        self._listeners = []
+        self._previous_ttl = None
+
+    def _inventory(self):
+        return self.inventory or get_inventory()
+
+    def start(self):
+        """Stretches the inventory TTL to the resync interval and starts listening."""
+        inventory = self._inventory()
+        self._previous_ttl = inventory.ttl
+        inventory.ttl = self.resync_interval
+        self.source.start(self.handle)
+        return self
+
+    def stop(self):
+        """Stops listening and restores the inventory's own TTL."""
+        self.source.stop()
+        if self._previous_ttl is not None:
+            self._inventory().ttl = self._previous_ttl
+            self._previous_ttl = None
+
+    def subscribe(self, listener):
+        """Calls ``listener(event)`` after each event has been applied."""
+        self._listeners.append(listener)
+
+    def _disk_index(self, event):
+        if event.disk_index is not None:
+            return event.disk_index
+        snapshot = self._inventory().cached()
+        disk = snapshot.disks_by_id.get(event.disk_id) if snapshot and event.disk_id else None
+        return disk.index if disk else None
+
+    def handle(self, event):
+        """Marks whatever ``event`` touched stale; unknown targets make the whole inventory stale."""
+        inventory = self._inventory()
+        disk_index = self._disk_index(event) if event.kind in (DISK_ADDED, DISK_REMOVED, DISK_CHANGED) else None
+        if event.kind == VOLUME_CHANGED and event.volume_id:
+            inventory.invalidate_volume(event.volume_id)
+        elif disk_index is not None:
+            inventory.invalidate([disk_index])
+        else:
+            inventory.invalidate()
+        self.events_seen += 1
+        get_metrics().record("event", event.kind, 0.0, action="events")
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                pass  # A broken listener must not stop event delivery
+
+
+class _ThreadedSource:
+    """Runs ``_run(callback)`` on a daemon thread until stop() is called."""
+
+    name = "events"
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, callback):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,), daemon=True,
+                                        name=f"diskman-{self.name}")
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, callback):
+        raise NotImplementedError
+
+
+class ScriptedEventSource(_ThreadedSource):
+    """Delivers a fixed list of events, optionally ``interval`` seconds apart.
+
+    Args:
+        events (iterable): InventoryEvent objects to deliver in order.
+        interval (float, optional): Seconds to wait before each event. Defaults to 0.
+    """
+
+    name = "scripted-events"
+
+    def __init__(self, events, interval=0.0):
+        super().__init__()
+        self.events = list(events)
+        self.interval = interval
+        self.delivered = threading.Event()
+
+    def _run(self, callback):
+        for event in self.events:
+            if self._stop.wait(self.interval):
+                return
+            callback(event)
+        self.delivered.set()
+
+    def wait(self, timeout=None):
+        """Blocks until every event has been delivered."""
+        return self.delivered.wait(timeout)
+
+
+class WMIEventSource(_ThreadedSource):
+    """Win32_VolumeChangeEvent and Win32_DiskDrive creation/deletion events.
+
+    The watchers run on their own thread with their own connection from
+    ``session``; if the connection drops, a RESYNC event is sent and the
+    watchers are recreated after ``retry_delay`` seconds.
+    """
+
+    name = "wmi-events"
+
+    def __init__(self, session=None, poll_ms=500, retry_delay=5.0):
+        super().__init__()
+        self.session = session
+        self.poll_ms = poll_ms
+        self.retry_delay = retry_delay
+
+    def _watchers(self, connection):
+        return [
+            (connection.watch_for(raw_wql="SELECT * FROM Win32_VolumeChangeEvent"), VOLUME_CHANGED),
+            (connection.watch_for(notification_type="Creation", wmi_class="Win32_DiskDrive", delay_secs=2), DISK_ADDED),
+            (connection.watch_for(notification_type="Deletion", wmi_class="Win32_DiskDrive", delay_secs=2), DISK_REMOVED),
+        ]
+
+    def _run(self, callback):
+        import wmi
+        from wmi_session import get_session
+
+        session = self.session or get_session()
+        while not self._stop.is_set():
+            try:
+                watchers = self._watchers(session.connection())
+                while not self._stop.is_set():
+                    for watcher, kind in watchers:
+                        try:
+                            event = watcher(timeout_ms=self.poll_ms)
+                        except wmi.x_wmi_timed_out:
+                            continue
+                        if kind == VOLUME_CHANGED:
+                            callback(InventoryEvent(kind, volume_id=getattr(event, "DriveName", None)))
+                        else:
+                            callback(InventoryEvent(kind, disk_index=getattr(event, "Index", None)))
+            except Exception as e:
+                print(f"WMI event watch failed, resynchronising: {e}")
+                session.close()
+                callback(InventoryEvent(RESYNC))
+                self._stop.wait(self.retry_delay)
+
+
+# linux/netlink.h
+NETLINK_KOBJECT_UEVENT = 15
+_KERNEL_UEVENT_GROUP = 1
+
+
+def parse_uevent(data):
+    """Returns a block-device InventoryEvent for a kernel uevent message, or None for other devices."""
+    fields = dict(part.split("=", 1) for part in data.decode(errors="replace").split("\0") if "=" in part)
+    if fields.get("SUBSYSTEM") != "block" or "DEVNAME" not in fields:
+        return None
+    devpath = fields.get("DEVPATH", "").rstrip("/").split("/")
+    if fields.get("DEVTYPE") == "partition" and len(devpath) >= 2:
+        # .../block/sda/sda1: the partition's disk changed
+        return InventoryEvent(DISK_CHANGED, disk_id="/dev/" + devpath[-2])
+    kind = {"add": DISK_ADDED, "remove": DISK_REMOVED}.get(fields.get("ACTION"), DISK_CHANGED)
+    return InventoryEvent(kind, disk_id="/dev/" + os.path.basename(fields["DEVNAME"]))
+
+
+class UeventSource(_ThreadedSource):
+    """Kernel block-device uevents and mount table changes on Linux.
+
+    Uevents arrive on a netlink socket; mounts and unmounts are not uevents,
+    but the kernel flags ``/proc/self/mountinfo`` readable-with-priority when
+    the mount table changes, which is reported as a volume change.
+    """
+
+    name = "uevents"
+
+    def __init__(self, proc_root=None):
+        super().__init__()
+        self.proc_root = proc_root
+
+    def _run(self, callback):
+        import select
+        from sysfs_topology import PROC_ROOT
+
+        uevents = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        uevents.bind((0, _KERNEL_UEVENT_GROUP))
+        mountinfo = open(os.path.join(self.proc_root or PROC_ROOT, "self", "mountinfo"))
+        poller = select.poll()
+        poller.register(uevents, select.POLLIN)
+        poller.register(mountinfo, select.POLLPRI)
+        mountinfo.read()
+        try:
+            while not self._stop.is_set():
+                for fd, _ in poller.poll(500):
+                    if fd == uevents.fileno():
+                        event = parse_uevent(uevents.recv(65536))
+                        if event:
+                            callback(event)
+                    else:
+                        mountinfo.seek(0)
+                        mountinfo.read()  # Re-arms the notification
+                        callback(InventoryEvent(VOLUME_CHANGED))
+        finally:
+            uevents.close()
+            mountinfo.close()
@@ -0,0 +1,251 @@
+# jobs.py
+"""Background job engine for long-running volume operations.
+
+Format, extend and shrink can take minutes, so the TUI hands them to a
+JobEngine instead of calling them inline.  Jobs that target the same
+physical disk run one after another; jobs on different disks run in
+parallel on a bounded worker pool.
+
+A job function receives its Job as the first argument and may call
+``job.report(percent, message)`` and check ``job.cancel_requested``.  Jobs
+that are still queued can always be cancelled; running jobs stop only if
+their function was submitted as ``cancellable`` and checks the flag.  A
+job that cannot be undone part-way calls ``job.commit()`` before it
+starts changing anything; from then on cancel() refuses it.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import get_metrics
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """One queued or running operation and its live status."""
+
+    def __init__(self, job_id, description, disk_key, func, args, kwargs, cancellable, engine):
+        self.id = job_id
+        self.description = description
+        self.disk_key = disk_key
+        self.cancellable = cancellable
+        self.status = PENDING
+        self.progress = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self._action = get_metrics().current_action()
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._engine = engine
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.description!r}, {self.status})"
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def report(self, progress, message=""):
+        """Updates the job's progress (0-100) and notifies the engine's listener."""
+        self.progress = max(0, min(100, int(progress)))
+        if message:
+            self.message = message
+        self._engine._notify(self)
+
+    def commit(self):
+        """Marks the point after which a cancellable job can no longer stop, e.g. before it writes.
+
+        Returns:
+            bool: False if a cancel arrived first and the job should return now, True otherwise.
+        """
+        with self._engine._lock:
+            if self._cancel.is_set():
+                return False
+            self.cancellable = False
+            return True
+
+    def cancel(self):
+        """Cancels the job if it has not started, or asks a cancellable job to stop.
+
+        Returns:
+            bool: True if the job was or will be cancelled, False otherwise.
+        """
+        return self._engine._cancel(self)
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class JobEngine:
+    """Runs jobs in background workers, one at a time per disk.
+
+    Args:
+        max_workers (int, optional): Jobs running at once across all disks. Defaults to 4.
+        on_update (callable, optional): Called with a Job whenever its status or
+            progress changes, from the worker thread.
+    """
+
+    def __init__(self, max_workers=4, on_update=None):
+        self.on_update = on_update
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diskman-job")
+        self._ids = itertools.count(1)
+        self._jobs = []
+        self._queues = {}        # disk_key -> deque of pending jobs
+        self._busy_disks = set()
+        self._lock = threading.Lock()
+
+    def submit(self, description, disk_key, func, *args, cancellable=False, **kwargs):
+        """Queues ``func(job, *args, **kwargs)`` to run against ``disk_key``."""
+        with self._lock:
+            job = Job(next(self._ids), description, disk_key, func, args, kwargs, cancellable, self)
+            self._jobs.append(job)
+        self._notify(job)
+        with self._lock:
+            if disk_key in self._busy_disks:
+                self._queues.setdefault(disk_key, deque()).append(job)
+            else:
+                self._start(job)
+        return job
+
+    def jobs(self):
+        """Returns every job submitted so far, oldest first."""
+        with self._lock:
+            return list(self._jobs)
+
+    def active(self):
+        """Returns the jobs that are pending or running."""
+        return [job for job in self.jobs() if job.status in (PENDING, RUNNING)]
+
+    def wait_all(self, timeout=None):
+        """Blocks until every submitted job has finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in self.jobs():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.wait(remaining):
+                return False
+        return True
+
+    def shutdown(self, wait=True):
+        """Cancels queued jobs and stops the workers."""
+        for job in self.active():
+            if job.status == PENDING:
+                job.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def _start(self, job):
+        # Called with the lock held
+        self._busy_disks.add(job.disk_key)
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        get_metrics().set_action(job._action)  # Attribute backend calls to the menu action that queued the job
+        job.status = RUNNING
+        job.started = time.monotonic()
+        self._notify(job)
+        try:
+            job.result = job._func(job, *job._args, **job._kwargs)
+        except Exception as e:
+            job.error = e
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, CANCELLED if job.cancel_requested and job.cancellable else DONE)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.monotonic()
+        if status == DONE:
+            job.progress = 100
+        with self._lock:
+            queue = self._queues.get(job.disk_key)
+            if queue:
+                self._start(queue.popleft())
+            else:
+                self._busy_disks.discard(job.disk_key)
+        self._notify(job)
+        job._done.set()
+
+    def _cancel(self, job):
+        with self._lock:
+            if job.status == PENDING:
+                queue = self._queues.get(job.disk_key)
+                if queue and job in queue:
+                    queue.remove(job)
+                    job._cancel.set()
+                    job.status = CANCELLED
+                    job.finished = time.monotonic()
+                    job._done.set()
+                    cancelled = True
+                else:
+                    # Already handed to a worker; it stops before starting
+                    job._cancel.set()
+                    cancelled = True
+            elif job.status == RUNNING and job.cancellable:
+                job._cancel.set()
+                cancelled = True
+            else:
+                cancelled = False
+        if cancelled:
+            self._notify(job)
+        return cancelled
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception:
+                pass  # A broken listener must not kill the job
+
+
+_engine = None
+
+
+def get_job_engine():
+    """Returns the process-wide job engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = JobEngine()
+    return _engine
+
+
+def set_job_engine(engine):
+    """Replaces the process-wide job engine."""
+    global _engine
+    _engine = engine
+    return _engine
+
+
+def print_jobs(engine=None):
+    """Prints a status table of every job."""
+    jobs = (engine or get_job_engine()).jobs()
+    if not jobs:
+        print("No jobs have been started.")
+        return
+    print("Job  Status     Progress  Elapsed  Description")
+    print("---  ---------  --------  -------  -----------")
+    for job in jobs:
+        detail = f" ({job.error})" if job.error else (f" - {job.message}" if job.message else "")
+        print(f"{job.id:<3}  {job.status:<9}  {job.progress:>7}%  {job.elapsed:>6.1f}s  {job.description}{detail}")
@@ -0,0 +1,38 @@
+# linux_backend.py
+"""The Linux backend: inventory from sysfs and procfs, no subprocesses.
+
+Disk and volume listings (and disk selection) use the shared TUI code over
+a snapshot from sysfs_topology.  Partitioning, formatting and resizing are
+not implemented here and say so instead of reaching for WMI or diskpart.
+"""
+from backends import unsupported
+from disk_management import list_and_select_disk, list_disks
+from inventory_cache import RebuildingInventory, set_inventory
+from sysfs_topology import build_sysfs_snapshot
+from volume_management import find_fixed_volume, list_volumes, volumes_on_disk
+
+__all__ = [
+    "close", "create_partition", "event_source", "find_fixed_volume", "format_volume", "format_volume_quick",
+    "list_and_select_disk", "list_disks", "list_volumes", "prompt_bulk_format", "resize_volume",
+    "volumes_on_disk",
+]
+
+
+create_partition = unsupported("linux", "Creating partitions")
+format_volume = unsupported("linux", "Formatting volumes")
+format_volume_quick = unsupported("linux", "Quick formatting volumes")
+resize_volume = unsupported("linux", "Resizing volumes")
+prompt_bulk_format = unsupported("linux", "Bulk formatting volumes")
+
+
+def event_source():
+    """Returns the source of block-device and mount change events for this backend."""
+    from inventory_events import UeventSource
+    return UeventSource()
+
+
+def close():
+    """Nothing to release; sysfs is read with plain file reads."""
+
+
+set_inventory(RebuildingInventory(build_sysfs_snapshot))
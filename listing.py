@@ -0,0 +1,69 @@
+# listing.py
+"""Disk and volume rows for the listings, yielded one at a time.
+
+The TUI tables, the JSON/CSV subcommands and any other renderer consume
+these generators and write each row as it arrives, so output starts with the
+first disk and memory does not grow with the number of volumes.  Rows are
+plain dicts, ready for ``json.dumps`` or ``csv.DictWriter``.
+
+Rows come from an inventory snapshot, which the backends build with a few
+flat queries; walking it row by row costs no further backend calls.
+"""
+from inventory_cache import get_inventory
+
+DISK_FIELDS = ("number", "device_id", "caption", "model", "size", "status", "partitions")
+VOLUME_FIELDS = (
+    "disk", "disk_caption", "number", "partition", "device_id", "label", "file_system", "partition_size", "size",
+    "free_space", "status", "block_size", "drive_type",
+)
+
+
+def iter_disk_rows(snapshot=None):
+    """Yields one row per disk.
+
+    Args:
+        snapshot (TopologySnapshot, optional): Inventory to list, e.g. from a
+            remote host. Defaults to the local cached inventory.
+
+    Yields:
+        dict: DISK_FIELDS; ``number`` is the disk's Index, as create-partition takes it.
+    """
+    snapshot = snapshot or get_inventory().snapshot()
+    for disk in snapshot.disks:
+        yield {
+            "number": disk.index, "device_id": disk.device_id, "caption": disk.caption, "model": disk.model,
+            "size": disk.size, "status": disk.status, "partitions": len(snapshot.partitions(disk.device_id)),
+        }
+
+
+def iter_volume_rows(snapshot=None, disk=None):
+    """Yields one row per partition, with the volume on it if it has one.
+
+    Args:
+        snapshot (TopologySnapshot, optional): Inventory to list. Defaults to the local cached inventory.
+        disk (DiskRecord or int, optional): Only this disk (a record or its Index). Defaults to all disks.
+
+    Yields:
+        dict: VOLUME_FIELDS; ``number`` counts partitions on the disk from 1, and the
+        volume fields are None for a partition without a volume.
+    """
+    snapshot = snapshot or get_inventory().snapshot()
+    if disk is None:
+        disks = snapshot.disks
+    elif hasattr(disk, "device_id"):
+        disks = [disk]
+    else:
+        disks = [current_disk for current_disk in snapshot.disks if current_disk.index == disk]
+    for current_disk in disks:
+        for number, partition in enumerate(snapshot.partitions(current_disk.device_id), start=1):
+            logical_disks = snapshot.logical_disks(partition.device_id)
+            volume = logical_disks[0] if logical_disks else None
+            yield {
+                "disk": current_disk.index, "disk_caption": current_disk.caption, "number": number,
+                "partition": partition.index, "device_id": volume.device_id if volume else None,
+                "label": volume.volume_name if volume else None,
+                "file_system": volume.file_system if volume else None, "partition_size": partition.size,
+                "size": volume.size if volume else None, "free_space": volume.free_space if volume else None,
+                "status": volume.status if volume else None, "block_size": partition.block_size,
+                "drive_type": volume.drive_type if volume else None,
+            }
@@ -0,0 +1,122 @@
+# records.py
+"""Compact, read-only copies of the WMI objects the listings show.
+
+Live WMI objects carry every property of their class and fetch values over
+COM on each access.  The listing code only needs a handful of columns, so
+each object is converted once into a small ``__slots__`` record.
+"""
+
+# Columns fetched for each class; WQL projections use these lists
+DISK_FIELDS = ["DeviceID", "Index", "Caption", "Model", "Size", "Status"]
+PARTITION_FIELDS = ["DeviceID", "DiskIndex", "Index", "Size", "StartingOffset", "BlockSize", "Bootable", "Type"]
+VOLUME_FIELDS = ["DeviceID", "VolumeName", "FileSystem", "Size", "FreeSpace", "DriveType", "Status"]
+LINK_FIELDS = ["Antecedent", "Dependent"]
+
+
+def _int_or_none(value):
+    return int(value) if value not in (None, "") else None
+
+
+def _to_dict(record):
+    return {field: getattr(record, field) for field in record.__slots__}
+
+
+class DiskRecord:
+    """A physical disk (Win32_DiskDrive)."""
+
+    __slots__ = ("device_id", "index", "caption", "model", "size", "status")
+
+    def __init__(self, device_id, index, caption="", model="", size=None, status="Unknown"):
+        self.device_id = device_id
+        self.index = index
+        self.caption = caption
+        self.model = model
+        self.size = size
+        self.status = status
+
+    def __repr__(self):
+        return f"DiskRecord({self.device_id!r}, index={self.index})"
+
+    def to_dict(self):
+        return _to_dict(self)
+
+    @classmethod
+    def from_wmi(cls, disk):
+        return cls(
+            device_id=disk.DeviceID,
+            index=_int_or_none(getattr(disk, "Index", None)),
+            caption=getattr(disk, "Caption", None) or "",
+            model=getattr(disk, "Model", None) or "",
+            size=_int_or_none(getattr(disk, "Size", None)),
+            status=getattr(disk, "Status", None) or "Unknown",
+        )
+
+
+class PartitionRecord:
+    """A partition on a physical disk (Win32_DiskPartition)."""
+
+    __slots__ = ("device_id", "disk_index", "index", "size", "starting_offset", "block_size", "bootable", "type")
+
+    def __init__(self, device_id, disk_index, index, size=None, starting_offset=None,
+                 block_size=None, bootable=False, type=""):
+        self.device_id = device_id
+        self.disk_index = disk_index
+        self.index = index
+        self.size = size
+        self.starting_offset = starting_offset
+        self.block_size = block_size
+        self.bootable = bootable
+        self.type = type
+
+    def __repr__(self):
+        return f"PartitionRecord({self.device_id!r})"
+
+    def to_dict(self):
+        return _to_dict(self)
+
+    @classmethod
+    def from_wmi(cls, partition):
+        return cls(
+            device_id=partition.DeviceID,
+            disk_index=_int_or_none(getattr(partition, "DiskIndex", None)),
+            index=_int_or_none(getattr(partition, "Index", None)) or 0,
+            size=_int_or_none(getattr(partition, "Size", None)),
+            starting_offset=_int_or_none(getattr(partition, "StartingOffset", None)),
+            block_size=_int_or_none(getattr(partition, "BlockSize", None)),
+            bootable=bool(getattr(partition, "Bootable", False)),
+            type=getattr(partition, "Type", None) or "",
+        )
+
+
+class VolumeRecord:
+    """A volume with a drive letter (Win32_LogicalDisk)."""
+
+    __slots__ = ("device_id", "volume_name", "file_system", "size", "free_space", "drive_type", "status")
+
+    def __init__(self, device_id, volume_name="", file_system="", size=None, free_space=None,
+                 drive_type=None, status="Unknown"):
+        self.device_id = device_id
+        self.volume_name = volume_name
+        self.file_system = file_system
+        self.size = size
+        self.free_space = free_space
+        self.drive_type = drive_type
+        self.status = status
+
+    def __repr__(self):
+        return f"VolumeRecord({self.device_id!r})"
+
+    def to_dict(self):
+        return _to_dict(self)
+
+    @classmethod
+    def from_wmi(cls, logical_disk):
+        return cls(
+            device_id=logical_disk.DeviceID,
+            volume_name=getattr(logical_disk, "VolumeName", None) or "",
+            file_system=getattr(logical_disk, "FileSystem", None) or "",
+            size=_int_or_none(getattr(logical_disk, "Size", None)),
+            free_space=_int_or_none(getattr(logical_disk, "FreeSpace", None)),
+            drive_type=_int_or_none(getattr(logical_disk, "DriveType", None)),
+            status=getattr(logical_disk, "Status", None) or "Unknown",
+        )
@@ -0,0 +1,259 @@
+# snapshot_store.py
+"""Persistent inventory snapshots in SQLite, with diffs and free-space history.
+
+Every disk, partition and volume record is hashed.  A record version is
+stored once, and a *span* row says from which snapshot to which snapshot of
+a host it was present; a record that does not change between snapshots
+costs no writes at all.  So a year of per-minute snapshots grows only with
+the number of changes (mostly free space moving), not with
+snapshots x records.
+
+Diffs read only the spans that start or end between the two snapshots, and
+the history of a volume is simply its spans in order.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+
+DEFAULT_PATH = os.environ.get("DISKMAN_STORE", "diskman_snapshots.db")
+
+DISK = "disk"
+PARTITION = "partition"
+VOLUME = "volume"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    taken REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spans (
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES records(hash),
+    first INTEGER NOT NULL,
+    last INTEGER            -- NULL while the record is still present
+);
+CREATE INDEX IF NOT EXISTS spans_open ON spans (host, last);
+CREATE INDEX IF NOT EXISTS spans_first ON spans (host, first);
+CREATE INDEX IF NOT EXISTS spans_key ON spans (host, kind, key, first);
+CREATE INDEX IF NOT EXISTS snapshots_host ON snapshots (host, id);
+"""
+
+
+def snapshot_records(snapshot):
+    """Yields ``(kind, key, data)`` for every record in a TopologySnapshot."""
+    for disk in snapshot.disks:
+        yield DISK, disk.device_id, disk.to_dict()
+        for partition in snapshot.partitions(disk.device_id):
+            yield PARTITION, partition.device_id, dict(partition.to_dict(), disk=disk.device_id)
+            for logical_disk in snapshot.logical_disks(partition.device_id):
+                yield VOLUME, logical_disk.device_id, dict(logical_disk.to_dict(), partition=partition.device_id)
+
+
+def _record_hash(kind, data):
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(f"{kind}\0{text}".encode()).hexdigest(), text
+
+
+class SnapshotStore:
+    """Snapshots of one or more hosts in one SQLite file.
+
+    Args:
+        path (str, optional): Database file. Defaults to ``$DISKMAN_STORE`` or diskman_snapshots.db.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, snapshot, host=None, taken=None):
+        """Stores a TopologySnapshot and returns its snapshot id.
+
+        Only records whose hash differs from the host's previous snapshot are
+        written; records that disappeared have their span closed.
+        """
+        host = host or socket.gethostname()
+        with self._db:
+            previous = self._db.execute("SELECT MAX(id) FROM snapshots WHERE host = ?", (host,)).fetchone()[0]
+            snapshot_id = self._db.execute("INSERT INTO snapshots (host, taken) VALUES (?, ?)",
+                                           (host, time.time() if taken is None else taken)).lastrowid
+            open_spans = {
+                (kind, key): (rowid, record_hash)
+                for rowid, kind, key, record_hash in self._db.execute(
+                    "SELECT rowid, kind, key, hash FROM spans WHERE host = ? AND last IS NULL", (host,))
+            }
+            new_records, new_spans, closed = [], [], []
+            seen = set()
+            for kind, key, data in snapshot_records(snapshot):
+                # A volume spanning several partitions is listed under each; only its first listing is stored
+                if (kind, key) in seen:
+                    continue
+                seen.add((kind, key))
+                record_hash, text = _record_hash(kind, data)
+                current = open_spans.pop((kind, key), None)
+                if current and current[1] == record_hash:
+                    continue  # Unchanged: the open span simply carries on
+                if current:
+                    closed.append(current[0])
+                new_records.append((record_hash, text))
+                new_spans.append((host, kind, key, record_hash, snapshot_id))
+            closed += [rowid for rowid, _ in open_spans.values()]  # Records that are gone
+            self._db.executemany("UPDATE spans SET last = ? WHERE rowid = ?", [(previous, rowid) for rowid in closed])
+            self._db.executemany("INSERT OR IGNORE INTO records (hash, data) VALUES (?, ?)", new_records)
+            self._db.executemany("INSERT INTO spans (host, kind, key, hash, first) VALUES (?, ?, ?, ?, ?)", new_spans)
+        return snapshot_id
+
+    def snapshots(self, host=None, limit=None):
+        """Returns ``(id, host, taken)`` rows, newest first."""
+        query = "SELECT id, host, taken FROM snapshots"
+        params = []
+        if host:
+            query += " WHERE host = ?"
+            params.append(host)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self._db.execute(query, params).fetchall()
+
+    def host_of(self, snapshot_id):
+        row = self._db.execute("SELECT host FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"No snapshot {snapshot_id}")
+        return row[0]
+
+    def resolve(self, reference, host=None):
+        """Turns ``"latest"``, ``"previous"``, ``-N`` (N back from the latest) or an id into a snapshot id.
+
+        Relative references count the snapshots of ``host``, by default this host.
+        """
+        reference = str(reference)
+        if reference in ("latest", "previous") or reference.startswith("-"):
+            back = {"latest": 0, "previous": 1}.get(reference) if not reference.startswith("-") else int(reference[1:])
+            rows = self.snapshots(host or socket.gethostname(), limit=back + 1)
+            if len(rows) <= back:
+                raise ValueError(f"Only {len(rows)} snapshot(s) stored")
+            return rows[back][0]
+        return int(reference)
+
+    def diff(self, old_id, new_id):
+        """Returns what changed between two snapshots of the same host.
+
+        Returns:
+            list: ``(change, kind, key, old_data, new_data)`` tuples, where change
+            is ``"added"``, ``"removed"`` or ``"changed"`` and the data are dicts
+            (None on the side where the record is absent).
+        """
+        host = self.host_of(old_id)
+        if self.host_of(new_id) != host:
+            raise ValueError("Snapshots are of different hosts")
+        low, high = sorted((old_id, new_id))
+        # Only spans that begin or end between the two snapshots can differ
+        rows = self._db.execute(
+            "SELECT s.kind, s.key, s.hash, s.first, s.last, r.data FROM spans s JOIN records r ON r.hash = s.hash "
+            "WHERE s.host = ? AND ((s.first > ? AND s.first <= ?) OR (s.last >= ? AND s.last < ?))",
+            (host, low, high, low, high)).fetchall()
+        at_low, at_high = {}, {}
+        for kind, key, record_hash, first, last, data in rows:
+            if first <= low and (last is None or last >= low):
+                at_low[(kind, key)] = (record_hash, data)
+            if first <= high and (last is None or last >= high):
+                at_high[(kind, key)] = (record_hash, data)
+        if old_id > new_id:
+            at_low, at_high = at_high, at_low
+        changes = []
+        kind_order = {DISK: 0, PARTITION: 1, VOLUME: 2}
+        for kind, key in sorted(at_low.keys() | at_high.keys(), key=lambda item: (kind_order[item[0]], item[1])):
+            before, after = at_low.get((kind, key)), at_high.get((kind, key))
+            if before and after and before[0] == after[0]:
+                continue
+            change = "changed" if before and after else ("added" if after else "removed")
+            changes.append((change, kind, key, json.loads(before[1]) if before else None,
+                            json.loads(after[1]) if after else None))
+        return changes
+
+    def history(self, volume_id, host=None, since=None):
+        """Returns the size and free-space history of a volume, oldest first.
+
+        Args:
+            volume_id (str): Volume DeviceID, e.g. ``"E:"`` or a mount point.
+            host (str, optional): Host the volume belongs to. Defaults to this host.
+            since (float, optional): Only spans still present at or after this Unix time.
+
+        Returns:
+            list: ``(from_time, to_time, size, free_space)`` tuples; ``to_time`` is
+            the last snapshot the value was seen in, or None if it is current.
+        """
+        host = host or socket.gethostname()
+        rows = self._db.execute(
+            "SELECT first_snapshot.taken, last_snapshot.taken, r.data FROM spans s "
+            "JOIN records r ON r.hash = s.hash "
+            "JOIN snapshots first_snapshot ON first_snapshot.id = s.first "
+            "LEFT JOIN snapshots last_snapshot ON last_snapshot.id = s.last "
+            "WHERE s.host = ? AND s.kind = ? AND s.key = ? ORDER BY s.first",
+            (host, VOLUME, volume_id)).fetchall()
+        history = []
+        for first_taken, last_taken, data in rows:
+            if since is not None and last_taken is not None and last_taken < since:
+                continue
+            record = json.loads(data)
+            history.append((first_taken, last_taken, record.get("size"), record.get("free_space")))
+        return history
+
+
+def _format_value(field, value):
+    if field in ("size", "free_space") and isinstance(value, int):
+        return f"{value / (1024**3):.2f} GB"
+    return str(value)
+
+
+def print_diff(changes):
+    """Prints a diff from SnapshotStore.diff, one line per record and changed field."""
+    if not changes:
+        print("No changes.")
+        return
+    symbols = {"added": "+", "removed": "-", "changed": "~"}
+    for change, kind, key, before, after in changes:
+        print(f"{symbols[change]} {kind} {key}")
+        if change == "changed":
+            for field in sorted(before.keys() | after.keys()):
+                if before.get(field) != after.get(field):
+                    print(f"    {field}: {_format_value(field, before.get(field))} -> "
+                          f"{_format_value(field, after.get(field))}")
+
+
+def print_history(history):
+    """Prints a volume's free-space history with the change between rows."""
+    if not history:
+        print("No history for this volume.")
+        return
+    print("From                 To                   Size         Free         Change")
+    print("-------------------  -------------------  -----------  -----------  ----------")
+    previous_free = None
+    for first_taken, last_taken, size, free_space in history:
+        until = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_taken)) if last_taken else "now"
+        change = ""
+        if previous_free is not None and free_space is not None:
+            change = f"{(free_space - previous_free) / (1024**2):+,.0f} MB"
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first_taken))}  {until:<19}  "
+              f"{_format_value('size', size):>11}  {_format_value('free_space', free_space):>11}  {change}")
+        previous_free = free_space
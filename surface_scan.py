@@ -0,0 +1,315 @@
+# surface_scan.py
+"""Read-only surface scan of a disk or disk image, resumable from a checkpoint.
+
+Reused drives get a read-verify pass before going back into service.  The
+device is opened read-only and never written.  Several reader threads take
+large aligned chunks in order; each has its own descriptor and its own
+page-aligned buffer.  On Linux the device is opened with ``O_DIRECT`` where
+allowed, so every byte comes from the media rather than the page cache.
+
+A chunk that fails to read is re-read one block at a time to find the bad
+offsets.  A chunk slower than ``slow_ms`` is reported as a slow region.  The
+position below which every chunk is done is saved to a checkpoint file every
+few seconds and when the scan is interrupted; scanning the same device again
+offers to resume from there, keeping the errors and slow regions found so
+far.  The checkpoint is removed once the scan completes.
+"""
+import json
+import mmap
+import os
+import re
+import threading
+import time
+
+from instrumentation import get_metrics
+from volume_bench import read_at
+
+MB = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 4 * MB
+DEFAULT_WORKERS = 4
+DEFAULT_SLOW_MS = 500.0
+BLOCK_SIZE = 4096  # Re-read granularity for failed chunks; a multiple of every logical sector size
+CHECKPOINT_DIR = os.environ.get("DISKMAN_CHECKPOINT_DIR", ".")
+
+
+def checkpoint_path(device):
+    """Returns the default checkpoint file for a device path."""
+    name = re.sub(r"[^A-Za-z0-9]+", "_", device).strip("_") or "device"
+    return os.path.join(CHECKPOINT_DIR, f"surface_scan_{name}.json")
+
+
+def _open_read_only(path, direct):
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    if direct:
+        flags |= os.O_DIRECT
+    return os.open(path, flags)
+
+
+def device_size(path, fallback=None):
+    """Returns the size in bytes of a device or image, or ``fallback`` if it cannot be measured."""
+    try:
+        descriptor = _open_read_only(path, False)
+        try:
+            size = os.lseek(descriptor, 0, os.SEEK_END)
+        finally:
+            os.close(descriptor)
+        return size or fallback
+    except OSError:
+        return fallback
+
+
+class SurfaceScan:
+    """One read-only pass over ``path``; call run(), and stop() from another thread to interrupt it.
+
+    Args:
+        path (str): Device or image file, e.g. ``/dev/sdb`` or ``\\\\.\\PHYSICALDRIVE1``.
+        size (int): Bytes to scan.
+        chunk_size (int, optional): Bytes per read, a multiple of BLOCK_SIZE. Defaults to 4 MB.
+        workers (int, optional): Concurrent readers. Defaults to 4.
+        slow_ms (float, optional): Chunk reads slower than this are reported. Defaults to 500.
+        checkpoint (str, optional): Checkpoint file. Defaults to checkpoint_path(path).
+    """
+
+    def __init__(self, path, size, chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS, slow_ms=DEFAULT_SLOW_MS,
+                 checkpoint=None):
+        if chunk_size <= 0 or chunk_size % BLOCK_SIZE:
+            raise ValueError(f"Chunk size must be a positive multiple of {BLOCK_SIZE} bytes.")
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.slow_ms = slow_ms
+        self.checkpoint = checkpoint or checkpoint_path(path)
+        self.chunks = (size + chunk_size - 1) // chunk_size
+        self.resumed_from = 0
+        self.errors = []  # (offset, length, message)
+        self.slow_regions = []  # (offset, milliseconds)
+        self.bytes_read = 0
+        self.elapsed = 0.0  # Seconds spent by earlier, interrupted runs as well as this one
+        self._frontier = 0  # Every chunk below this one has been read
+        self._next = 0
+        self._done_above = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def position(self):
+        """Byte offset below which the scan is complete."""
+        return min(self._frontier * self.chunk_size, self.size)
+
+    @property
+    def complete(self):
+        return self._frontier >= self.chunks
+
+    def load_checkpoint(self):
+        """Resumes from the checkpoint file if it matches this device; returns True if it did."""
+        try:
+            with open(self.checkpoint) as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return False
+        if (state.get("path"), state.get("size"), state.get("chunk_size")) != (self.path, self.size, self.chunk_size):
+            return False
+        self._frontier = self._next = self.resumed_from = state["next_chunk"]
+        self.errors = [tuple(error) for error in state["errors"]]
+        self.slow_regions = [tuple(region) for region in state["slow_regions"]]
+        self.bytes_read = state["bytes_read"]
+        self.elapsed = state["elapsed"]
+        return True
+
+    def save_checkpoint(self):
+        """Writes the resumable state; the file is replaced atomically so an interruption cannot corrupt it."""
+        with self._lock:
+            # Chunks finished above the frontier are read again on resume, so only what lies below it is kept
+            position = self.position
+            state = {
+                "path": self.path, "size": self.size, "chunk_size": self.chunk_size, "next_chunk": self._frontier,
+                "errors": [error for error in self.errors if error[0] < position],
+                "slow_regions": [region for region in self.slow_regions if region[0] < position],
+                "bytes_read": position - sum(min(offset + length, position) - offset
+                                             for offset, length, _ in self.errors if offset < position),
+                "elapsed": self.elapsed, "saved": time.time(),
+            }
+        temporary = self.checkpoint + ".tmp"
+        with open(temporary, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temporary, self.checkpoint)
+
+    def remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint)
+        except FileNotFoundError:
+            pass
+
+    def stop(self):
+        self._stop.set()
+
+    def _take(self):
+        with self._lock:
+            if self._stop.is_set() or self._next >= self.chunks:
+                return None
+            self._next += 1
+            return self._next - 1
+
+    def _finish(self, chunk, readable, seconds, errors):
+        with self._lock:
+            self.bytes_read += readable
+            self.errors.extend(errors)
+            if seconds * 1000 > self.slow_ms:
+                self.slow_regions.append((chunk * self.chunk_size, round(seconds * 1000, 1)))
+            self._done_above.add(chunk)
+            while self._frontier in self._done_above:
+                self._done_above.remove(self._frontier)
+                self._frontier += 1
+
+    def _locate_errors(self, descriptor, buffer, offset, length):
+        """Re-reads a failed chunk block by block; returns merged ``(offset, length, message)`` ranges."""
+        errors = []
+        block = buffer[:BLOCK_SIZE]
+        for block_offset in range(offset, offset + length, BLOCK_SIZE):
+            try:
+                if read_at(descriptor, block, block_offset) == 0:
+                    raise OSError("unexpected end of device")
+                continue
+            except OSError as e:
+                message = e.strerror or str(e)
+            if errors and errors[-1][0] + errors[-1][1] == block_offset and errors[-1][2] == message:
+                errors[-1] = (errors[-1][0], errors[-1][1] + BLOCK_SIZE, message)
+            else:
+                errors.append((block_offset, BLOCK_SIZE, message))
+        return errors
+
+    def _reader(self, direct):
+        descriptor = _open_read_only(self.path, direct)
+        buffer = memoryview(mmap.mmap(-1, self.chunk_size))  # Page aligned, as O_DIRECT and raw devices need
+        try:
+            while True:
+                chunk = self._take()
+                if chunk is None:
+                    return
+                offset = chunk * self.chunk_size
+                length = min(self.chunk_size, self.size - offset)
+                # Whole blocks only: the tail of a device is read with the last block rounded up
+                request = buffer[:min(self.chunk_size, (length + BLOCK_SIZE - 1) // BLOCK_SIZE * BLOCK_SIZE)]
+                started = time.perf_counter()
+                errors = []
+                try:
+                    if read_at(descriptor, request, offset) < length:
+                        raise OSError("short read")
+                except OSError:
+                    errors = self._locate_errors(descriptor, buffer, offset, length)
+                # The last block's error range may run past the end of the chunk
+                unreadable = sum(min(error[0] + error[1], offset + length) - error[0] for error in errors)
+                self._finish(chunk, length - unreadable, time.perf_counter() - started, errors)
+        finally:
+            os.close(descriptor)
+
+    def run(self, on_progress=None, progress_interval=2.0):
+        """Reads the remaining chunks; returns True if the scan completed, False if it was stopped.
+
+        Args:
+            on_progress (callable, optional): Called with this scan every ``progress_interval`` seconds.
+            progress_interval (float, optional): Seconds between checkpoint saves and progress
+                reports. Defaults to 2.
+        """
+        self._stop.clear()
+        direct = False
+        if hasattr(os, "O_DIRECT"):
+            try:
+                os.close(_open_read_only(self.path, True))
+                direct = True
+            except OSError:
+                pass  # e.g. an image on tmpfs; reads then go through the page cache
+        os.close(_open_read_only(self.path, False))  # Surfaces a permission error before any reader starts
+        readers = [threading.Thread(target=self._reader, args=(direct,), name=f"diskman-surface-{number}", daemon=True)
+                   for number in range(max(1, min(self.workers, self.chunks)))]
+        started = last_progress = time.perf_counter()
+        elapsed_before = self.elapsed
+        for reader in readers:
+            reader.start()
+        try:
+            while True:
+                alive = [reader for reader in readers if reader.is_alive()]
+                if not alive:
+                    break
+                alive[0].join(progress_interval)
+                self.elapsed = elapsed_before + time.perf_counter() - started
+                if time.perf_counter() - last_progress >= progress_interval:
+                    last_progress = time.perf_counter()
+                    self.save_checkpoint()
+                    if on_progress:
+                        on_progress(self)
+        except KeyboardInterrupt:
+            self.stop()
+            for reader in readers:
+                reader.join()
+        self.elapsed = elapsed_before + time.perf_counter() - started
+        get_metrics().record("surface_scan", self.path, time.perf_counter() - started,
+                             size=self.position - self.resumed_from * self.chunk_size, action="surface_scan")
+        if self.complete:
+            self.remove_checkpoint()
+        else:
+            self.save_checkpoint()
+        return self.complete
+
+    def throughput(self):
+        """Average MB/s over the time spent scanning, across resumed runs."""
+        return self.bytes_read / MB / self.elapsed if self.elapsed else 0.0
+
+
+def _format_offset(offset):
+    return f"{offset:,} ({offset / 1024**3:.2f} GB)"
+
+
+def print_progress(scan):
+    done = min(scan.bytes_read, scan.size)
+    percent = done * 100 / scan.size if scan.size else 100.0
+    rate = scan.throughput()
+    remaining = (scan.size - done) / MB / rate if rate else 0
+    print(f"{percent:5.1f}%  {rate:8.1f} MB/s  ETA {int(remaining // 60)}m{int(remaining % 60):02d}s  "
+          f"errors: {len(scan.errors)}  slow regions: {len(scan.slow_regions)}")
+
+
+def print_report(scan):
+    """Prints throughput, read errors and slow regions by offset."""
+    state = "complete" if scan.complete else f"stopped at {_format_offset(scan.position)}"
+    print(f"\nSurface scan of {scan.path} {state}: {scan.bytes_read / 1024**3:.2f} GB read in "
+          f"{scan.elapsed:.0f}s, {scan.throughput():.1f} MB/s.")
+    if scan.errors:
+        print(f"{len(scan.errors)} unreadable region(s):")
+        for offset, length, message in sorted(scan.errors):
+            print(f"  offset {_format_offset(offset)}, {length} bytes: {message}")
+    else:
+        print("No read errors.")
+    if scan.slow_regions:
+        print(f"{len(scan.slow_regions)} slow chunk(s) (over {scan.slow_ms:g} ms for {scan.chunk_size // MB} MB):")
+        for offset, milliseconds in sorted(scan.slow_regions):
+            print(f"  offset {_format_offset(offset)}: {milliseconds} ms")
+    if not scan.complete:
+        print(f"Progress saved to {scan.checkpoint}; scan the disk again to resume.")
+
+
+def prompt_surface_scan(disk):
+    """Read-verifies the selected disk, offering to resume an interrupted scan of it.
+
+    Args:
+        disk (DiskRecord): Disk from list_and_select_disk; its DeviceID is the
+            device path (``\\\\.\\PHYSICALDRIVE1``, ``/dev/sdb`` or an image file).
+    """
+    size = device_size(disk.device_id, disk.size)
+    if not size:
+        print(f"Cannot determine the size of {disk.device_id}.")
+        return
+    scan = SurfaceScan(disk.device_id, size)
+    if scan.load_checkpoint() and not scan.complete:
+        answer = input(f"Resume the earlier scan from {scan.position * 100 / size:.1f}%? (y/n): ").strip().lower()
+        if answer != "y":
+            scan = SurfaceScan(disk.device_id, size)
+    print(f"Scanning {disk.device_id} ({size / 1024**3:.2f} GB) read-only with {scan.workers} readers "
+          f"(Ctrl+C to stop and save progress)...")
+    try:
+        scan.run(on_progress=print_progress)
+    except OSError as e:
+        print(f"Cannot read {disk.device_id}: {e}")
+        return
+    print_report(scan)
@@ -0,0 +1,21 @@
+# conftest.py
+"""Puts the repository root on sys.path and resets the process-wide state between tests."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation  # noqa: E402
+import inventory_cache  # noqa: E402
+import wmi_session  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_globals():
+    session, inventory = wmi_session._session, inventory_cache._inventory
+    instrumentation.get_metrics().reset()
+    yield
+    wmi_session._session, inventory_cache._inventory = session, inventory
+    instrumentation.get_metrics().reset()
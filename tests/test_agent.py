@@ -0,0 +1,133 @@
+# test_agent.py
+import http.client
+import json
+import threading
+
+import pytest
+
+import wmi_session
+from agent import InventoryAgent, make_server
+from fake_wmi import FakeWMI
+from instrumentation import get_metrics
+from inventory_cache import InventoryCache
+
+GB = 1024**3
+
+
+@pytest.fixture
+def fake():
+    fake = FakeWMI()
+    disk = fake.add_disk(size=100 * GB)
+    fake.add_logical_disk(fake.add_partition(disk, 50 * GB), "E:", volume_name="Data")
+    wmi_session.set_provider(fake.provider)
+    return fake
+
+
+@pytest.fixture
+def served(fake):
+    inventory = InventoryCache(ttl=600)
+    agent = InventoryAgent(inventory)
+    server = make_server(agent, ("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, agent, inventory
+    server.shutdown()
+    server.server_close()
+    agent.close()
+
+
+def _get(server, path, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.getheader("ETag"), response.read()
+    finally:
+        connection.close()
+
+
+def _volumes(body):
+    return [volume for disk in json.loads(body)["disks"] for partition in disk["partitions"]
+            for volume in partition["volumes"]]
+
+
+def test_inventory_is_served_with_an_etag(served):
+    server, agent, _ = served
+    status, etag, body = _get(server, "/inventory")
+
+    assert status == 200 and etag.startswith('"')
+    assert [volume["device_id"] for volume in _volumes(body)] == ["E:"]
+    assert _get(server, "/inventory", {"If-None-Match": etag}) == (304, etag, b"")
+    assert _get(server, "/inventory", {"If-None-Match": '"other", ' + etag})[0] == 304
+    assert _get(server, "/inventory", {"If-None-Match": '"other"'})[:2] == (200, etag)
+    assert agent.renders == 1
+
+
+def test_the_etag_changes_only_with_the_content(fake, served):
+    server, agent, inventory = served
+    _, etag, _ = _get(server, "/inventory")
+
+    inventory.invalidate()  # Reloaded, but nothing changed
+    assert _get(server, "/inventory", {"If-None-Match": etag})[0] == 304
+
+    fake.instances("Win32_LogicalDisk")[0].update(VolumeName="Backup")
+    inventory.invalidate([0])
+    status, new_etag, body = _get(server, "/inventory", {"If-None-Match": etag})
+    assert status == 200 and new_etag != etag
+    assert _volumes(body)[0]["volume_name"] == "Backup"
+    assert agent.renders == 3
+
+
+def test_concurrent_clients_cost_one_refresh_on_one_connection(fake, served):
+    server, agent, _ = served
+    fake.latency = 0.05
+    clients = 8
+    barrier = threading.Barrier(clients)
+    responses = []
+
+    def client():
+        barrier.wait()
+        responses.append(_get(server, "/inventory"))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses) == clients and len(set(responses)) == 1 and responses[0][0] == 200
+    assert agent.renders == 1
+    metrics = get_metrics()
+    assert metrics.calls("connect") == 1  # Every refresh ran on the agent's thread
+    assert metrics.calls("query") == 5    # One snapshot build
+
+
+def test_a_failed_refresh_is_a_server_error(served, monkeypatch):
+    server, _, inventory = served
+
+    def broken():
+        raise OSError("RPC server unavailable")
+
+    monkeypatch.setattr(inventory, "snapshot", broken)
+    status, _, body = _get(server, "/inventory")
+    assert (status, body) == (500, b"RPC server unavailable\n")
+
+    monkeypatch.undo()
+    assert _get(server, "/inventory")[0] == 200
+
+
+def test_other_endpoints(served):
+    server, _, _ = served
+    assert _get(server, "/healthz")[::2] == (200, b"ok\n")
+    assert _get(server, "/nowhere")[0] == 404
+    _get(server, "/inventory")
+    status, _, body = _get(server, "/metrics")
+    assert status == 200 and b'diskman_backend_calls_total{action="agent",kind="query"' in body
+
+
+def test_a_closed_agent_refuses_requests(fake):
+    agent = InventoryAgent(InventoryCache(ttl=600))
+    agent.document()
+    agent.close()
+    with pytest.raises(RuntimeError):
+        agent.document()
@@ -0,0 +1,99 @@
+# test_bulk_format.py
+import pytest
+
+import wmi_session
+from bulk_format import bulk_format, print_summary, select_volumes
+from fake_wmi import FakeWMI
+from inventory_cache import InventoryCache, set_inventory
+from jobs import DONE, FAILED
+
+GB = 1024**3
+
+
+@pytest.fixture
+def fake():
+    fake = FakeWMI()
+    disk0, disk1 = fake.add_disk(size=500 * GB), fake.add_disk(size=500 * GB)
+    fake.add_logical_disk(fake.add_partition(disk0, 100 * GB), "C:", volume_name="System")
+    fake.add_logical_disk(fake.add_partition(disk0, 10 * GB), "E:", volume_name="DATA1", file_system="")
+    fake.add_logical_disk(fake.add_partition(disk1, 20 * GB), "F:", volume_name="Data2", file_system="FAT32")
+    fake.add_logical_disk(fake.add_partition(disk1, 30 * GB), "G:", volume_name="BACKUP")
+    fake.add_logical_disk(fake.add_partition(disk1, 1 * GB), "H:", volume_name="DATA3", drive_type=2)
+    wmi_session.set_provider(fake.provider)
+    set_inventory(InventoryCache(ttl=600))
+    return fake
+
+
+def _letters(selected):
+    return [volume.device_id for _, volume in selected]
+
+
+@pytest.mark.parametrize("filters, letters", [
+    ({}, ["C:", "E:", "F:", "G:"]),
+    ({"drive_type": None}, ["C:", "E:", "F:", "G:", "H:"]),
+    ({"disk_indexes": [1]}, ["F:", "G:"]),
+    ({"disk_indexes": []}, []),
+    ({"label_pattern": "data*"}, ["E:", "F:"]),
+    ({"min_size_mb": 20 * 1024}, ["C:", "F:", "G:"]),
+    ({"max_size_mb": 20 * 1024}, ["E:", "F:"]),
+    ({"min_size_mb": 15 * 1024, "max_size_mb": 50 * 1024}, ["F:", "G:"]),
+    ({"file_systems": ["raw", "fat32"]}, ["E:", "F:"]),
+    ({"disk_indexes": [0, 1], "label_pattern": "*A*", "file_systems": ["NTFS"]}, ["G:"]),
+])
+def test_select_volumes_applies_every_filter(fake, filters, letters):
+    from inventory_cache import get_inventory
+
+    assert _letters(select_volumes(get_inventory().snapshot(), **filters)) == letters
+
+
+def _volume(fake, letter):
+    return next(volume for volume in fake.instances("Win32_LogicalDisk") if volume.DeviceID == letter)
+
+
+def test_bulk_format_fills_in_the_label_per_volume(fake, capsys):
+    from inventory_cache import get_inventory
+
+    selected = select_volumes(get_inventory().snapshot(), disk_indexes=[1])
+    jobs = bulk_format(selected, "NTFS", label="DATA{index}-{letter}", allocation_unit=4096, confirm=False)
+
+    assert [job.status for job in jobs] == [DONE, DONE]
+    assert _volume(fake, "F:").calls == [("Format", {"quick_format": True, "label": "DATA1-F", "size": 4096})]
+    assert _volume(fake, "G:").calls == [("Format", {"quick_format": True, "label": "DATA2-G", "size": 4096})]
+    assert "2 of 2 volumes formatted, 0 failed" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("label", ["DATA{0}", "DATA{name}", "DATA{index", "DATA{index:x>}{letter!z}"])
+def test_a_bad_label_fails_before_anything_is_formatted(fake, capsys, monkeypatch, label):
+    from inventory_cache import get_inventory
+
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("asked to confirm a bad label"))
+    selected = select_volumes(get_inventory().snapshot())
+
+    assert bulk_format(selected, "NTFS", label=label) == []
+    assert "Invalid label" in capsys.readouterr().out
+    assert all(not volume.calls for volume in fake.instances("Win32_LogicalDisk"))
+
+
+def test_bulk_format_can_be_cancelled(fake, monkeypatch):
+    from inventory_cache import get_inventory
+
+    monkeypatch.setattr("builtins.input", lambda prompt: "no")
+    assert bulk_format(select_volumes(get_inventory().snapshot()), "NTFS") == []
+    assert all(not volume.calls for volume in fake.instances("Win32_LogicalDisk"))
+
+
+class _Job:
+    def __init__(self, id, status, submitted, finished, error=None):
+        self.id, self.status, self.error = id, status, error
+        self.submitted, self.finished, self.elapsed = submitted, finished, finished - submitted
+        self.description = f"Format V{id}: as NTFS"
+
+
+def test_summary_counts_failures_and_the_overall_time(capsys):
+    print_summary([_Job(1, DONE, 10.0, 12.5), _Job(2, FAILED, 10.5, 11.0, error="Access denied"),
+                   _Job(3, DONE, 11.0, 14.0)])
+    out = capsys.readouterr().out
+
+    assert "2    failed         0.5  Format V2: as NTFS  Access denied" in out
+    assert "1    done           2.5  Format V1: as NTFS" in out
+    assert out.rstrip().endswith("2 of 3 volumes formatted, 1 failed, 4.0s in total.")
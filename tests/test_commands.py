@@ -0,0 +1,133 @@
+# test_commands.py
+import io
+import json
+
+import pytest
+
+import diskman
+import image_backend
+import jobs
+from commands import render, run_batch
+from disk_image import create_image
+from extent_map import MB
+from inventory_cache import RebuildingInventory, set_inventory
+
+ROWS = [
+    {"number": 0, "caption": "Disk 0", "size": 2 * 1024**3, "status": "OK", "extra": "ignored"},
+    {"number": 1, "caption": 'Say "hi", ok', "size": None, "status": None},
+]
+FIELDS = ("number", "caption", "size", "status")
+
+
+def _render(output, rows=ROWS):
+    stream = io.StringIO()
+    render(iter(rows), FIELDS, output, stream)
+    return stream.getvalue()
+
+
+def test_render_json():
+    assert json.loads(_render("json")) == [
+        {"number": 0, "caption": "Disk 0", "size": 2 * 1024**3, "status": "OK"},
+        {"number": 1, "caption": 'Say "hi", ok', "size": None, "status": None},
+    ]
+    assert _render("json", []) == "[]\n"
+
+
+def test_render_jsonl():
+    lines = _render("jsonl").splitlines()
+    assert [json.loads(line)["number"] for line in lines] == [0, 1]
+    assert "extra" not in json.loads(lines[0])
+    assert _render("jsonl", []) == ""
+
+
+def test_render_csv():
+    assert _render("csv") == ('number,caption,size,status\n'
+                              '0,Disk 0,2147483648,OK\n'
+                              '1,"Say ""hi"", ok",,\n')
+
+
+def test_render_table():
+    lines = _render("table").splitlines()
+    assert lines[0].split() == list(FIELDS)
+    assert set(lines[1].replace(" ", "")) == {"-"}
+    assert lines[2].split() == ["0", "Disk", "0", "2.00", "GB", "OK"]
+    assert lines[3].split() == ["1", "Say", '"hi",', "ok", "Unknown"]
+    # Fixed widths: the columns line up without measuring the rows first
+    assert lines[2].index("2.00 GB") == lines[3].index("Unknown") == lines[0].index("size")
+
+
+@pytest.fixture
+def image_disk(tmp_path, monkeypatch):
+    path = str(tmp_path / "disk.img")
+    create_image(path, 64 * MB)
+    monkeypatch.setattr(image_backend, "IMAGES", [path])
+    monkeypatch.setattr(jobs, "_engine", jobs.JobEngine())
+    set_inventory(RebuildingInventory(image_backend.build_image_snapshot))
+    yield path
+    jobs._engine.shutdown()
+
+
+def _batch(tmp_path, capsys, lines, *options):
+    batch_file = tmp_path / "steps.txt"
+    batch_file.write_text("\n".join(lines) + "\n")
+    parser = diskman.build_parser()
+    args = parser.parse_args(["batch", str(batch_file), "--output", "jsonl", *options])
+    ok = run_batch(args, parser, lambda: image_backend)
+    out, err = capsys.readouterr()
+    return ok, [json.loads(line) for line in out.splitlines()], err
+
+
+STEPS = [
+    "# Provision the image",
+    "create-partition --disk 0 --size 10",
+    "create-partition --disk 0 --size 1000  # Too large",
+    "create-partition --disk 0 --size 20",
+    "list-disks",
+]
+
+
+def test_a_batch_stops_at_the_first_failure(image_disk, tmp_path, capsys):
+    ok, steps, err = _batch(tmp_path, capsys, STEPS)
+
+    assert not ok
+    assert [(step["line"], step["ok"]) for step in steps] == [(2, True), (3, False)]
+    assert "No unallocated extent" in steps[1]["rows"][0]["detail"]
+    assert "Stopping at line 3" in err
+
+
+def test_keep_going_runs_every_step(image_disk, tmp_path, capsys):
+    ok, steps, _ = _batch(tmp_path, capsys, STEPS, "--keep-going")
+
+    assert not ok
+    assert [(step["line"], step["ok"]) for step in steps] == [(2, True), (3, False), (4, True), (5, True)]
+    # The listing sees what the earlier steps wrote to the image
+    assert steps[3]["rows"][0]["partitions"] == 2
+
+
+def test_a_batch_of_successful_steps_succeeds(image_disk, tmp_path, capsys):
+    ok, steps, _ = _batch(tmp_path, capsys, ["create-partition --disk 0 --size 10", "list-volumes --disk 0"])
+
+    assert ok
+    assert [row["partition_size"] for row in steps[1]["rows"]] == [10 * MB]
+
+
+@pytest.mark.parametrize("line", ["--backend wmi list-disks", "--image other.img list-disks", "--help"])
+def test_top_level_options_are_rejected(image_disk, tmp_path, capsys, line):
+    ok, steps, _ = _batch(tmp_path, capsys, [line, "list-disks"], "--keep-going")
+
+    assert not ok
+    assert steps[0]["ok"] is False and "top-level options" in steps[0]["rows"][0]["detail"]
+    assert steps[1]["ok"] is True
+
+
+@pytest.mark.parametrize("line, usage", [
+    ("list-disks --help", True), ("list-disks --bogus", True), ("no-such-command", True),
+    ("batch other.txt", False),  # Parses, but batches do not nest
+])
+def test_argparse_output_stays_off_stdout(image_disk, tmp_path, capsys, line, usage):
+    ok, steps, err = _batch(tmp_path, capsys, [line])
+
+    assert not ok
+    assert steps == [{"line": 1, "step": line, "ok": False,
+                      "rows": [{"command": line, "ok": False, "detail": "not a subcommand"}]}]
+    assert ("usage:" in err) == usage
@@ -0,0 +1,54 @@
+# test_dir_usage.py
+import os
+import threading
+
+import dir_usage
+from dir_usage import DirectoryUsageCache, scan
+
+
+def _tree(root):
+    for directory in ("a/b", "a/c", "d"):
+        os.makedirs(os.path.join(root, directory))
+    for name, size in (("a/b/one", 8192), ("a/c/two", 4096), ("d/three", 4096), ("top", 4096)):
+        with open(os.path.join(root, name), "wb") as data_file:
+            data_file.write(b"x" * size)
+
+
+def _scan_with_timeout(root, **options):
+    outcome = {}
+    worker = threading.Thread(target=lambda: outcome.update(result=scan(root, **options)), daemon=True)
+    worker.start()
+    worker.join(10)
+    assert not worker.is_alive(), "scan() did not finish"
+    return outcome["result"]
+
+
+def test_totals_include_every_subdirectory(tmp_path):
+    _tree(str(tmp_path))
+    result = _scan_with_timeout(str(tmp_path), workers=4, cache=DirectoryUsageCache(path=None))
+
+    assert result.directories == 5 and result.files == 4
+    totals = {os.path.relpath(path, tmp_path): size for path, size in result.totals.items()}
+    assert totals["a"] == totals[os.path.join("a", "b")] + totals[os.path.join("a", "c")]
+    names = ("a/b/one", "a/c/two", "d/three", "top")
+    allocated = [os.stat(os.path.join(tmp_path, name)).st_blocks * 512 for name in names]
+    assert totals["."] == sum(allocated)
+    assert totals["d"] == allocated[2]
+    assert [os.path.relpath(path, tmp_path) for _, path in result.top(1)] == ["a"]
+
+
+def test_an_unexpected_error_in_a_directory_does_not_hang_the_scan(tmp_path, monkeypatch):
+    _tree(str(tmp_path))
+    broken = os.path.join(str(tmp_path), "a")
+    list_directory = dir_usage._list_directory
+
+    def failing(path, root_device, cache):
+        if path == broken:
+            raise ValueError("unexpected entry")
+        return list_directory(path, root_device, cache)
+
+    monkeypatch.setattr(dir_usage, "_list_directory", failing)
+    result = _scan_with_timeout(str(tmp_path), workers=4, cache=DirectoryUsageCache(path=None))
+
+    assert [(path, str(error)) for path, error in result.errors] == [(broken, "unexpected entry")]
+    assert result.directories == 3  # The root, d and the failed a; nothing below a is listed
@@ -0,0 +1,193 @@
+# test_disk_image.py
+import os
+import struct
+import zlib
+
+import pytest
+
+import image_backend
+from disk_image import (BASIC_DATA, GPT_ENTRY, GPT_ENTRY_COUNT, GPT_HEADER, LINUX_FILESYSTEM, MBR_NTFS,
+                        SECTOR_SIZE, DiskImage, create_image)
+from extent_map import MB
+from inventory_cache import RebuildingInventory, get_inventory, set_inventory
+
+ARRAY_SECTORS = GPT_ENTRY_COUNT * GPT_ENTRY.size // SECTOR_SIZE
+
+
+@pytest.fixture
+def gpt_image(tmp_path):
+    path = str(tmp_path / "disk.img")
+    create_image(path, 64 * MB)
+    return path
+
+
+def _read(image_file, lba, sectors=1):
+    image_file.seek(lba * SECTOR_SIZE)
+    return image_file.read(sectors * SECTOR_SIZE)
+
+
+def _check_gpt(path):
+    """Checks both GPT headers and entry arrays independently of DiskImage; returns the entry array."""
+    last_lba = os.path.getsize(path) // SECTOR_SIZE - 1
+    arrays = []
+    with open(path, "rb") as image_file:
+        for current_lba, other_lba, entries_lba in ((1, last_lba, 2), (last_lba, 1, last_lba - ARRAY_SECTORS)):
+            header = bytearray(_read(image_file, current_lba)[:GPT_HEADER.size])
+            fields = GPT_HEADER.unpack(header)
+            assert fields[0] == b"EFI PART"
+            assert (fields[5], fields[6], fields[10]) == (current_lba, other_lba, entries_lba)
+            assert (fields[7], fields[8]) == (2 + ARRAY_SECTORS, last_lba - ARRAY_SECTORS - 1)
+            header[16:20] = bytes(4)
+            assert zlib.crc32(header) == fields[3]
+            array = _read(image_file, entries_lba, ARRAY_SECTORS)
+            assert zlib.crc32(array) == fields[13]
+            arrays.append(array)
+    assert arrays[0] == arrays[1]
+    return arrays[0]
+
+
+def test_create_image_writes_an_empty_gpt(gpt_image):
+    assert os.path.getsize(gpt_image) == 64 * MB
+    assert _check_gpt(gpt_image) == bytes(ARRAY_SECTORS * SECTOR_SIZE)
+    with DiskImage(gpt_image) as image:
+        assert image.scheme == "gpt"
+        assert image.partitions() == []
+        assert image.extent_map().largest_free_extent() == (MB, 62 * MB)
+
+
+def test_create_image_writes_an_empty_mbr(tmp_path):
+    path = str(tmp_path / "disk.img")
+    create_image(path, 64 * MB + 1000, scheme="mbr")
+
+    assert os.path.getsize(path) == 64 * MB  # Rounded down to whole MiB
+    with DiskImage(path) as image:
+        assert image.scheme == "mbr"
+        assert image.partitions() == []
+        assert image.extent_map().largest_free_extent() == (MB, 63 * MB)
+
+
+def test_create_image_rejects_unknown_schemes(tmp_path):
+    with pytest.raises(ValueError):
+        create_image(str(tmp_path / "disk.img"), 64 * MB, scheme="apm")
+
+
+def test_gpt_edits_keep_both_copies_in_step(gpt_image):
+    with DiskImage(gpt_image, writable=True) as image:
+        first = image.create_partition(10 * MB, name="data")
+        second = image.create_partition(20 * MB, type=LINUX_FILESYSTEM)
+    _check_gpt(gpt_image)
+
+    with DiskImage(gpt_image) as image:
+        partitions = image.partitions()
+    assert [(p.number, p.start, p.size, p.type, p.name) for p in partitions] == [
+        (1, MB, 10 * MB, BASIC_DATA, "data"), (2, 11 * MB, 20 * MB, LINUX_FILESYSTEM, "")]
+    assert [p.guid for p in partitions] == [first.guid, second.guid]
+
+    with DiskImage(gpt_image, writable=True) as image:
+        image.delete_partition(1)
+        with pytest.raises(ValueError):
+            image.delete_partition(1)
+        # The freed 10 MiB is the smallest gap that fits, and its slot is reused
+        third = image.create_partition(5 * MB)
+    _check_gpt(gpt_image)
+    assert (third.number, third.start) == (1, MB)
+
+
+def test_a_corrupt_primary_header_falls_back_to_the_backup(gpt_image):
+    with DiskImage(gpt_image, writable=True) as image:
+        image.create_partition(10 * MB, name="data")
+    with open(gpt_image, "r+b") as image_file:
+        image_file.seek(SECTOR_SIZE + 24)
+        image_file.write(b"\xff")  # Breaks the primary header's CRC
+
+    with DiskImage(gpt_image, writable=True) as image:
+        assert [(p.number, p.size, p.name) for p in image.partitions()] == [(1, 10 * MB, "data")]
+        image.create_partition(MB)
+    # The next edit rewrites the primary from the backup
+    assert struct.unpack_from("<2Q", _check_gpt(gpt_image), 32) == (2048, 22527)
+
+
+def test_both_headers_corrupt_is_an_error_and_releases_the_file(gpt_image):
+    with open(gpt_image, "r+b") as image_file:
+        for lba in (1, 64 * MB // SECTOR_SIZE - 1):
+            image_file.seek(lba * SECTOR_SIZE)
+            image_file.write(b"XXXXXXXX")
+    fds = "/proc/self/fd"
+    before = len(os.listdir(fds)) if os.path.isdir(fds) else None
+
+    # The traceback keeps the half-built DiskImage alive, so only an explicit close frees its handles
+    with pytest.raises(ValueError, match="both GPT headers") as error:
+        DiskImage(gpt_image, writable=True)
+    assert error.traceback
+    if before is not None:
+        assert len(os.listdir(fds)) == before
+
+
+def test_an_empty_file_releases_its_handle(tmp_path):
+    path = tmp_path / "empty.img"
+    path.write_bytes(b"")
+    fds = "/proc/self/fd"
+    before = len(os.listdir(fds)) if os.path.isdir(fds) else None
+
+    with pytest.raises(ValueError) as error:
+        DiskImage(str(path))
+    assert error.traceback
+    if before is not None:
+        assert len(os.listdir(fds)) == before
+
+
+def test_mbr_has_four_primary_slots(tmp_path):
+    path = str(tmp_path / "disk.img")
+    create_image(path, 64 * MB, scheme="mbr")
+
+    with DiskImage(path, writable=True) as image:
+        numbers = [image.create_partition(10 * MB).number for _ in range(4)]
+        with pytest.raises(ValueError, match="primary partition slots"):
+            image.create_partition(10 * MB)
+        image.delete_partition(2)
+        assert image.create_partition(MB).number == 2
+
+    with DiskImage(path) as image:
+        assert [(p.number, p.start, p.type) for p in image.partitions()] == [
+            (1, MB, MBR_NTFS), (2, 11 * MB, MBR_NTFS), (3, 21 * MB, MBR_NTFS), (4, 31 * MB, MBR_NTFS)]
+    assert numbers == [1, 2, 3, 4]
+
+
+def test_a_partition_larger_than_any_gap_is_refused(gpt_image):
+    with DiskImage(gpt_image, writable=True) as image:
+        with pytest.raises(ValueError, match="No unallocated extent"):
+            image.create_partition(63 * MB)
+    _check_gpt(gpt_image)
+
+
+@pytest.fixture
+def image_inventory(gpt_image, monkeypatch):
+    monkeypatch.setattr(image_backend, "IMAGES", [gpt_image])
+    set_inventory(RebuildingInventory(image_backend.build_image_snapshot))
+    return gpt_image
+
+
+def _partition_sizes():
+    snapshot = get_inventory().snapshot()
+    return [partition.size for partition in snapshot.partitions(snapshot.disks[0].device_id)]
+
+
+def test_the_image_backend_refreshes_the_inventory_after_each_edit(image_inventory):
+    assert _partition_sizes() == []
+
+    assert image_backend.create_partition(0, 10)
+    assert image_backend.create_partition(0, 20)
+    assert _partition_sizes() == [10 * MB, 20 * MB]
+
+    assert image_backend.delete_partition(0, 1)
+    assert _partition_sizes() == [20 * MB]
+    _check_gpt(image_inventory)
+
+
+def test_the_image_backend_reports_a_full_image_as_os_error(image_inventory):
+    with pytest.raises(OSError):
+        image_backend.create_partition(0, 100)
+    with pytest.raises(ValueError):
+        image_backend.delete_partition(0, 1)
+    with pytest.raises(ValueError):
+        image_backend.create_partition(1, 10)
@@ -0,0 +1,96 @@
+# test_diskpart_script.py
+import os
+import stat
+import sys
+
+import pytest
+
+import fake_diskpart
+from diskpart_script import DiskpartScript, split_output
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def diskpart(tmp_path, monkeypatch):
+    """Points DISKMAN_DISKPART at the stand-in and returns the file it logs scripts to."""
+    if os.name == "nt":
+        wrapper = tmp_path / "diskpart.cmd"
+        wrapper.write_text(f'@"{sys.executable}" "{os.path.join(ROOT, "fake_diskpart.py")}" %*\n')
+    else:
+        wrapper = tmp_path / "diskpart"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(ROOT, "fake_diskpart.py")}" "$@"\n')
+        wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR)
+    log = tmp_path / "scripts.log"
+    monkeypatch.setenv("DISKMAN_DISKPART", str(wrapper))
+    monkeypatch.setenv("FAKE_DISKPART_LOG", str(log))
+    for name in ("FAKE_DISKPART_FAIL", "FAKE_DISKPART_STOP_AFTER", "FAKE_DISKPART_EXIT"):
+        monkeypatch.delenv(name, raising=False)
+    return log
+
+
+def _provision():
+    return DiskpartScript().select_disk(1).create_partition(1024).format("NTFS", label="Data").assign("E")
+
+
+def test_success_runs_every_operation_in_one_process(diskpart):
+    results = _provision().run()
+
+    assert [(result.ok, result.ran) for result in results] == [(True, True)] * 4
+    assert results[0].output == "Disk 1 is now the selected disk."
+    assert results[2].output.startswith("  100 percent completed")
+    assert results[3].output == "DiskPart successfully assigned the drive letter or mount point."
+    assert diskpart.read_text() == ("select disk 1\ncreate partition primary size=1024\n"
+                                    'format fs=NTFS label="Data" quick\nassign letter=E\n--\n')
+
+
+def test_failure_partway_skips_the_later_operations(diskpart, monkeypatch):
+    monkeypatch.setenv("FAKE_DISKPART_FAIL", "create partition")
+    results = _provision().run()
+
+    assert [(result.ok, result.ran) for result in results] == [(True, True), (False, True), (False, False),
+                                                               (False, False)]
+    assert results[1].output.startswith("Virtual Disk Service error:")
+    assert results[2].output == ""
+
+
+def test_non_zero_exit_without_an_error_message_fails_the_rest(diskpart, monkeypatch):
+    monkeypatch.setenv("FAKE_DISKPART_STOP_AFTER", "2")
+    monkeypatch.setenv("FAKE_DISKPART_EXIT", "5")
+    results = _provision().run()
+
+    assert [(result.ok, result.ran) for result in results] == [(True, True), (True, True), (False, False),
+                                                               (False, False)]
+    assert "diskpart exited with status 5" in results[2].output
+
+
+def test_non_zero_exit_after_every_answer_fails_the_last_operation():
+    output = fake_diskpart.BANNER + "\nDisk 1 is now the selected disk.\n\nThe volume is not ready.\n"
+    results = split_output(["select disk 1", "extend"], output, returncode=2147942405)
+
+    assert [(result.ok, result.ran) for result in results] == [(True, True), (False, True)]
+    assert results[1].output == "The volume is not ready.\n\ndiskpart exited with status 2147942405"
+
+
+@pytest.mark.parametrize("command, message", [
+    ("list volume", fake_diskpart.LIST_VOLUME),  # "No Media"
+    ("select volume 4", "There is no volume selected."),
+    ("list disk", "No Fixed Disks to show."),
+    ("shrink", "DiskPart successfully shrunk the volume by:  100 MB"),
+])
+def test_ordinary_messages_are_not_errors(command, message):
+    [result] = split_output([command], f"{fake_diskpart.BANNER}\n{message}\n\nLeaving DiskPart...\n")
+    assert result.ok and result.ran
+    assert result.output == message
+
+
+@pytest.mark.parametrize("message", [
+    "DiskPart has encountered an error: Access is denied.\nSee the System Event Log for more information.",
+    "Virtual Disk Service error:\nThe specified disk is not convertible.",
+    "DiskPart failed to extend the volume.",
+])
+def test_error_messages_fail_the_operation(message):
+    results = split_output(["select disk 1", "extend", "assign"], f"Disk 1 is now the selected disk.\n\n{message}\n")
+
+    assert [(result.ok, result.ran) for result in results] == [(True, True), (False, True), (False, False)]
+    assert results[1].output == message
@@ -0,0 +1,137 @@
+# test_extent_map.py
+import pytest
+
+from extent_map import MB, ExtentMap
+
+GB = 1024**3
+
+
+def test_empty_disk_is_one_gap_between_the_reserved_ends():
+    extents = ExtentMap(10 * GB)
+
+    assert (extents.first_usable, extents.last_usable) == (MB, 10 * GB - MB)
+    assert extents.largest_free_extent() == (MB, 10 * GB - 2 * MB)
+    assert extents.find_placement(10 * GB - 2 * MB) == MB
+    assert extents.find_placement(10 * GB - 2 * MB + 1) is None
+
+
+def test_reserved_bounds_can_be_set():
+    extents = ExtentMap(100 * MB, reserved_start=0, reserved_end=0)
+    assert extents.largest_free_extent() == (0, 100 * MB)
+
+    extents = ExtentMap(100 * MB, reserved_start=34 * 512, reserved_end=33 * 512)
+    # The gap is rounded in to whole alignment units at both ends
+    assert extents.largest_free_extent() == (MB, 98 * MB)
+
+
+def test_gaps_between_partitions():
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", 3 * GB, GB), ("c", 6 * GB, 2 * GB)])
+
+    # Gaps: 1 GiB+1 MiB .. 3 GiB, 4 GiB .. 6 GiB and 8 GiB .. the last usable MiB
+    assert extents.largest_free_extent() == (4 * GB, 2 * GB)
+    assert extents.find_placement(2 * GB - MB) == GB + MB   # The smallest gap that fits
+    assert extents.find_placement(2 * GB - MB + 1) == 4 * GB
+    assert extents.find_placement(2 * GB) == 4 * GB
+    assert extents.find_placement(2 * GB + 1) is None
+
+
+def test_full_disk_has_no_free_extent():
+    extents = ExtentMap(GB, [("a", MB, GB - 2 * MB)])
+
+    assert extents.largest_free_extent() is None
+    assert extents.find_placement(1) is None
+    assert extents.growth_room("a") == 0
+    assert not extents.can_grow("a", 1)
+
+
+def test_unaligned_gaps_are_rounded_to_whole_units():
+    # Partitions ending or starting half a MiB off a boundary leave gaps rounded in to whole MiB
+    extents = ExtentMap(90 * MB, [("a", MB, 10 * MB + MB // 2), ("b", 50 * MB + MB // 2, 10 * MB)])
+
+    assert extents.find_placement(38 * MB) == 12 * MB
+    assert extents.find_placement(38 * MB + 1) is None
+    assert extents.largest_free_extent() == (12 * MB, 38 * MB)
+    # After "b" (ending at 60.5 MiB) the gap runs from 61 MiB to the last usable MiB
+    extents.add_partition("c", 12 * MB, 38 * MB)
+    assert extents.largest_free_extent() == (61 * MB, 28 * MB)
+
+
+def test_a_gap_smaller_than_the_alignment_is_unusable():
+    extents = ExtentMap(100 * MB, [("a", MB, 10 * MB), ("b", 11 * MB + MB // 2, 88 * MB - MB // 2)])
+    assert extents.largest_free_extent() is None
+
+
+def test_growth_room_is_the_gap_right_after_the_partition():
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", 3 * GB, GB)])
+
+    assert extents.growth_room("a") == 3 * GB - (GB + MB)
+    assert extents.can_grow("a", 3 * GB - (GB + MB))
+    assert not extents.can_grow("a", 3 * GB - (GB + MB) + 1)
+    # The last partition grows up to the last usable byte, not the end of the disk
+    assert extents.growth_room("b") == 10 * GB - MB - 4 * GB
+    assert not extents.can_grow("b", 10 * GB - 4 * GB)
+
+
+def test_growth_room_stops_at_an_aligned_end():
+    extents = ExtentMap(100 * MB, [("a", MB, 10 * MB), ("b", 20 * MB + MB // 2, 10 * MB)])
+    assert extents.growth_room("a") == 9 * MB
+
+
+def test_adjacent_partitions_cannot_grow():
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", GB + MB, GB)])
+    assert extents.growth_room("a") == 0
+
+
+def test_add_partition_splits_the_gap():
+    extents = ExtentMap(10 * GB, [("a", MB, GB)])
+    start = extents.find_placement(2 * GB)
+    extents.add_partition("b", start, 2 * GB)
+
+    assert start == GB + MB
+    assert extents.growth_room("a") == 0
+    assert extents.largest_free_extent() == (3 * GB + MB, 10 * GB - MB - (3 * GB + MB))
+    extents.add_partition("c", 5 * GB, GB)
+    assert extents.growth_room("b") == 5 * GB - (3 * GB + MB)
+    assert extents.find_placement(5 * GB - (3 * GB + MB)) == 3 * GB + MB
+
+
+@pytest.mark.parametrize("start, size", [
+    (GB, MB),              # Overlaps the end of "a"
+    (MB // 2, MB),         # In the reserved start
+    (5 * GB, 5 * GB),      # Runs into the reserved end
+    (4 * GB - MB, 2 * MB),  # Overlaps the start of "b"
+])
+def test_add_partition_rejects_overlaps(start, size):
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", 4 * GB, GB)])
+    with pytest.raises(ValueError):
+        extents.add_partition("new", start, size)
+
+
+def test_add_partition_can_fill_a_gap_exactly():
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", 4 * GB, GB)])
+    extents.add_partition("c", GB + MB, 4 * GB - (GB + MB))
+
+    assert extents.growth_room("a") == 0 and extents.growth_room("c") == 0
+    assert extents.largest_free_extent() == (5 * GB, 5 * GB - MB)
+
+
+def test_remove_partition_merges_the_neighbouring_gaps():
+    extents = ExtentMap(10 * GB, [("a", MB, GB), ("b", 3 * GB, GB), ("c", 6 * GB, GB)])
+    extents.remove_partition("b")
+
+    assert extents.growth_room("a") == 6 * GB - (GB + MB)
+    assert extents.largest_free_extent() == (GB + MB, 6 * GB - (GB + MB))
+
+    extents.remove_partition("c")
+    extents.remove_partition("a")
+    assert extents.largest_free_extent() == ExtentMap(10 * GB).largest_free_extent()
+
+
+def test_remove_then_add_round_trips():
+    partitions = [("a", MB, GB), ("b", GB + MB, GB), ("c", 2 * GB + MB, GB)]
+    extents = ExtentMap(4 * GB, partitions)
+    extents.remove_partition("b")
+    extents.add_partition("b", GB + MB, GB)
+
+    assert extents.largest_free_extent() == ExtentMap(4 * GB, partitions).largest_free_extent()
+    assert extents.growth_room("a") == extents.growth_room("b") == 0
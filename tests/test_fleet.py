@@ -0,0 +1,88 @@
+# test_fleet.py
+import time
+
+import pytest
+
+from fake_wmi import generate_topology
+from fleet import collect_inventory
+from wmi_session import WMISession
+
+
+def _simulated_hosts(latencies, failures=None):
+    """Returns a ``connect`` for hosts whose five queries each take ``latencies[host]`` seconds.
+
+    ``failures[host]`` attempts fail with a connection error before the host answers.
+    """
+    fakes = {host: generate_topology(disks=host_number + 1, latency=latency)
+             for host_number, (host, latency) in enumerate(latencies.items())}
+    failures = dict(failures or {})
+    connects = []
+
+    def connect(host):
+        connects.append(host)
+        if failures.get(host):
+            failures[host] -= 1
+            raise OSError(f"{host}: The RPC server is unavailable")
+        return WMISession(fakes[host].provider)
+
+    connect.calls = connects
+    return connect
+
+
+def test_results_arrive_in_completion_order():
+    connect = _simulated_hosts({"slow": 0.04, "medium": 0.01, "fast": 0.0})
+    results = list(collect_inventory(["slow", "medium", "fast"], connect=connect, max_workers=3, timeout=5))
+
+    assert [result.host for result in results] == ["fast", "medium", "slow"]
+    assert all(result.ok and result.attempts == 1 for result in results)
+    assert [len(result.snapshot.disks) for result in results] == [3, 2, 1]
+
+
+def test_a_slow_host_does_not_hold_up_the_others():
+    connect = _simulated_hosts({"hung": 0.2, "a": 0.0, "b": 0.0})
+    results = collect_inventory(["hung", "a", "b"], connect=connect, max_workers=3, timeout=0.3, retries=0)
+
+    assert {next(results).host, next(results).host} == {"a", "b"}
+    hung = next(results)
+    assert hung.host == "hung" and not hung.ok
+    assert isinstance(hung.error, TimeoutError)
+    assert hung.attempts == 1
+    assert 0.3 <= hung.elapsed < 1.0
+
+
+def test_a_timed_out_host_is_retried():
+    connect = _simulated_hosts({"hung": 0.1, "ok": 0.0})
+    results = {result.host: result for result in
+               collect_inventory(["hung", "ok"], connect=connect, timeout=0.2, retries=2)}
+
+    assert isinstance(results["hung"].error, TimeoutError)
+    assert results["hung"].attempts == 3
+    assert connect.calls.count("hung") == 3
+    assert results["ok"].ok and results["ok"].attempts == 1
+
+
+@pytest.mark.parametrize("retries, ok, attempts", [(0, False, 1), (1, True, 2), (3, True, 2)])
+def test_a_failing_host_is_retried_until_it_answers(retries, ok, attempts):
+    connect = _simulated_hosts({"flaky": 0.0}, failures={"flaky": 1})
+    [result] = collect_inventory(["flaky"], connect=connect, retries=retries)
+
+    assert result.ok is ok
+    assert result.attempts == attempts
+    assert connect.calls == ["flaky"] * attempts
+    if ok:
+        assert len(result.snapshot.disks) == 1
+    else:
+        assert "RPC server is unavailable" in str(result.error)
+
+
+def test_queued_hosts_give_up_when_hung_hosts_hold_every_worker():
+    connect = _simulated_hosts({"hung": 0.2, "queued": 0.0})
+    started = time.monotonic()
+    results = {result.host: result for result in collect_inventory(
+        ["hung", "queued"], connect=connect, max_workers=1, timeout=0.2, retries=0, total_timeout=0.5)}
+
+    assert time.monotonic() - started < 0.9  # The hung host's thread is busy for a second
+    assert isinstance(results["hung"].error, TimeoutError)
+    assert isinstance(results["queued"].error, TimeoutError)
+    assert "Not started" in str(results["queued"].error)
+    assert "queued" not in connect.calls
@@ -0,0 +1,91 @@
+# test_instrumentation.py
+import json
+
+from fake_wmi import FakeWMI
+from instrumentation import BUCKETS, InstrumentedObject, Metrics, connect
+
+
+def _histogram(metrics):
+    return metrics.to_dict()[0]["histogram"]
+
+
+def test_each_call_lands_in_the_first_bucket_that_holds_it():
+    metrics = Metrics()
+    for seconds in (0.0, 0.001, 0.0011, 0.05, 0.3, 10.0, 60.0):
+        metrics.record("query", "Win32_DiskDrive", seconds, action="list_disks")
+
+    histogram = _histogram(metrics)
+    assert list(histogram) == ["0.001", "0.005", "0.01", "0.05", "0.1", "0.5", "1.0", "5.0", "10.0", "+Inf"]
+    assert list(histogram.values()) == [2, 1, 0, 1, 0, 1, 0, 0, 1, 1]
+    assert sum(histogram.values()) == metrics.calls() == 7
+    assert len(histogram) == len(BUCKETS)
+
+
+def test_series_are_kept_per_action_kind_and_name():
+    metrics = Metrics()
+    metrics.set_action("list_volumes")
+    metrics.record("query", "Win32_DiskPartition", 0.01, rows=4)
+    metrics.record("query", "Win32_DiskPartition", 0.02, rows=2)
+    metrics.record("associators", "Win32_LogicalDiskToPartition", 0.001, rows=1)
+    metrics.record("subprocess", "diskpart /s", 0.5, size=120, action="format")
+
+    assert metrics.calls() == 4 and metrics.calls("query") == 2
+    series = {(s["action"], s["kind"], s["name"]): s for s in metrics.to_dict()}
+    assert series["list_volumes", "query", "Win32_DiskPartition"]["rows"] == 6
+    assert series["list_volumes", "query", "Win32_DiskPartition"]["seconds"] == 0.03
+    assert series["format", "subprocess", "diskpart /s"]["bytes"] == 120
+    metrics.reset()
+    assert metrics.calls() == 0 and metrics.to_dict() == []
+
+
+def test_export_json(tmp_path):
+    metrics = Metrics()
+    metrics.record("query", "Win32_DiskDrive", 0.002, rows=3, action="list_disks")
+    metrics.export_json(tmp_path / "metrics.json")
+
+    document = json.loads((tmp_path / "metrics.json").read_text())
+    assert isinstance(document["generated"], float)
+    assert document["series"] == [{
+        "action": "list_disks", "kind": "query", "name": "Win32_DiskDrive", "count": 1, "seconds": 0.002,
+        "rows": 3, "bytes": 0, "histogram": dict(zip(_histogram(metrics), [0, 1, 0, 0, 0, 0, 0, 0, 0, 0])),
+    }]
+
+
+def test_prometheus_text_has_cumulative_buckets_and_escaped_labels(tmp_path):
+    metrics = Metrics()
+    metrics.record("query", "Win32_DiskDrive", 0.002, rows=3, action="list_disks")
+    metrics.record("query", "Win32_DiskDrive", 0.2, rows=3, action="list_disks")
+    metrics.record("subprocess", 'diskpart "C:\\x"', 0.02, size=10, action="format")
+    metrics.export_prometheus(tmp_path / "metrics.prom")
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+
+    disks = '{action="list_disks",kind="query",name="Win32_DiskDrive"'
+    assert "# TYPE diskman_backend_calls_total counter" in lines
+    assert "# TYPE diskman_backend_call_seconds histogram" in lines
+    assert f"diskman_backend_calls_total{disks}}} 2" in lines
+    assert f"diskman_backend_rows_total{disks}}} 6" in lines
+    assert [line.rsplit(" ", 1)[1] for line in lines if line.startswith("diskman_backend_call_seconds_bucket" + disks)
+            ] == ["0", "1", "1", "1", "1", "2", "2", "2", "2", "2"]
+    assert f'diskman_backend_call_seconds_bucket{disks},le="+Inf"}} 2' in lines
+    assert f"diskman_backend_call_seconds_sum{disks}}} 0.202" in lines
+    assert f"diskman_backend_call_seconds_count{disks}}} 2" in lines
+    assert ('diskman_backend_bytes_total{action="format",kind="subprocess",name="diskpart \\"C:\\\\x\\""} 10'
+            in lines)
+    # Every sample line is "name{labels} value"
+    assert all(line.startswith("#") or line.count("} ") == 1 for line in lines)
+
+
+def test_connections_are_timed_and_associators_traced_on_request():
+    fake = FakeWMI()
+    fake.add_partition(fake.add_disk(size=1024**3), 1024**2)
+    metrics = Metrics()
+    connection = connect(fake.provider, metrics)
+
+    assert not isinstance(connection.Win32_DiskDrive()[0], InstrumentedObject)
+    metrics.trace_associators = True
+    disk = connection.query("SELECT * FROM Win32_DiskDrive")[0]
+    assert len(disk.associators("Win32_DiskDriveToDiskPartition")) == 1
+
+    assert [(s["kind"], s["name"], s["count"]) for s in metrics.to_dict()] == [
+        ("associators", "Win32_DiskDriveToDiskPartition", 1), ("connect", "local", 1),
+        ("query", "Win32_DiskDrive", 2)]
@@ -0,0 +1,157 @@
+# test_inventory_events.py
+import pytest
+
+import wmi_session
+from fake_wmi import FakeWMI
+from inventory_cache import InventoryCache
+from inventory_events import (
+    DISK_ADDED, DISK_CHANGED, DISK_REMOVED, RESYNC, VOLUME_CHANGED, InventoryEvent, InventoryWatcher,
+    ScriptedEventSource, parse_uevent,
+)
+
+
+@pytest.fixture
+def fake():
+    fake = FakeWMI()
+    for disk_number, letters in enumerate(("DE", "FG")):
+        disk = fake.add_disk(size=100 * 1024**3)
+        for index, letter in enumerate(letters):
+            partition = fake.add_partition(disk, 10 * 1024**3, starting_offset=1024**2 + index * 10 * 1024**3)
+            fake.add_logical_disk(partition, f"{letter}:")
+    return fake
+
+
+@pytest.fixture
+def queries(fake):
+    """Records ``(class, conditions)`` for every query the fake answers."""
+    seen = []
+    matching = fake._matching
+
+    def spy(wmi_class, alternatives):
+        seen.append((wmi_class, [dict(where) for where in alternatives]))
+        return matching(wmi_class, alternatives)
+
+    fake._matching = spy
+    return seen
+
+
+def _watch(fake, events):
+    inventory = InventoryCache(session=wmi_session.WMISession(fake.provider), ttl=30)
+    inventory.snapshot()
+    source = ScriptedEventSource(events)
+    watcher = InventoryWatcher(source, inventory=inventory, resync_interval=600).start()
+    assert source.wait(5)
+    return inventory, watcher
+
+
+def test_disk_event_requeries_only_that_disk(fake, queries):
+    inventory, watcher = _watch(fake, [InventoryEvent(DISK_CHANGED, disk_index=1)])
+    before = inventory.cached()
+    del queries[:]
+
+    snapshot = inventory.snapshot()
+
+    assert queries == [
+        ("Win32_DiskDrive", [{"Index": 1}]),
+        ("Win32_LogicalDiskToPartition", [{}]),
+        ("Win32_DiskPartition", [{"DiskIndex": 1}]),
+        ("Win32_LogicalDisk", [{"DeviceID": "F:"}, {"DeviceID": "G:"}]),
+    ]
+    assert snapshot.logical_disks_by_id["D:"] is before.logical_disks_by_id["D:"]
+    assert watcher.events_seen == 1
+    watcher.stop()
+
+
+def test_disk_event_by_device_id_is_resolved_to_its_index(fake, queries):
+    inventory, watcher = _watch(fake, [InventoryEvent(DISK_REMOVED, disk_id="\\\\.\\PHYSICALDRIVE0")])
+    del queries[:]
+
+    inventory.snapshot()
+
+    assert queries[0] == ("Win32_DiskDrive", [{"Index": 0}])
+    watcher.stop()
+
+
+def test_volume_event_requeries_the_disk_holding_the_volume(fake, queries):
+    inventory, watcher = _watch(fake, [InventoryEvent(VOLUME_CHANGED, volume_id="E:")])
+    del queries[:]
+
+    inventory.snapshot()
+
+    assert [query for query in queries if query[0] == "Win32_DiskDrive"] == [("Win32_DiskDrive", [{"Index": 0}])]
+    assert queries[-1] == ("Win32_LogicalDisk", [{"DeviceID": "D:"}, {"DeviceID": "E:"}])
+    watcher.stop()
+
+
+@pytest.mark.parametrize("event", [
+    InventoryEvent(VOLUME_CHANGED, volume_id="Z:"),
+    InventoryEvent(VOLUME_CHANGED),
+    InventoryEvent(DISK_CHANGED, disk_id="\\\\.\\PHYSICALDRIVE9"),
+    InventoryEvent(DISK_ADDED),
+    InventoryEvent(RESYNC),
+])
+def test_unknown_target_reloads_everything(fake, queries, event):
+    inventory, watcher = _watch(fake, [event])
+    del queries[:]
+
+    inventory.snapshot()
+
+    assert sorted(wmi_class for wmi_class, _ in queries) == [
+        "Win32_DiskDrive", "Win32_DiskDriveToDiskPartition", "Win32_DiskPartition", "Win32_LogicalDisk",
+        "Win32_LogicalDiskToPartition",
+    ]
+    assert all(conditions == [{}] for _, conditions in queries)
+    watcher.stop()
+
+
+def test_watching_stretches_the_ttl_and_stop_restores_it(fake):
+    inventory, watcher = _watch(fake, [])
+    assert inventory.ttl == 600
+
+    watcher.stop()
+
+    assert inventory.ttl == 30
+
+
+def test_listeners_see_each_event_after_it_is_applied(fake):
+    events = [InventoryEvent(DISK_CHANGED, disk_index=0), InventoryEvent(VOLUME_CHANGED, volume_id="F:")]
+    inventory = InventoryCache(session=wmi_session.WMISession(fake.provider), ttl=30)
+    inventory.snapshot()
+    source = ScriptedEventSource(events)
+    watcher = InventoryWatcher(source, inventory=inventory)
+    seen = []
+
+    def listener(event):
+        seen.append((event, sorted(inventory._stale_disks)))
+        raise RuntimeError("a broken listener")
+
+    watcher.subscribe(listener)
+    watcher.start()
+    assert source.wait(5)
+    watcher.stop()
+
+    assert seen == [(events[0], [0]), (events[1], [0, 1])]
+
+
+def _uevent(**fields):
+    header = f"{fields['ACTION']}@{fields['DEVPATH']}"
+    return "\0".join([header] + [f"{key}={value}" for key, value in fields.items()]).encode() + b"\0"
+
+
+def test_parse_uevent_for_a_partition_marks_its_disk_changed():
+    event = parse_uevent(_uevent(ACTION="add", DEVPATH="/devices/pci0000:00/0000:00:17.0/ata1/host0/target0:0:0/"
+                                 "0:0:0:0/block/sda/sda1", SUBSYSTEM="block", DEVNAME="sda1", DEVTYPE="partition"))
+    assert (event.kind, event.disk_id, event.disk_index) == (DISK_CHANGED, "/dev/sda", None)
+
+
+@pytest.mark.parametrize("action, kind", [("add", DISK_ADDED), ("remove", DISK_REMOVED), ("change", DISK_CHANGED)])
+def test_parse_uevent_for_a_whole_disk(action, kind):
+    event = parse_uevent(_uevent(ACTION=action, DEVPATH="/devices/virtual/block/nvme0n1", SUBSYSTEM="block",
+                                 DEVNAME="/dev/nvme0n1", DEVTYPE="disk"))
+    assert (event.kind, event.disk_id) == (kind, "/dev/nvme0n1")
+
+
+def test_parse_uevent_ignores_other_devices():
+    assert parse_uevent(_uevent(ACTION="add", DEVPATH="/devices/virtual/net/eth0", SUBSYSTEM="net",
+                                INTERFACE="eth0")) is None
+    assert parse_uevent(b"libudev\0garbage") is None
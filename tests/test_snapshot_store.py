@@ -0,0 +1,112 @@
+# test_snapshot_store.py
+import pytest
+
+from records import DiskRecord, PartitionRecord, VolumeRecord
+from snapshot_store import DISK, VOLUME, SnapshotStore
+from topology import TopologySnapshot
+
+GB = 1024**3
+DISK_ID = "\\\\.\\PHYSICALDRIVE0"
+
+
+def _snapshot(volumes, disk_size=100 * GB, spanned=False):
+    """One disk with a partition per ``{letter: free_space}`` entry, each holding that volume."""
+    disk = DiskRecord(DISK_ID, 0, "Disk 0", "Fake Disk", disk_size, "OK")
+    partitions, logical_disks, disk_links, volume_links = [], [], [], []
+    for index, (letter, free_space) in enumerate(volumes.items()):
+        partition = PartitionRecord(f"Disk #0, Partition #{index}", 0, index, 10 * GB, (1 + 10 * index) * GB, 512)
+        partitions.append(partition)
+        disk_links.append((DISK_ID, partition.device_id))
+        logical_disks.append(VolumeRecord(letter, "", "NTFS", 10 * GB, free_space, 3, "OK"))
+        volume_links.append((partition.device_id, letter))
+    if spanned:
+        # The last volume also continues on the first partition, so it is listed twice
+        volume_links.append((partitions[0].device_id, logical_disks[-1].device_id))
+    return TopologySnapshot([disk], partitions, logical_disks, disk_links, volume_links)
+
+
+@pytest.fixture
+def store():
+    with SnapshotStore(":memory:") as store:
+        yield store
+
+
+def _open_spans(store, key):
+    return store._db.execute("SELECT COUNT(*) FROM spans WHERE key = ? AND last IS NULL", (key,)).fetchone()[0]
+
+
+def test_unchanged_records_cost_no_writes(store):
+    store.save(_snapshot({"E:": 5 * GB, "F:": 6 * GB}), host="h", taken=1.0)
+    writes = store._db.total_changes
+    store.save(_snapshot({"E:": 5 * GB, "F:": 6 * GB}), host="h", taken=2.0)
+    assert store._db.total_changes - writes == 1  # Just the snapshots row
+
+    writes = store._db.total_changes
+    store.save(_snapshot({"E:": 4 * GB, "F:": 6 * GB}), host="h", taken=3.0)
+    assert store._db.total_changes - writes == 4  # Snapshot row, closed span, new record and new span
+
+
+def test_a_volume_listed_twice_keeps_one_open_span(store):
+    first = store.save(_snapshot({"E:": 5 * GB, "F:": 6 * GB}, spanned=True), host="h", taken=1.0)
+    second = store.save(_snapshot({"E:": 5 * GB, "F:": 3 * GB}, spanned=True), host="h", taken=2.0)
+    assert _open_spans(store, "F:") == 1
+
+    third = store.save(_snapshot({"E:": 5 * GB}), host="h", taken=3.0)
+    assert _open_spans(store, "F:") == 0
+    assert [change[:3] for change in store.diff(first, second)] == [("changed", VOLUME, "F:")]
+    assert ("removed", VOLUME, "F:") in [change[:3] for change in store.diff(second, third)]
+
+
+def test_diff_in_both_directions(store):
+    old = store.save(_snapshot({"E:": 5 * GB, "F:": 6 * GB}), host="h", taken=1.0)
+    store.save(_snapshot({"E:": 4 * GB, "F:": 6 * GB}), host="h", taken=2.0)
+    new = store.save(_snapshot({"E:": 3 * GB, "G:": 1 * GB}, disk_size=200 * GB), host="h", taken=3.0)
+
+    forward = store.diff(old, new)
+    # G: reuses F:'s partition, which is unchanged
+    assert [change[:3] for change in forward] == [
+        ("changed", DISK, DISK_ID), ("changed", VOLUME, "E:"), ("removed", VOLUME, "F:"), ("added", VOLUME, "G:")]
+    by_key = {(kind, key): (change, before, after) for change, kind, key, before, after in forward}
+    assert by_key[DISK, DISK_ID][1]["size"] == 100 * GB and by_key[DISK, DISK_ID][2]["size"] == 200 * GB
+    assert by_key[VOLUME, "E:"] == ("changed", by_key[VOLUME, "E:"][1], by_key[VOLUME, "E:"][2])
+    assert (by_key[VOLUME, "E:"][1]["free_space"], by_key[VOLUME, "E:"][2]["free_space"]) == (5 * GB, 3 * GB)
+    assert by_key[VOLUME, "F:"][0] == "removed" and by_key[VOLUME, "F:"][2] is None
+    assert by_key[VOLUME, "G:"][0] == "added" and by_key[VOLUME, "G:"][1] is None
+
+    backward = {(kind, key): (change, before, after) for change, kind, key, before, after in store.diff(new, old)}
+    assert backward.keys() == by_key.keys()
+    swapped = {"added": "removed", "removed": "added", "changed": "changed"}
+    for item, (change, before, after) in by_key.items():
+        assert backward[item] == (swapped[change], after, before)
+    assert store.diff(new, new) == []
+
+
+def test_diff_refuses_snapshots_of_different_hosts(store):
+    first = store.save(_snapshot({"E:": 5 * GB}), host="a")
+    second = store.save(_snapshot({"E:": 5 * GB}), host="b")
+    with pytest.raises(ValueError):
+        store.diff(first, second)
+
+
+def test_resolve_counts_back_per_host(store):
+    ids = [store.save(_snapshot({"E:": n * GB}), host="h", taken=float(n)) for n in range(1, 4)]
+    store.save(_snapshot({"E:": GB}), host="other", taken=9.0)
+
+    assert store.resolve("latest", host="h") == store.resolve("-0", host="h") == ids[2]
+    assert store.resolve("previous", host="h") == store.resolve("-1", host="h") == ids[1]
+    assert store.resolve("-2", host="h") == ids[0]
+    assert store.resolve(str(ids[1])) == ids[1]
+    with pytest.raises(ValueError, match="Only 3 snapshot"):
+        store.resolve("-3", host="h")
+
+
+def test_history_since(store):
+    for taken, free in ((10.0, 5), (20.0, 5), (30.0, 4), (40.0, 4), (50.0, 2)):
+        store.save(_snapshot({"E:": free * GB}), host="h", taken=taken)
+
+    assert store.history("E:", host="h") == [
+        (10.0, 20.0, 10 * GB, 5 * GB), (30.0, 40.0, 10 * GB, 4 * GB), (50.0, None, 10 * GB, 2 * GB)]
+    assert store.history("E:", host="h", since=20.0) == store.history("E:", host="h")
+    assert store.history("E:", host="h", since=25.0) == [(30.0, 40.0, 10 * GB, 4 * GB), (50.0, None, 10 * GB, 2 * GB)]
+    assert store.history("E:", host="h", since=99.0) == [(50.0, None, 10 * GB, 2 * GB)]
+    assert store.history("Z:", host="h") == []
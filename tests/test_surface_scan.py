@@ -0,0 +1,104 @@
+# test_surface_scan.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import surface_scan
+from surface_scan import BLOCK_SIZE, SurfaceScan
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "disk.img"
+    path.write_bytes(os.urandom(2 * 1024 * 1024 + 3 * BLOCK_SIZE))
+    return str(path)
+
+
+@pytest.fixture
+def slow_reads(monkeypatch):
+    read_at = surface_scan.read_at
+
+    def slow_read_at(descriptor, buffer, offset):
+        time.sleep(0.005)
+        return read_at(descriptor, buffer, offset)
+
+    monkeypatch.setattr(surface_scan, "read_at", slow_read_at)
+
+
+def _fingerprint(path):
+    with open(path, "rb") as image_file:
+        return hashlib.sha256(image_file.read()).hexdigest(), os.stat(path).st_mtime_ns
+
+
+def test_a_scan_reads_everything_and_changes_nothing(image, tmp_path):
+    before = _fingerprint(image)
+    scan = SurfaceScan(image, os.path.getsize(image), chunk_size=CHUNK, workers=3,
+                       checkpoint=str(tmp_path / "checkpoint.json"))
+
+    assert scan.run()
+    assert (scan.complete, scan.position, scan.bytes_read) == (True, scan.size, scan.size)
+    assert scan.errors == []
+    assert not os.path.exists(scan.checkpoint)
+    assert _fingerprint(image) == before
+
+
+def test_reading_past_the_end_is_reported_by_offset(image, tmp_path):
+    real_size = os.path.getsize(image)
+    scan = SurfaceScan(image, real_size + 2 * BLOCK_SIZE + 100, chunk_size=CHUNK, workers=2,
+                       checkpoint=str(tmp_path / "checkpoint.json"))
+
+    assert scan.run()
+    assert scan.errors == [(real_size, 3 * BLOCK_SIZE, "unexpected end of device")]
+    assert scan.bytes_read == real_size  # Only what was actually read
+    surface_scan.print_report(scan)
+
+
+def test_the_checkpoint_is_saved_without_a_progress_callback(image, tmp_path, slow_reads):
+    scan = SurfaceScan(image, os.path.getsize(image), chunk_size=BLOCK_SIZE, workers=1,
+                       checkpoint=str(tmp_path / "checkpoint.json"))
+    runner = threading.Thread(target=scan.run, kwargs={"progress_interval": 0.05})
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not os.path.exists(scan.checkpoint) and runner.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert os.path.exists(scan.checkpoint) and runner.is_alive()
+    finally:
+        scan.stop()
+        runner.join()
+
+
+def test_a_stopped_scan_resumes_from_its_checkpoint(image, tmp_path, slow_reads):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    size = os.path.getsize(image)
+    scan = SurfaceScan(image, size + BLOCK_SIZE, chunk_size=BLOCK_SIZE, workers=2, checkpoint=checkpoint)
+
+    assert not scan.run(on_progress=lambda scan: scan.stop(), progress_interval=0.05)
+    stopped_at = scan.position
+    assert 0 < stopped_at < size
+    with open(checkpoint) as checkpoint_file:
+        state = json.load(checkpoint_file)
+    assert state["next_chunk"] * BLOCK_SIZE == stopped_at and state["bytes_read"] == stopped_at
+
+    resumed = SurfaceScan(image, size + BLOCK_SIZE, chunk_size=BLOCK_SIZE, workers=2, checkpoint=checkpoint)
+    assert resumed.load_checkpoint()
+    assert resumed.position == stopped_at and resumed.bytes_read == stopped_at
+    assert resumed.run()
+    assert resumed.errors == [(size, BLOCK_SIZE, "unexpected end of device")]
+    assert resumed.bytes_read == size
+    assert not os.path.exists(checkpoint)
+
+
+def test_a_checkpoint_for_another_device_is_ignored(image, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    scan = SurfaceScan(image, os.path.getsize(image), chunk_size=CHUNK, checkpoint=checkpoint)
+    scan.save_checkpoint()
+
+    assert not SurfaceScan(image, os.path.getsize(image), chunk_size=2 * CHUNK, checkpoint=checkpoint).load_checkpoint()
+    assert SurfaceScan(image, os.path.getsize(image), chunk_size=CHUNK, checkpoint=checkpoint).load_checkpoint()
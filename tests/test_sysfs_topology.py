@@ -0,0 +1,106 @@
+# test_sysfs_topology.py
+import backends
+import disk_management
+from diskpart_script import DiskpartResult
+from fake_sysfs import FakeSysfs, generate_tree
+from inventory_cache import RebuildingInventory, set_inventory
+from sysfs_topology import FIXED, REMOVABLE, build_sysfs_snapshot
+
+GB = 1024**3
+
+
+def test_disks_partitions_mounts_and_free_space(tmp_path):
+    tree = FakeSysfs(str(tmp_path / "tree"))
+    sda = tree.add_disk("sda", 100 * GB, model="Fake SSD")
+    tree.add_partition(sda, 1, 1 * GB, mount_point="/boot", file_system="vfat", free_space=GB // 2)
+    tree.add_partition(sda, 2, 60 * GB, start=1025 * 1024**2, mount_point="/data dir", free_space=20 * GB)
+    tree.add_partition(sda, 3, 30 * GB, start=62 * GB)
+    nvme = tree.add_disk("nvme0n1", 500 * GB, block_size=4096)
+    tree.add_partition(nvme, 1, 500 * GB - 1024**2, mount_point="/", free_space=100 * GB)
+    tree.add_disk("sdb", 16 * GB, removable=True, mount_point="/media/usb", file_system="exfat", free_space=GB)
+    tree.add_disk("sr0", 700 * 1024**2)
+    tree.add_disk("loop0", 0)
+
+    snapshot = build_sysfs_snapshot(**tree.roots())
+
+    # The empty loop device is skipped but keeps its place in the numbering
+    assert [(disk.device_id, disk.index, disk.size) for disk in snapshot.disks] == [
+        ("/dev/nvme0n1", 1, 500 * GB), ("/dev/sda", 2, 100 * GB), ("/dev/sdb", 3, 16 * GB),
+        ("/dev/sr0", 4, 700 * 1024**2),
+    ]
+    assert snapshot.disks_by_id["/dev/sda"].caption == "Fake SSD"
+
+    partitions = snapshot.partitions("/dev/sda")
+    assert [(partition.device_id, partition.index, partition.size, partition.starting_offset)
+            for partition in partitions] == [
+        ("/dev/sda1", 1, 1 * GB, 1024**2), ("/dev/sda2", 2, 60 * GB, 1025 * 1024**2), ("/dev/sda3", 3, 30 * GB, 62 * GB),
+    ]
+    assert [partition.device_id for partition in snapshot.partitions("/dev/nvme0n1")] == ["/dev/nvme0n1p1"]
+    assert snapshot.partitions("/dev/nvme0n1")[0].block_size == 4096
+
+    volumes = snapshot.logical_disks_by_id
+    assert sorted(volumes) == ["/", "/boot", "/data dir", "/media/usb"]
+    assert (volumes["/boot"].file_system, volumes["/boot"].size, volumes["/boot"].free_space) == ("vfat", GB, GB // 2)
+    assert (volumes["/data dir"].size, volumes["/data dir"].free_space) == (60 * GB, 20 * GB)
+    assert snapshot.logical_disks("/dev/sda3") == []
+    assert snapshot.disk_for_logical_disk("/").device_id == "/dev/nvme0n1"
+    assert volumes["/"].drive_type == FIXED
+    assert snapshot.disks_by_id["/dev/sr0"].caption == "sr0"
+
+    # A file system on the unpartitioned removable disk shows as one whole-disk partition
+    [whole_disk] = snapshot.partitions("/dev/sdb")
+    assert (whole_disk.device_id, whole_disk.type) == ("/dev/sdb", "Whole disk")
+    assert (volumes["/media/usb"].drive_type, volumes["/media/usb"].file_system) == (REMOVABLE, "exfat")
+    assert snapshot.partitions("/dev/sr0") == []
+
+
+def test_generated_tree(tmp_path):
+    tree = generate_tree(str(tmp_path / "tree"), disks=30, partitions_per_disk=3, disk_size=300 * GB)
+    snapshot = build_sysfs_snapshot(**tree.roots())
+
+    assert len(snapshot.disks) == 30
+    assert sum(len(snapshot.partitions(disk.device_id)) for disk in snapshot.disks) == 90
+    assert len(snapshot.logical_disks_by_id) == 90
+    volume = snapshot.logical_disks_by_id["/mnt/sdb2"]
+    assert volume.free_space == volume.size // 2
+    assert [disk.device_id for disk in snapshot.disks[:5]] == ["/dev/sd26", "/dev/sd27", "/dev/sd28", "/dev/sd29",
+                                                               "/dev/sda"]
+
+
+def _diskpart_must_not_run(*args, **kwargs):
+    raise AssertionError("diskpart must not run without the WMI backend")
+
+
+def _failing_inventory():
+    def build():
+        raise OSError("sysfs is not mounted")
+    return RebuildingInventory(build)
+
+
+def test_list_disks_does_not_fall_back_to_diskpart_without_wmi(monkeypatch, capsys):
+    monkeypatch.setattr(backends, "_loaded", {"linux": object()})
+    monkeypatch.setattr(disk_management.DiskpartScript, "run", _diskpart_must_not_run)
+    set_inventory(_failing_inventory())
+
+    disk_management.list_disks()
+
+    output = capsys.readouterr().out
+    assert "sysfs is not mounted" in output
+    assert "diskpart" not in output and "WMI" not in output
+
+
+def test_list_disks_falls_back_to_diskpart_with_wmi(monkeypatch, capsys):
+    monkeypatch.setattr(backends, "_loaded", {"wmi": object()})
+    runs = []
+
+    def run(script, *args, **kwargs):
+        runs.append(script.commands)
+        return [DiskpartResult("list disk", "  Disk 0    Online", ok=True, ran=True)]
+
+    monkeypatch.setattr(disk_management.DiskpartScript, "run", run)
+    set_inventory(_failing_inventory())
+
+    disk_management.list_disks()
+
+    assert runs == [["list disk"]]
+    assert "Falling back to subprocess" in capsys.readouterr().out
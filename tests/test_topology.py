@@ -0,0 +1,69 @@
+# test_topology.py
+import wmi_session
+from fake_wmi import FakeWMI
+from instrumentation import get_metrics
+from inventory_cache import InventoryCache
+
+
+def _two_disks():
+    fake = FakeWMI()
+    disks = [fake.add_disk(size=100 * 1024**3), fake.add_disk(size=100 * 1024**3)]
+    volumes = []
+    for disk in disks:
+        for index in range(3):
+            partition = fake.add_partition(disk, 10 * 1024**3, starting_offset=1024**2 + index * 10 * 1024**3)
+            volumes.append(fake.add_logical_disk(partition, f"{'DEFGHI'[len(volumes)]}:", free_space=1024**3))
+    return fake, disks, volumes
+
+
+def test_refresh_queries_a_stale_disk_in_a_fixed_number_of_queries():
+    fake, disks, volumes = _two_disks()
+    inventory = InventoryCache(session=wmi_session.WMISession(fake.provider), ttl=600)
+    before = inventory.snapshot()
+    volumes[1].update(FreeSpace=str(5 * 1024**3))
+    get_metrics().reset()
+
+    inventory.invalidate([0])
+    snapshot = inventory.snapshot()
+
+    # Drive, partitions, partition-to-volume links and one query for all of the disk's volumes
+    assert get_metrics().calls("query") == 4
+    assert snapshot.logical_disks_by_id["E:"].free_space == 5 * 1024**3
+    assert [disk.index for disk in snapshot.disks] == [0, 1]
+    assert [volume.device_id for volume in snapshot.volumes(snapshot.disks[0].device_id)] == ["D:", "E:", "F:"]
+    assert snapshot.logical_disks_by_id["G:"] is before.logical_disks_by_id["G:"]
+
+
+def test_refresh_drops_a_disk_that_went_away():
+    fake, disks, volumes = _two_disks()
+    inventory = InventoryCache(session=wmi_session.WMISession(fake.provider), ttl=600)
+    inventory.snapshot()
+    fake.remove(disks[1])
+
+    inventory.invalidate([1])
+    snapshot = inventory.snapshot()
+
+    assert [disk.index for disk in snapshot.disks] == [0]
+    assert "G:" not in snapshot.logical_disks_by_id
+    assert snapshot.disk_for_logical_disk("G:") is None
+
+
+def test_refresh_leaves_the_snapshot_readers_hold_untouched():
+    fake, disks, volumes = _two_disks()
+    inventory = InventoryCache(session=wmi_session.WMISession(fake.provider), ttl=600)
+    before = inventory.snapshot()
+    listed = before.to_dict()
+    reading = iter(before.disks)
+    next(reading)
+    fake.remove(disks[0])
+    volumes[4].update(VolumeName="Renamed")
+
+    inventory.invalidate([0, 1])
+    after = inventory.snapshot()
+
+    assert after is not before
+    assert before.to_dict() == listed
+    assert [disk.index for disk in reading] == [1]
+    assert [disk.index for disk in after.disks] == [1]
+    assert after.logical_disks_by_id["H:"].volume_name == "Renamed"
+    assert before.logical_disks_by_id["H:"].volume_name == ""
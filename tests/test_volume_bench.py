@@ -0,0 +1,42 @@
+# test_volume_bench.py
+import os
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from volume_bench import KB, MB, run_benchmark
+
+
+def _bench_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("diskman-bench-")]
+
+
+def test_a_short_benchmark_reports_every_case_and_removes_its_file(tmp_path):
+    results = []
+    report = run_benchmark(str(tmp_path), file_size=MB, block_sizes=(4 * KB, 64 * KB), queue_depths=(1, 2),
+                           duration=0.05, patterns=("seq_write", "rand_read"), on_result=results.append)
+
+    assert [(r["pattern"], r["block_size"], r["queue_depth"]) for r in report["results"]] == [
+        (pattern, block_size, queue_depth) for pattern in ("seq_write", "rand_read")
+        for block_size in (4 * KB, 64 * KB) for queue_depth in (1, 2)]
+    assert results == report["results"]
+    assert all(result["iops"] > 0 for result in results)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="sends SIGINT to this process")
+def test_ctrl_c_stops_the_workers_before_the_file_is_removed(tmp_path):
+    interrupt = threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGINT))
+    interrupt.start()
+    started = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        run_benchmark(str(tmp_path), file_size=MB, block_sizes=(4 * KB,), queue_depths=(4,), duration=30,
+                      patterns=("rand_read",))
+    interrupt.join()
+
+    assert time.monotonic() - started < 10
+    assert _bench_threads() == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,58 @@
+# test_volume_jobs.py
+import time
+
+import wmi_session
+from fake_wmi import FakeWMI
+from inventory_cache import InventoryCache, set_inventory
+from jobs import CANCELLED, DONE, RUNNING, JobEngine
+from volume_management import submit_volume_job
+
+
+def _volume():
+    fake = FakeWMI()
+    disk = fake.add_disk(size=100 * 1024**3)
+    volume = fake.add_logical_disk(fake.add_partition(disk, 50 * 1024**3), "E:")
+    wmi_session.set_provider(fake.provider)
+    set_inventory(InventoryCache(ttl=600)).snapshot()
+    return fake, volume
+
+
+def test_a_finished_job_reports_completion():
+    fake, volume = _volume()
+    updates = []
+    engine = JobEngine(on_update=lambda job: updates.append((job.progress, job.message)))
+    job = submit_volume_job("Format E:", "E:", "Format", engine=engine, file_system="NTFS", label="Data")
+
+    assert job.wait(5)
+    assert job.status == DONE
+    assert (job.progress, job.message) == (100, "Format on E: finished")
+    assert [progress for progress, _ in updates if progress] == [10, 100, 100]
+    assert volume.calls == [("Format", {"label": "Data"})]
+    engine.shutdown()
+
+
+def test_a_job_cancelled_after_pickup_never_touches_the_volume():
+    fake, volume = _volume()
+    fake.latency = 0.3  # The job is still fetching the live volume when it is cancelled
+    engine = JobEngine()
+    job = submit_volume_job("Extend E:", "E:", "Extend", engine=engine, Size=1024)
+    while job.status != RUNNING:
+        time.sleep(0.01)
+
+    assert job.cancel()
+    assert job.wait(5)
+    assert job.status == CANCELLED
+    assert volume.calls == []
+    engine.shutdown()
+
+
+def test_a_finished_job_cannot_be_cancelled():
+    fake, volume = _volume()
+    engine = JobEngine()
+    job = submit_volume_job("Extend E:", "E:", "Extend", engine=engine, Size=1024)
+    job.wait(5)
+
+    assert not job.cancel()
+    assert job.status == DONE
+    assert volume.calls == [("Extend", {"Size": 1024})]
+    engine.shutdown()
@@ -0,0 +1,83 @@
+# test_wmi_session.py
+import pytest
+
+import wmi_session
+from fake_wmi import FakeWMI
+from instrumentation import get_metrics
+from topology import build_snapshot
+
+
+def _fake_topology():
+    fake = FakeWMI()
+    disk = fake.add_disk(size=100 * 1024**3, caption="Data Disk")
+    system = fake.add_partition(disk, 40 * 1024**3)
+    fake.add_partition(disk, 20 * 1024**3, starting_offset=41 * 1024**3)
+    fake.add_logical_disk(system, "C:", free_space=10 * 1024**3, volume_name="System")
+    fake.add_disk(size=50 * 1024**3)
+    return fake
+
+
+def test_connection_is_opened_once_and_reused():
+    fake = FakeWMI()
+    opened = []
+
+    def provider(**connect_args):
+        opened.append(connect_args)
+        return fake
+
+    session = wmi_session.set_provider(provider, computer="host1")
+    first = session.connection()
+    assert session.query(lambda connection: connection) is first
+    assert wmi_session.get_session().connection() is first
+    assert opened == [{"computer": "host1"}]
+
+
+def test_query_reconnects_after_a_stale_connection():
+    fake = FakeWMI()
+    opened = []
+
+    def provider(**connect_args):
+        opened.append(fake)
+        return fake
+
+    session = wmi_session.set_provider(provider)
+    stale = session.connection()
+    attempts = []
+
+    def action(connection):
+        attempts.append(connection)
+        if len(attempts) == 1:
+            raise OSError("The RPC server is unavailable")
+        return "listed"
+
+    assert session.query(action, retries=1) == "listed"
+    assert len(opened) == 2
+    assert attempts[0] is stale and attempts[1] is not stale
+
+
+def test_query_gives_up_after_the_retries():
+    session = wmi_session.set_provider(FakeWMI().provider)
+    attempts = []
+
+    def action(connection):
+        attempts.append(connection)
+        raise OSError("The RPC server is unavailable")
+
+    with pytest.raises(OSError):
+        session.query(action, retries=1)
+    assert len(attempts) == 2
+
+
+def test_build_snapshot_uses_five_queries():
+    session = wmi_session.set_provider(_fake_topology().provider)
+    snapshot = session.query(build_snapshot)
+
+    assert get_metrics().calls("query") == 5
+    assert [disk.caption for disk in snapshot.disks] == ["Data Disk", "Fake Disk 1"]
+    data_disk = snapshot.disks[0]
+    assert [partition.size for partition in snapshot.partitions(data_disk.device_id)] == [40 * 1024**3, 20 * 1024**3]
+    assert [volume.device_id for volume in snapshot.volumes(data_disk.device_id)] == ["C:"]
+    volume = snapshot.logical_disks_by_id["C:"]
+    assert (volume.volume_name, volume.free_space) == ("System", 10 * 1024**3)
+    assert snapshot.disk_for_logical_disk("C:") is data_disk
+    assert snapshot.partitions(snapshot.disks[1].device_id) == []
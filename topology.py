@@ -0,0 +1,222 @@
+# topology.py
+"""One-shot snapshot of the disk -> partition -> logical disk topology.
+
+Walking ``associators()`` costs a WMI round trip per partition.  Instead,
+``build_snapshot`` runs one flat query per class (the drives, partitions,
+logical disks and the two association classes), fetching only the columns
+in ``records``, and joins the resulting records in memory through
+dictionaries keyed by DeviceID.
+"""
+import copy
+import re
+
+from extent_map import ExtentMap
+from records import (
+    DISK_FIELDS, LINK_FIELDS, PARTITION_FIELDS, VOLUME_FIELDS, DiskRecord, PartitionRecord, VolumeRecord,
+)
+
+
+_DEVICE_ID_PATTERN = re.compile(r'DeviceID="((?:[^"\\]|\\.)*)"')
+
+
+def reference_id(association, role):
+    """Returns the DeviceID an association's ``Antecedent``/``Dependent`` points at.
+
+    The raw reference path is read through ``wmi_property`` where available,
+    because plain attribute access makes the wmi module fetch the referenced
+    object with another round trip.
+    """
+    if hasattr(association, "wmi_property"):
+        path = association.wmi_property(role).value
+    else:
+        path = getattr(association, role)
+    match = _DEVICE_ID_PATTERN.search(str(path))
+    if not match:
+        return None
+    return re.sub(r"\\(.)", r"\1", match.group(1))
+
+
+def _wql_string(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def query_logical_disks(connection, logical_disk_ids):
+    """Fetches the given logical disks (e.g. ``["E:", "F:"]``) in one projected WQL query.
+
+    Returns:
+        list: VolumeRecords for the logical disks that exist.
+    """
+    if not logical_disk_ids:
+        return []
+    where = " OR ".join(f"DeviceID = {_wql_string(device_id)}" for device_id in dict.fromkeys(logical_disk_ids))
+    wql = f"SELECT {', '.join(VOLUME_FIELDS)} FROM Win32_LogicalDisk WHERE {where}"
+    return [VolumeRecord.from_wmi(logical_disk) for logical_disk in connection.query(wql)]
+
+
+class TopologySnapshot:
+    """Disk, partition and volume records joined through DeviceID indexes."""
+
+    def __init__(self, disks, partitions, logical_disks, disk_partition_links, partition_volume_links):
+        self.disks = []
+        self.disks_by_id = {}
+        self.partitions_by_id = {}
+        self.logical_disks_by_id = {}
+        self.partitions_by_disk = {}
+        self.logical_disks_by_partition = {}
+        self.partition_by_logical_disk = {}
+        self._extent_maps = {}
+
+        partitions_by_id = {partition.device_id: partition for partition in partitions}
+        logical_disks_by_id = {logical_disk.device_id: logical_disk for logical_disk in logical_disks}
+        partitions_by_disk = {}
+        for disk_id, partition_id in disk_partition_links:
+            if partition_id in partitions_by_id:
+                partitions_by_disk.setdefault(disk_id, []).append(partitions_by_id[partition_id])
+        logical_disks_by_partition = {}
+        for partition_id, logical_disk_id in partition_volume_links:
+            if logical_disk_id in logical_disks_by_id:
+                logical_disks_by_partition.setdefault(partition_id, []).append(logical_disks_by_id[logical_disk_id])
+        for disk in disks:
+            self._add_disk(disk, partitions_by_disk.get(disk.device_id, []), logical_disks_by_partition)
+
+    def _add_disk(self, disk, partitions, logical_disks_by_partition):
+        self.disks.append(disk)
+        self.disks_by_id[disk.device_id] = disk
+        self.partitions_by_disk[disk.device_id] = sorted(partitions, key=lambda partition: partition.index)
+        for partition in partitions:
+            self.partitions_by_id[partition.device_id] = partition
+            for logical_disk in logical_disks_by_partition.get(partition.device_id, []):
+                self.logical_disks_by_id[logical_disk.device_id] = logical_disk
+                self.logical_disks_by_partition.setdefault(partition.device_id, []).append(logical_disk)
+                self.partition_by_logical_disk[logical_disk.device_id] = partition.device_id
+
+    def _remove_disk(self, disk_id):
+        disk = self.disks_by_id.pop(disk_id, None)
+        if disk is None:
+            return None
+        position = self.disks.index(disk)
+        self.disks.pop(position)
+        self._extent_maps.pop(disk_id, None)
+        for partition in self.partitions_by_disk.pop(disk_id, []):
+            self.partitions_by_id.pop(partition.device_id, None)
+            for logical_disk in self.logical_disks_by_partition.pop(partition.device_id, []):
+                self.logical_disks_by_id.pop(logical_disk.device_id, None)
+                self.partition_by_logical_disk.pop(logical_disk.device_id, None)
+        return position
+
+    def partitions(self, disk_id):
+        """Returns the partitions on a disk, ordered by partition index."""
+        return self.partitions_by_disk.get(disk_id, [])
+
+    def logical_disks(self, partition_id):
+        """Returns the logical disks (drive letters) backed by a partition."""
+        return self.logical_disks_by_partition.get(partition_id, [])
+
+    def extent_map(self, disk_id):
+        """Returns the ExtentMap of a disk's partitions and free gaps, built once per snapshot."""
+        if disk_id not in self._extent_maps:
+            self._extent_maps[disk_id] = ExtentMap.from_snapshot(self, self.disks_by_id[disk_id])
+        return self._extent_maps[disk_id]
+
+    def volumes(self, disk_id):
+        """Returns the volume records on a disk, in partition order."""
+        return [
+            logical_disk
+            for partition in self.partitions(disk_id)
+            for logical_disk in self.logical_disks(partition.device_id)
+        ]
+
+    def to_dict(self):
+        """Returns the topology as nested disks, partitions and volumes, ready for JSON."""
+        return {
+            "disks": [
+                dict(disk.to_dict(), partitions=[
+                    dict(partition.to_dict(), volumes=[
+                        logical_disk.to_dict() for logical_disk in self.logical_disks(partition.device_id)
+                    ])
+                    for partition in self.partitions(disk.device_id)
+                ])
+                for disk in self.disks
+            ]
+        }
+
+    def disk_for_logical_disk(self, logical_disk_id):
+        """Returns the disk holding a logical disk such as ``"E:"``, or None."""
+        partition = self.partitions_by_id.get(self.partition_by_logical_disk.get(logical_disk_id))
+        if partition is None:
+            return None
+        for disk in self.disks:
+            if disk.index == partition.disk_index:
+                return disk
+        return None
+
+    def _copy(self):
+        # The records are never changed, so the copy shares them and gets its own lists and indexes
+        # (the per-partition lists are replaced rather than appended to when a disk is re-added)
+        snapshot = copy.copy(self)
+        snapshot.disks = list(self.disks)
+        for name in ("disks_by_id", "partitions_by_id", "logical_disks_by_id", "partitions_by_disk",
+                     "logical_disks_by_partition", "partition_by_logical_disk", "_extent_maps"):
+            setattr(snapshot, name, dict(getattr(self, name)))
+        return snapshot
+
+    def refresh_disks(self, connection, disk_indexes):
+        """Returns a copy of the snapshot with only the given disks (by ``Index``) re-queried.
+
+        This snapshot is left as it is, so threads still reading it never see
+        a half-patched disk list.
+        """
+        snapshot = self._copy()
+        snapshot._patch_disks(connection, disk_indexes)
+        return snapshot
+
+    def _patch_disks(self, connection, disk_indexes):
+        partition_volume_links = None
+        for disk_index in disk_indexes:
+            stale = [disk for disk in self.disks if disk.index == int(disk_index)]
+            position = self._remove_disk(stale[0].device_id) if stale else None
+            found = connection.Win32_DiskDrive(DISK_FIELDS, Index=disk_index)
+            if not found:
+                continue  # The disk went away
+
+            if partition_volume_links is None:
+                partition_volume_links = [
+                    (reference_id(link, "Antecedent"), reference_id(link, "Dependent"))
+                    for link in connection.Win32_LogicalDiskToPartition(LINK_FIELDS)
+                ]
+            partitions = [
+                PartitionRecord.from_wmi(partition)
+                for partition in connection.Win32_DiskPartition(PARTITION_FIELDS, DiskIndex=disk_index)
+            ]
+            partition_ids = {partition.device_id for partition in partitions}
+            links = [(partition_id, logical_disk_id) for partition_id, logical_disk_id in partition_volume_links
+                     if partition_id in partition_ids]
+            logical_disks_by_id = {
+                logical_disk.device_id: logical_disk
+                for logical_disk in query_logical_disks(connection, [logical_disk_id for _, logical_disk_id in links])
+            }
+            logical_disks_by_partition = {}
+            for partition_id, logical_disk_id in links:
+                if logical_disk_id in logical_disks_by_id:
+                    logical_disks_by_partition.setdefault(partition_id, []).append(logical_disks_by_id[logical_disk_id])
+
+            self._add_disk(DiskRecord.from_wmi(found[0]), partitions, logical_disks_by_partition)
+            if position is not None:
+                # Keep the disk where it was listed before
+                self.disks.insert(position, self.disks.pop())
+
+
+def build_snapshot(connection):
+    """Builds a TopologySnapshot with five flat, column-projected queries on ``connection``."""
+    disks = [DiskRecord.from_wmi(disk) for disk in connection.Win32_DiskDrive(DISK_FIELDS)]
+    partitions = [PartitionRecord.from_wmi(partition) for partition in connection.Win32_DiskPartition(PARTITION_FIELDS)]
+    logical_disks = [VolumeRecord.from_wmi(logical_disk) for logical_disk in connection.Win32_LogicalDisk(VOLUME_FIELDS)]
+    disk_partition_links = [
+        (reference_id(link, "Antecedent"), reference_id(link, "Dependent"))
+        for link in connection.Win32_DiskDriveToDiskPartition(LINK_FIELDS)
+    ]
+    partition_volume_links = [
+        (reference_id(link, "Antecedent"), reference_id(link, "Dependent"))
+        for link in connection.Win32_LogicalDiskToPartition(LINK_FIELDS)
+    ]
+    return TopologySnapshot(disks, partitions, logical_disks, disk_partition_links, partition_volume_links)
@@ -0,0 +1,308 @@
+# volume_bench.py
+"""Throughput and latency benchmark for a mounted volume.
+
+Checks whether the allocation unit chosen in ``format_volume`` suits the
+workload without leaving DiskMan.  A temporary file is created on the volume
+and removed afterwards; sequential and random reads and writes run against
+it at several block sizes and queue depths.  Queue depth is the number of
+worker threads issuing synchronous I/O at once.
+
+Each worker owns one buffer from an anonymous ``mmap``, which is page
+aligned, allocated before the timed loop and reused for every request.  On
+Linux the file is opened with ``O_DIRECT`` where the file system allows it,
+so reads measure the device rather than the page cache; elsewhere (and on
+file systems that refuse ``O_DIRECT``) the cache is flushed with an fsync
+after writes but reads may be served from memory, which the results note.
+
+Results are printed and appended as one JSON line per run to
+``$DISKMAN_BENCH_RESULTS`` (volume_bench_results.jsonl), together with the
+volume's file system and cluster size.
+"""
+import json
+import mmap
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from instrumentation import get_metrics
+
+KB = 1024
+MB = 1024 * KB
+
+DEFAULT_FILE_SIZE = 256 * MB
+DEFAULT_BLOCK_SIZES = (4 * KB, 64 * KB, 1 * MB)
+DEFAULT_QUEUE_DEPTHS = (1, 4, 16)
+DEFAULT_DURATION = 2.0
+PATTERNS = ("seq_write", "seq_read", "rand_write", "rand_read")
+RESULTS_PATH = os.environ.get("DISKMAN_BENCH_RESULTS", "volume_bench_results.jsonl")
+
+
+def cluster_size(path):
+    """Returns the allocation unit size in bytes of the file system holding ``path``, or None."""
+    if hasattr(os, "statvfs"):
+        return os.statvfs(path).f_frsize
+    try:
+        import ctypes
+
+        sectors_per_cluster, bytes_per_sector = ctypes.c_ulong(), ctypes.c_ulong()
+        free_clusters, total_clusters = ctypes.c_ulong(), ctypes.c_ulong()
+        if ctypes.windll.kernel32.GetDiskFreeSpaceW(
+                ctypes.c_wchar_p(os.path.splitdrive(os.path.abspath(path))[0] + "\\"),
+                ctypes.byref(sectors_per_cluster), ctypes.byref(bytes_per_sector),
+                ctypes.byref(free_clusters), ctypes.byref(total_clusters)):
+            return sectors_per_cluster.value * bytes_per_sector.value
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+
+class BenchFile:
+    """The temporary file under test, opened once per worker.
+
+    Args:
+        directory (str): Directory on the volume to benchmark.
+        size (int): File size in bytes, rounded down to a whole MB.
+    """
+
+    def __init__(self, directory, size):
+        self.size = size // MB * MB
+        handle, self.path = tempfile.mkstemp(prefix="diskman-bench-", suffix=".tmp", dir=directory)
+        os.close(handle)
+        self.direct = False
+        if hasattr(os, "O_DIRECT"):
+            try:
+                os.close(os.open(self.path, os.O_RDWR | os.O_DIRECT))
+                self.direct = True
+            except OSError:
+                pass  # tmpfs and some network file systems refuse O_DIRECT
+
+    def open(self):
+        """Returns a raw descriptor for one worker."""
+        flags = os.O_RDWR | getattr(os, "O_BINARY", 0)
+        if self.direct:
+            flags |= os.O_DIRECT
+        return os.open(self.path, flags)
+
+    def fill(self, buffer):
+        """Writes the whole file once so reads and overwrites hit allocated blocks."""
+        descriptor = self.open()
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(descriptor, 0, self.size)
+            for offset in range(0, self.size, len(buffer)):
+                write_at(descriptor, buffer, offset)
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# read_at/write_at transfer all of ``buffer`` at ``offset`` and return the byte count
+if hasattr(os, "preadv"):
+    def read_at(descriptor, buffer, offset):
+        return os.preadv(descriptor, [buffer], offset)
+
+    def write_at(descriptor, buffer, offset):
+        return os.pwritev(descriptor, [buffer], offset)
+else:
+    # Callers give each thread its own descriptor, so seek-then-transfer is not shared state
+    def read_at(descriptor, buffer, offset):
+        os.lseek(descriptor, offset, os.SEEK_SET)
+        return os.readv(descriptor, [buffer]) if hasattr(os, "readv") else _read_into(descriptor, buffer)
+
+    def write_at(descriptor, buffer, offset):
+        os.lseek(descriptor, offset, os.SEEK_SET)
+        return os.write(descriptor, buffer)
+
+
+def _read_into(descriptor, buffer):
+    data = os.read(descriptor, len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def _worker(bench_file, pattern, block_size, worker, workers, deadline, stop, buffer, latencies, totals):
+    descriptor = bench_file.open()
+    blocks = bench_file.size // block_size
+    write = pattern.endswith("write")
+    transfer = write_at if write else read_at
+    # Sequential workers each stream through their own slice of the file, like parallel streams
+    first = blocks * worker // workers
+    count = max(blocks * (worker + 1) // workers - first, 1)
+    rng = random.Random(worker)
+    done = 0
+    perf_counter = time.perf_counter
+    try:
+        while perf_counter() < deadline and not stop.is_set():
+            if pattern.startswith("seq"):
+                block = first + done % count
+            else:
+                block = rng.randrange(blocks)
+            started = perf_counter()
+            transfer(descriptor, buffer, block * block_size)
+            latencies.append(perf_counter() - started)
+            done += 1
+        if write:
+            os.fsync(descriptor)  # Cached writes only count once they reach the volume
+    finally:
+        os.close(descriptor)
+    totals[worker] = done * block_size
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_case(bench_file, pattern, block_size, queue_depth, duration, buffers):
+    """Runs one pattern at one block size and queue depth.
+
+    Returns:
+        dict: ``pattern``, ``block_size``, ``queue_depth``, ``mb_per_s``, ``iops`` and
+        ``p50_ms``/``p95_ms``/``p99_ms``/``max_ms`` latencies.
+    """
+    latencies = [[] for _ in range(queue_depth)]
+    totals = [0] * queue_depth
+    deadline = time.perf_counter() + duration
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=_worker, name=f"diskman-bench-{worker}",
+                         args=(bench_file, pattern, block_size, worker, queue_depth, deadline, stop,
+                               buffers[worker][:block_size], latencies[worker], totals))
+        for worker in range(queue_depth)
+    ]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        # On Ctrl+C the workers must be done with the file before run_benchmark removes it
+        stop.set()
+        for thread in threads:
+            if thread.ident is not None:
+                thread.join()
+    seconds = time.perf_counter() - started
+    merged = sorted(latency for worker_latencies in latencies for latency in worker_latencies)
+    get_metrics().record("bench", f"{pattern}/{block_size}/{queue_depth}", seconds, rows=len(merged),
+                         size=sum(totals), action="volume_bench")
+    return {
+        "pattern": pattern, "block_size": block_size, "queue_depth": queue_depth,
+        "mb_per_s": sum(totals) / MB / seconds, "iops": len(merged) / seconds,
+        "p50_ms": _percentile(merged, 0.50) * 1000, "p95_ms": _percentile(merged, 0.95) * 1000,
+        "p99_ms": _percentile(merged, 0.99) * 1000, "max_ms": (merged[-1] if merged else 0.0) * 1000,
+    }
+
+
+def run_benchmark(directory, file_size=DEFAULT_FILE_SIZE, block_sizes=DEFAULT_BLOCK_SIZES,
+                  queue_depths=DEFAULT_QUEUE_DEPTHS, duration=DEFAULT_DURATION, patterns=PATTERNS, on_result=None):
+    """Benchmarks the volume holding ``directory`` with a temporary file that is removed afterwards.
+
+    Args:
+        directory (str): Directory on the volume to test, e.g. ``"E:\\"`` or a mount point.
+        file_size (int, optional): Size of the test file in bytes. Defaults to 256 MB.
+        block_sizes (tuple, optional): Request sizes in bytes. Defaults to 4 KB, 64 KB and 1 MB.
+        queue_depths (tuple, optional): Concurrent requests. Defaults to 1, 4 and 16.
+        duration (float, optional): Seconds per pattern/block size/queue depth case. Defaults to 2.
+        patterns (tuple, optional): Any of PATTERNS. Defaults to all four.
+        on_result (callable, optional): Called with each case's result dict as it finishes.
+
+    Returns:
+        dict: ``direct_io``, ``cluster_size``, ``file_size`` and the ``results`` list.
+    """
+    largest = max(block_sizes)
+    if file_size < largest * max(queue_depths):
+        raise ValueError("The test file must hold at least one block per worker.")
+    # One aligned buffer per worker, allocated up front and reused by every case
+    buffers = [memoryview(mmap.mmap(-1, largest)) for _ in range(max(queue_depths))]
+    fill = os.urandom(largest)  # Incompressible, so compressing or deduplicating file systems do not flatter writes
+    for buffer in buffers:
+        buffer[:] = fill
+    bench_file = BenchFile(directory, file_size)
+    try:
+        bench_file.fill(buffers[0])
+        results = []
+        for pattern in patterns:
+            for block_size in block_sizes:
+                for queue_depth in queue_depths:
+                    result = run_case(bench_file, pattern, block_size, queue_depth, duration, buffers)
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+    finally:
+        bench_file.remove()
+    return {"direct_io": bench_file.direct, "cluster_size": cluster_size(directory), "file_size": bench_file.size,
+            "results": results}
+
+
+def record_results(volume, report, path=RESULTS_PATH):
+    """Appends a benchmark report, tagged with the volume's file system and cluster size, to a JSON lines file."""
+    entry = dict(report, volume=volume.device_id, file_system=volume.file_system, time=time.time())
+    with open(path, "a") as results_file:
+        results_file.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def _format_block(size):
+    return f"{size // MB}M" if size >= MB else f"{size // KB}K"
+
+
+def print_result_header():
+    print("Pattern     Block  QD   MB/s      IOPS      p50 ms  p95 ms  p99 ms  max ms")
+    print("----------  -----  ---  --------  --------  ------  ------  ------  ------")
+
+
+def print_result(result):
+    print(f"{result['pattern']:<10}  {_format_block(result['block_size']):>5}  {result['queue_depth']:>3}  "
+          f"{result['mb_per_s']:>8.1f}  {result['iops']:>8.0f}  {result['p50_ms']:>6.2f}  {result['p95_ms']:>6.2f}  "
+          f"{result['p99_ms']:>6.2f}  {result['max_ms']:>6.1f}")
+
+
+def prompt_volume_benchmark():
+    """Asks for a volume, benchmarks it and records the results next to its file system and cluster size."""
+    from volume_management import prompt_mounted_volume, volume_root
+
+    volume = prompt_mounted_volume("benchmark")
+    if volume is None:
+        return
+    size_mb = input(f"Test file size in MB (default {DEFAULT_FILE_SIZE // MB}): ").strip()
+    try:
+        file_size = int(size_mb) * MB if size_mb else DEFAULT_FILE_SIZE
+    except ValueError:
+        print("Invalid size.")
+        return
+    minimum = max(DEFAULT_BLOCK_SIZES) * max(DEFAULT_QUEUE_DEPTHS)
+    if file_size < minimum:
+        print(f"The test file must be at least {minimum // MB} MB.")
+        return
+    if volume.free_space is not None and file_size > volume.free_space:
+        print("Not enough free space for the test file.")
+        return
+    cases = len(PATTERNS) * len(DEFAULT_BLOCK_SIZES) * len(DEFAULT_QUEUE_DEPTHS)
+    print(f"Benchmarking {volume.device_id} ({volume.file_system or 'unknown file system'}): "
+          f"{cases} cases of {DEFAULT_DURATION:g}s with a {file_size // MB} MB temporary file...")
+    print_result_header()
+    try:
+        report = run_benchmark(volume_root(volume), file_size, on_result=print_result)
+    except KeyboardInterrupt:
+        print("Benchmark interrupted; the temporary file was removed.")
+        return
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    cluster = report["cluster_size"]
+    print(f"File system {volume.file_system or 'unknown'}, cluster size {cluster if cluster else 'unknown'} bytes.")
+    if not report["direct_io"]:
+        print("Note: reads may have been served from the operating system cache"
+              + (" (this file system does not allow O_DIRECT)." if sys.platform.startswith("linux") else "."))
+    record_results(volume, report)
+    print(f"Results appended to {RESULTS_PATH}.")
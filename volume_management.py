@@ -1,288 +1,328 @@
-# volume_management.py
-import wmi
-
-
-
-def format_volume(logical_disk, file_system, size, label):
-    """Formats the selected volume with the specified file system."""
-    try:
-        logical_disk.FileSystem = file_system
-        logical_disk.Format(size=size, label=label, quick_format=True)
-        print("Formatting completed successfully.")
-    except Exception as e:
-        print(f"Error during custom format: {e}")
-
-
-
-def resize_volume(volumes, extend_size=None, shrink_desired_size=None, shrink_min_size=None, shrink_unallocated=False):
-    """Extends or shrinks the selected volume.
-
-    Args:
-        volumes (list): List of WMI objects representing logical disks (volumes).
-        extend_size (int, optional): Size (in MB) to extend the volume by. Defaults to None.
-        shrink_desired_size (int, optional): Desired size (in MB) to shrink the volume to. Defaults to None.
-        shrink_min_size (int, optional): Minimum allowed size (in MB) for shrinking. Defaults to None.
-        shrink_unallocated (bool, optional): Flag to shrink only unallocated space (future implementation). Defaults to False.
-
-    Returns:
-        bool: True on success, False on error.
-    """
-
-    try:
-        if not volumes:
-            print("No volumes found.")
-            return False
-
-        # Display available volumes for selection with sizes and free space
-        print("Available Volumes:")
-        print("Volume   Size     Free Space")
-        print("-------  -------  ----------")
-        for i, volume in enumerate(volumes, start=1):
-            size_mb = volume.Size / (1024**2)
-            free_space_mb = volume.FreeSpace / (1024**2)
-            print(f"{i}. {volume.DeviceID}   {size_mb:.2f} MB   {free_space_mb:.2f} MB")
-
-        # Prompt user to select a volume
-        while True:
-            try:
-                volume_number = int(input("Enter the number of the volume to resize (0 to cancel): "))
-                if volume_number == 0:
-                    print("Resize canceled.")
-                    return False
-                elif 1 <= volume_number <= len(volumes):
-                    selected_volume = volumes[volume_number - 1]
-                    print(f"Selected volume: {selected_volume.DeviceID}")
-                    break
-                else:
-                    print("Invalid volume number. Please enter a number within the range.")
-            except ValueError:
-                print("Invalid input. Please enter a number.")
-
-        # Get current volume size
-        current_size = int(selected_volume.Size // (1024**2))
-        free_space = int(selected_volume.FreeSpace // (1024**2))  # Current free space on the volume
-
-        # Print available space
-        print(f"Available space on volume {selected_volume.DeviceID}: {free_space} MB")
-
-        # User confirmation for resize operations
-        if extend_size is not None:
-            confirmation = input(f"Are you sure you want to extend volume {selected_volume.DeviceID} by {extend_size} MB? (y/n): ")
-        elif shrink_desired_size is not None:
-            confirmation = input(f"Are you sure you want to shrink volume {selected_volume.DeviceID} to {shrink_desired_size} MB? (y/n): ")
-        else:
-            confirmation = input(f"Are you sure you want to shrink volume {selected_volume.DeviceID} to a minimum size of {shrink_min_size} MB? (y/n): ")
-
-        if confirmation.lower() != 'y':
-            print("Resize canceled.")
-            return False
-
-        # Handle extend operation
-        if extend_size is not None:
-            # Check if there's enough free space on the volume
-            if free_space < extend_size:
-                print(f"Insufficient free space on volume {selected_volume.DeviceID}. Required: {extend_size} MB, Available: {free_space} MB.")
-                return False
-            selected_volume.Extend(Size=extend_size)
-            print("Volume extended successfully.")
-            return True
-
-        # Handle shrink operation
-        elif shrink_desired_size is not None:
-            # Ensure shrink size is within valid range (current size to minimum size)
-            if shrink_desired_size < shrink_min_size or shrink_desired_size > current_size:
-                print(f"Invalid shrink size. Desired size ({shrink_desired_size} MB) must be between current size ({current_size} MB) and minimum size ({shrink_min_size} MB).")
-                return False
-            selected_volume.Shrink(DesiredNewSize=shrink_desired_size, MinimumSize=shrink_min_size)
-            print("Volume shrunk successfully.")
-            return True
-
-    except Exception as e:
-        print(f"Error during volume resize: {e}")
-        return False
-
-
-
-
-def mount_volume(logical_disk):
-    """Mounts the selected volume."""
-    try:
-        logical_disk.Mount()
-        print("Volume mounted successfully.")
-    except Exception as e:
-        print(f"Error during volume mounting: {e}")
-
-
-def dismount_volume(logical_disk):
-    """Dismounts the selected volume."""
-    try:
-        logical_disk.Dismount()
-        print("Volume dismounted successfully.")
-    except Exception as e:
-        print(f"Error during volume dismounting: {e}")
-
-
-
-def format_volume_quick(selected_disk):
-    """Performs a quick format on the selected volume."""
-    try:
-        partitions = selected_disk.associators("Win32_DiskDriveToDiskPartition")
-
-        if not partitions:
-            print("No partitions found on the selected disk.")
-            return
-
-        found_partition = None
-        for partition in partitions:
-            try:
-                logical_disk = partition.associators("Win32_LogicalDisk")[0]
-                if logical_disk.DriveType == 3:  # Check for DriveType 3 (Fixed disk)
-                    found_partition = logical_disk
-                    break
-            except IndexError:
-                continue
-
-        if found_partition:
-            # Ask for confirmation
-            confirm = input(f"Are you sure you want to format volume {found_partition.DeviceID}? (yes/no): ").lower()
-            if confirm == 'yes':
-                print(f"Formatting volume: {found_partition.DeviceID} (Quick Format)")
-                try:
-                    # Use quick format method from Win32_LogicalDisk class
-                    found_partition.QuickFormat()
-                    print("Formatting completed successfully.")
-                except Exception as e:
-                    print(f"Error during quick format: {e}")
-            else:
-                print("Format operation cancelled.")
-        else:
-            print("No suitable volume found for quick format on the selected disk.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-def format_volume_custom(selected_disk):
-    """Formats the selected volume with custom options."""
-    try:
-        partitions = selected_disk.associators("Win32_DiskDriveToDiskPartition")
-
-        if not partitions:
-            print("No partitions found on the selected disk.")
-            return
-
-        found_partition = None
-        for partition in partitions:
-            try:
-                logical_disk = partition.associators("Win32_LogicalDisk")[0]
-                if logical_disk.DriveType == 3:  # Check for DriveType 3 (Fixed disk)
-                    found_partition = logical_disk
-                    break
-            except IndexError:
-                continue
-
-        if found_partition:
-            # Ask for confirmation
-            confirm = input(f"Are you sure you want to format volume {found_partition.DeviceID}? (yes/no): ").lower()
-            if confirm == 'yes':
-                file_system = input("Enter file system (e.g., NTFS, exFAT): ")
-                print(f"Formatting volume: {found_partition.DeviceID} with file system {file_system}")
-
-                try:
-                    # Use custom format method from Win32_LogicalDisk class
-                    found_partition.FileSystem = file_system
-                    found_partition.Format()
-                    print("Formatting completed successfully.")
-                except Exception as e:
-                    print(f"Error during custom format: {e}")
-            else:
-                print("Format operation cancelled.")
-        else:
-            print("No suitable volume found for formatting on the selected disk.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-def list_volumes(disk=None):
-    """Lists volumes on the selected disk or all disks if none is selected."""
-    c = wmi.WMI()
-
-    if disk:
-        # List volumes on the selected disk
-        print("\nVolume ###  Ltr  Label        Fs     Type        Size     Status     Info")
-        print("----------  ---  -----------  -----  ----------  -------  ---------  --------")
-        for i, partition in enumerate(disk.associators("Win32_DiskDriveToDiskPartition"), start=1):
-            try:
-                # Retrieve volume letter
-                volume_letter = ""
-                for logical_disk in partition.associators("Win32_LogicalDisk"):
-                    volume_letter = logical_disk.DeviceID
-                    break
-                if not volume_letter:
-                    volume_letter = " "
-
-                label = partition.VolumeName if hasattr(partition, 'VolumeName') else " "
-                file_system = partition.FileSystem if hasattr(partition, 'FileSystem') else " "
-                size = int(partition.Size) / (1024**3) if hasattr(partition, 'Size') else "Unknown"  # Convert bytes to GB
-                size_str = f"{size:.2f} GB" if isinstance(size, float) else size
-                
-                # Retrieve volume status
-                status = "Unknown"
-                for volume in partition.associators("Win32_LogicalDisk"):
-                    if hasattr(volume, "HealthState"):
-                        status = volume.HealthState
-                    elif hasattr(volume, "OperationalStatus"):
-                        status = volume.OperationalStatus
-                    break
-                
-                # Retrieve additional information from Win32_DiskPartition class
-                additional_info = ""
-                for disk_partition in partition.associators("Win32_DiskPartition"):
-                    creation_date = disk_partition.CreationDate if hasattr(disk_partition, "CreationDate") else "Unknown"
-                    cluster_size = disk_partition.BlockSize if hasattr(disk_partition, "BlockSize") else "Unknown"
-                    disk_type = disk_partition.DriveType if hasattr(disk_partition, "DriveType") else "Unknown"
-                    additional_info += f"Creation Date: {creation_date}, Cluster Size: {cluster_size}, Drive Type: {disk_type}"
-                
-                print(f"Volume {i:<5}    {volume_letter:<3} {label[:11]:<11}  {file_system[:5]:<5}  Partition  {size_str:<8}  {status:<9}  {additional_info}")
-            except AttributeError as e:
-                print(f"AttributeError: {e}. Skipping volume.")
-    else:
-        # List volumes on all disks
-        print("\nAll Volumes:")
-        for disk in c.Win32_DiskDrive():
-            print(f"\n  Volumes on Disk {disk.Caption}:")
-            for i, partition in enumerate(disk.associators("Win32_DiskDriveToDiskPartition"), start=1):
-                try:
-                    # Retrieve volume letter
-                    volume_letter = ""
-                    for logical_disk in partition.associators("Win32_LogicalDisk"):
-                        volume_letter = logical_disk.DeviceID
-                        break
-                    if not volume_letter:
-                        volume_letter = " "
-
-                    label = partition.VolumeName if hasattr(partition, 'VolumeName') else " "
-                    file_system = partition.FileSystem if hasattr(partition, 'FileSystem') else " "
-                    size = int(partition.Size) / (1024**3) if hasattr(partition, 'Size') else "Unknown"  # Convert bytes to GB
-                    size_str = f"{size:.2f} GB" if isinstance(size, float) else size
-                    
-                    # Retrieve volume status
-                    status = "Unknown"
-                    for volume in partition.associators("Win32_LogicalDisk"):
-                        if hasattr(volume, "HealthState"):
-                            status = volume.HealthState
-                        elif hasattr(volume, "OperationalStatus"):
-                            status = volume.OperationalStatus
-                        break
-                    
-                    # Retrieve additional information from Win32_DiskPartition class
-                    additional_info = ""
-                    for disk_partition in partition.associators("Win32_DiskPartition"):
-                        creation_date = disk_partition.CreationDate if hasattr(disk_partition, "CreationDate") else "Unknown"
-                        cluster_size = disk_partition.BlockSize if hasattr(disk_partition, "BlockSize") else "Unknown"
-                        disk_type = disk_partition.DriveType if hasattr(disk_partition, "DriveType") else "Unknown"
-                        additional_info += f"Creation Date: {creation_date}, Cluster Size: {cluster_size}, Drive Type: {disk_type}"
-                    
-                    print(f"    Volume {i:<5}    {volume_letter:<3} {label[:11]:<11}  {file_system[:5]:<5}  Partition  {size_str:<8}  {status:<9}  {additional_info}")
-                except AttributeError as e:
-                    print(f"AttributeError: {e}. Skipping volume.")
-
+# volume_management.py
+import os
+import re
+
+from extent_map import MB
+from inventory_cache import get_inventory
+from jobs import get_job_engine
+from listing import iter_volume_rows
+from wmi_session import get_session
+
+
+def _live_logical_disk(device_id):
+    """Fetches the live Win32_LogicalDisk behind a volume record, for calling its methods."""
+    return get_session().query(lambda c: c.Win32_LogicalDisk(DeviceID=device_id))[0]
+
+
+def volumes_on_disk(disk):
+    """Returns the volume records on ``disk`` from the cached inventory."""
+    return get_inventory().snapshot().volumes(disk.device_id)
+
+
+def find_fixed_volume(disk):
+    """Returns the first fixed (DriveType 3) volume record on ``disk``, or None."""
+    for volume in volumes_on_disk(disk):
+        if volume.drive_type == 3:
+            return volume
+    return None
+
+
+def volume_root(volume):
+    """Returns the directory a VolumeRecord is mounted at, or None if it is not mounted.
+
+    Windows drive letters (``"E:"``) become ``"E:\\"``; Linux volumes are
+    identified by their mount point already.
+    """
+    if re.fullmatch(r"[A-Za-z]:", volume.device_id):
+        return volume.device_id + "\\"
+    if volume.device_id.startswith("/") and os.path.isdir(volume.device_id):
+        return volume.device_id
+    return None
+
+
+def prompt_mounted_volume(purpose):
+    """Lists the mounted volumes and asks for one by number or drive letter; returns it or None."""
+    volumes = [volume for volume in get_inventory().snapshot().logical_disks_by_id.values() if volume_root(volume)]
+    if not volumes:
+        print("No mounted volumes.")
+        return None
+    for number, volume in enumerate(volumes, 1):
+        print(f"{number}. {volume.device_id}  {volume.volume_name or ''}  {volume.file_system or ''}")
+    choice = input(f"Enter the volume to {purpose} (number or drive letter): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(volumes):
+        return volumes[int(choice) - 1]
+    for volume in volumes:
+        if volume.device_id.rstrip(":").lower() == choice.rstrip(":").lower():
+            return volume
+    print("Invalid volume.")
+    return None
+
+
+def _run_volume_method(job, device_id, method, file_system=None, **params):
+    """Job body: calls a Win32_LogicalDisk method on the volume, then marks its disk stale.
+
+    The job can be cancelled until the method is called; a half-finished
+    format or resize cannot be stopped.
+    """
+    job.report(0, f"Connecting to run {method} on {device_id}")
+    try:
+        logical_disk = _live_logical_disk(device_id)
+        if not job.commit():
+            job.report(0, f"{method} on {device_id} cancelled before it started")
+            return None
+        job.report(10, f"Running {method} on {device_id}")
+        if file_system:
+            logical_disk.FileSystem = file_system
+        result = getattr(logical_disk, method)(**params)
+        job.report(100, f"{method} on {device_id} finished")
+        return result
+    finally:
+        get_inventory().invalidate_volume(device_id)
+
+
+def submit_volume_job(description, device_id, method, engine=None, **params):
+    """Runs a volume method in the background; jobs on the same disk run one at a time."""
+    disk = get_inventory().snapshot().disk_for_logical_disk(device_id)
+    disk_key = disk.index if disk else device_id
+    job = (engine or get_job_engine()).submit(description, disk_key, _run_volume_method, device_id, method,
+                                              cancellable=True, **params)
+    print(f"Started job {job.id}: {description}")
+    return job
+
+
+def format_volume(volume, file_system, size, label):
+    """Formats the selected volume with the specified file system in the background."""
+    try:
+        return submit_volume_job(f"Format {volume.device_id} as {file_system}", volume.device_id, "Format",
+                                 file_system=file_system, size=size, label=label, quick_format=True)
+    except Exception as e:
+        print(f"Error during custom format: {e}")
+
+
+
+def resize_volume(volumes, extend_size=None, shrink_desired_size=None, shrink_min_size=None, shrink_unallocated=False,
+                  confirm=True):
+    """Extends or shrinks the selected volume.
+
+    Args:
+        volumes (list): List of VolumeRecord objects representing logical disks (volumes).
+        extend_size (int, optional): Size (in MB) to extend the volume by. Defaults to None.
+        shrink_desired_size (int, optional): Desired size (in MB) to shrink the volume to. Defaults to None.
+        shrink_min_size (int, optional): Minimum allowed size (in MB) for shrinking. Defaults to None.
+        shrink_unallocated (bool, optional): Flag to shrink only unallocated space (future implementation). Defaults to False.
+        confirm (bool, optional): Prompt for the volume and for confirmation. With False, the
+            first volume is resized without asking, for scripts. Defaults to True.
+
+    Returns:
+        bool: True if the resize job was started, False on error or cancel.
+    """
+
+    try:
+        # Sizes typed at the prompt arrive as strings; empty means "not given"
+        extend_size, shrink_desired_size, shrink_min_size = (
+            int(value) if value not in (None, "") else None
+            for value in (extend_size, shrink_desired_size, shrink_min_size)
+        )
+
+        if not volumes:
+            print("No volumes found.")
+            return False
+
+        if not confirm:
+            selected_volume = volumes[0]
+        else:
+            # Display available volumes for selection with sizes and free space
+            print("Available Volumes:")
+            print("Volume   Size     Free Space")
+            print("-------  -------  ----------")
+            for i, volume in enumerate(volumes, start=1):
+                size_mb = volume.size / (1024**2)
+                free_space_mb = volume.free_space / (1024**2)
+                print(f"{i}. {volume.device_id}   {size_mb:.2f} MB   {free_space_mb:.2f} MB")
+
+            # Prompt user to select a volume
+            while True:
+                try:
+                    volume_number = int(input("Enter the number of the volume to resize (0 to cancel): "))
+                    if volume_number == 0:
+                        print("Resize canceled.")
+                        return False
+                    elif 1 <= volume_number <= len(volumes):
+                        selected_volume = volumes[volume_number - 1]
+                        print(f"Selected volume: {selected_volume.device_id}")
+                        break
+                    else:
+                        print("Invalid volume number. Please enter a number within the range.")
+                except ValueError:
+                    print("Invalid input. Please enter a number.")
+
+        # Get current volume size
+        current_size = int(selected_volume.size // (1024**2))
+        free_space = int(selected_volume.free_space // (1024**2))  # Current free space on the volume
+
+        # Print available space
+        print(f"Available space on volume {selected_volume.device_id}: {free_space} MB")
+
+        # User confirmation for resize operations
+        if not confirm:
+            confirmation = "y"
+        elif extend_size is not None:
+            confirmation = input(f"Are you sure you want to extend volume {selected_volume.device_id} by {extend_size} MB? (y/n): ")
+        elif shrink_desired_size is not None:
+            confirmation = input(f"Are you sure you want to shrink volume {selected_volume.device_id} to {shrink_desired_size} MB? (y/n): ")
+        else:
+            confirmation = input(f"Are you sure you want to shrink volume {selected_volume.device_id} to a minimum size of {shrink_min_size} MB? (y/n): ")
+
+        if confirmation.lower() != 'y':
+            print("Resize canceled.")
+            return False
+
+        # Handle extend operation
+        if extend_size is not None:
+            # Check there is unallocated space right after the volume's partition
+            snapshot = get_inventory().snapshot()
+            partition_id = snapshot.partition_by_logical_disk.get(selected_volume.device_id)
+            disk = snapshot.disk_for_logical_disk(selected_volume.device_id)
+            if partition_id is None or disk is None:
+                print(f"Cannot find the partition behind volume {selected_volume.device_id}.")
+                return False
+            extents = snapshot.extent_map(disk.device_id)
+            if not extents.can_grow(partition_id, extend_size * MB):
+                growth_room = extents.growth_room(partition_id) // MB
+                print(f"Insufficient unallocated space after volume {selected_volume.device_id}. Required: {extend_size} MB, Available: {growth_room} MB.")
+                return False
+            submit_volume_job(f"Extend {selected_volume.device_id} by {extend_size} MB", selected_volume.device_id,
+                              "Extend", Size=extend_size)
+            return True
+
+        # Handle shrink operation
+        elif shrink_desired_size is not None:
+            # Ensure shrink size is within valid range (current size to minimum size)
+            minimum_size = max(shrink_min_size or 0, current_size - free_space)  # Cannot shrink below used space
+            if shrink_desired_size < minimum_size or shrink_desired_size > current_size:
+                print(f"Invalid shrink size. Desired size ({shrink_desired_size} MB) must be between current size ({current_size} MB) and minimum size ({minimum_size} MB).")
+                return False
+            submit_volume_job(f"Shrink {selected_volume.device_id} to {shrink_desired_size} MB", selected_volume.device_id,
+                              "Shrink", DesiredNewSize=shrink_desired_size, MinimumSize=shrink_min_size)
+            return True
+
+    except Exception as e:
+        print(f"Error during volume resize: {e}")
+        return False
+
+
+
+
+def mount_volume(logical_disk):
+    """Mounts the selected volume."""
+    try:
+        logical_disk.Mount()
+        print("Volume mounted successfully.")
+    except Exception as e:
+        print(f"Error during volume mounting: {e}")
+
+
+def dismount_volume(logical_disk):
+    """Dismounts the selected volume."""
+    try:
+        logical_disk.Dismount()
+        print("Volume dismounted successfully.")
+    except Exception as e:
+        print(f"Error during volume dismounting: {e}")
+
+
+
+def format_volume_quick(selected_disk):
+    """Performs a quick format on the selected volume."""
+    try:
+        if not get_inventory().snapshot().partitions(selected_disk.device_id):
+            print("No partitions found on the selected disk.")
+            return
+
+        found_partition = find_fixed_volume(selected_disk)
+
+        if found_partition:
+            # Ask for confirmation
+            confirm = input(f"Are you sure you want to format volume {found_partition.device_id}? (yes/no): ").lower()
+            if confirm == 'yes':
+                print(f"Formatting volume: {found_partition.device_id} (Quick Format)")
+                try:
+                    # Use quick format method from Win32_LogicalDisk class, in the background
+                    submit_volume_job(f"Quick format {found_partition.device_id}", found_partition.device_id, "QuickFormat")
+                except Exception as e:
+                    print(f"Error during quick format: {e}")
+            else:
+                print("Format operation cancelled.")
+        else:
+            print("No suitable volume found for quick format on the selected disk.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def format_volume_custom(selected_disk):
+    """Formats the selected volume with custom options."""
+    try:
+        if not get_inventory().snapshot().partitions(selected_disk.device_id):
+            print("No partitions found on the selected disk.")
+            return
+
+        found_partition = find_fixed_volume(selected_disk)
+
+        if found_partition:
+            # Ask for confirmation
+            confirm = input(f"Are you sure you want to format volume {found_partition.device_id}? (yes/no): ").lower()
+            if confirm == 'yes':
+                file_system = input("Enter file system (e.g., NTFS, exFAT): ")
+                print(f"Formatting volume: {found_partition.device_id} with file system {file_system}")
+
+                try:
+                    # Use custom format method from Win32_LogicalDisk class, in the background
+                    submit_volume_job(f"Format {found_partition.device_id} as {file_system}", found_partition.device_id,
+                                      "Format", file_system=file_system)
+                except Exception as e:
+                    print(f"Error during custom format: {e}")
+            else:
+                print("Format operation cancelled.")
+        else:
+            print("No suitable volume found for formatting on the selected disk.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def _format_volume_row(row):
+    """Formats a row from iter_volume_rows as a line of the List Volumes table."""
+    size_str = f"{row['partition_size'] / (1024**3):.2f} GB" if row["partition_size"] is not None else "Unknown"  # Convert bytes to GB
+    cluster_size = row["block_size"] if row["block_size"] is not None else "Unknown"
+    disk_type = row["drive_type"] if row["drive_type"] is not None else "Unknown"
+    additional_info = f"Cluster Size: {cluster_size}, Drive Type: {disk_type}"
+    return (f"Volume {row['number']:<5}    {row['device_id'] or ' ':<3} {(row['label'] or ' ')[:11]:<11}  "
+            f"{(row['file_system'] or ' ')[:5]:<5}  Partition  {size_str:<8}  {row['status'] or 'Unknown':<9}  "
+            f"{additional_info}")
+
+
+def list_volumes(disk=None, snapshot=None):
+    """Lists volumes on the selected disk or all disks if none is selected.
+
+    Args:
+        disk (DiskRecord, optional): Disk to list volumes for. Defaults to all disks.
+        snapshot (TopologySnapshot, optional): Inventory to list, e.g. from a
+            remote host. Defaults to the local cached inventory.
+    """
+    # One cached snapshot of the whole topology instead of per-partition associator queries
+    snapshot = snapshot or get_inventory().snapshot()
+
+    if disk:
+        # List volumes on the selected disk
+        print("\nVolume ###  Ltr  Label        Fs     Type        Size     Status     Info")
+        print("----------  ---  -----------  -----  ----------  -------  ---------  --------")
+        groups = [(disk, "")]
+    else:
+        # List volumes on all disks
+        print("\nAll Volumes:")
+        groups = ((each_disk, "    ") for each_disk in snapshot.disks)
+    for group_disk, indent in groups:
+        if not disk:
+            print(f"\n  Volumes on Disk {group_disk.caption}:")
+        # Rows are printed as the generator yields them
+        for row in iter_volume_rows(snapshot, group_disk):
+            print(indent + _format_volume_row(row))
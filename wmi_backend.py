@@ -0,0 +1,33 @@
+# wmi_backend.py
+"""The Windows backend: WMI queries with diskpart as the fallback.
+
+Gathers the TUI actions from disk_management, volume_management and
+bulk_format so ``backends.load_backend("wmi")`` returns one module that
+``diskman.py`` can drive.
+"""
+from bulk_format import prompt_bulk_format
+from disk_management import create_partition, list_and_select_disk, list_disks
+from jobs import get_job_engine
+from volume_management import find_fixed_volume, format_volume, format_volume_quick, list_volumes, resize_volume, volumes_on_disk
+from wmi_session import get_session
+
+__all__ = [
+    "close", "create_partition", "event_source", "find_fixed_volume", "format_volume", "format_volume_quick",
+    "list_and_select_disk", "list_disks", "list_volumes", "prompt_bulk_format", "resize_volume",
+    "volumes_on_disk",
+]
+
+
+def event_source():
+    """Returns the source of volume and disk change events for this backend."""
+    from inventory_events import WMIEventSource
+    return WMIEventSource()
+
+
+def close():
+    """Waits for background jobs to finish and closes the shared WMI session."""
+    engine = get_job_engine()
+    if engine.active():
+        print("Waiting for running jobs to finish...")
+    engine.shutdown(wait=True)
+    get_session().close()
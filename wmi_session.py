@@ -0,0 +1,91 @@
+# wmi_session.py
+"""Shared WMI connection reused by every menu action.
+
+Opening a ``wmi.WMI()`` connection is one of the slowest steps of each
+action, so the connection is opened lazily on first use and kept until it
+goes stale.  The provider that opens connections can be swapped, e.g. for
+``fake_wmi.FakeWMI().provider`` when running without WMI.
+"""
+import threading
+
+import instrumentation
+
+
+def wmi_provider(**connect_args):
+    """Opens a real WMI connection (COM is initialised for worker threads)."""
+    import wmi
+
+    if threading.current_thread() is not threading.main_thread():
+        import pythoncom
+        pythoncom.CoInitialize()
+    return wmi.WMI(**connect_args)
+
+
+class WMISession:
+    """Lazily opened, reusable WMI connection.
+
+    COM connections belong to the thread that opened them, so each thread
+    gets its own connection from the same provider.
+    """
+
+    def __init__(self, provider=None, **connect_args):
+        self.provider = provider or wmi_provider
+        self.connect_args = connect_args
+        self._local = threading.local()
+
+    def connection(self):
+        """Returns the open connection, connecting on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = instrumentation.connect(self.provider, **self.connect_args)
+            self._local.connection = connection
+        return connection
+
+    def reconnect(self):
+        """Drops the current connection and opens a new one."""
+        self.close()
+        return self.connection()
+
+    def close(self):
+        """Forgets the current thread's connection; the next call reconnects."""
+        self._local.connection = None
+
+    def query(self, action, retries=1):
+        """Runs ``action(connection)`` and reconnects if the connection went stale.
+
+        Only read-only actions should go through here, since a failed action
+        is run again on the new connection.
+
+        Args:
+            action (callable): Called with the open connection.
+            retries (int, optional): Reconnect attempts before giving up. Defaults to 1.
+
+        Returns:
+            Whatever ``action`` returns.
+        """
+        for attempt in range(retries + 1):
+            connection = self.connection()
+            try:
+                return action(connection)
+            except Exception:
+                if attempt == retries:
+                    raise
+                self.close()
+
+
+_session = None
+
+
+def get_session():
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        _session = WMISession()
+    return _session
+
+
+def set_provider(provider, **connect_args):
+    """Replaces the process-wide session with one using ``provider``."""
+    global _session
+    _session = WMISession(provider, **connect_args)
+    return _session